@@ -0,0 +1,90 @@
+# benchmarks/bench_transition_kernel.py
+"""Comparar la eliminación de estados repetidos: método anterior (diff + texto) y núcleo vectorizado.
+
+Uso:
+    python benchmarks/bench_transition_kernel.py [--rows 50000000] [--equipos 2000] [--skip-legacy]
+
+Genera una tabla sintética ordenada por equipo y fecha, con estados
+'Ocupacion'/'Liberacion' (y algunos valores no válidos), y mide:
+- el método anterior: etiquetas a números, `groupby().diff()`, conversión a
+  texto, `str.contains("0.0")` y vuelta a etiquetas;
+- el núcleo de `BaseProcessor`: códigos int8, inicio de cada equipo y máscara
+  de transiciones en una sola pasada.
+Con ambos se verifica que las filas conservadas sean las mismas. El método
+anterior necesita varias veces más memoria; con 50 millones de filas puede
+convenir `--skip-legacy` o un número menor de filas.
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from processors.base_processor import BaseProcessor
+
+STATE_CODES = {'Ocupacion': 0, 'Liberacion': 1}
+
+def build_frame(rows, equipos, seed=0):
+    """Tabla sintética ordenada por equipo y fecha"""
+    rng = np.random.default_rng(seed)
+    equipo = np.sort(rng.integers(0, equipos, rows))
+    labels = np.array(['Ocupacion', 'Liberacion', 'Sin dato'], dtype=object)
+    estado = labels[rng.choice(3, rows, p=[0.49, 0.49, 0.02])]
+    return pd.DataFrame({
+        'Equipo': pd.Index([f'CDV_{i:05d}' for i in range(equipos)], dtype=object)[equipo],
+        'Fecha Hora': pd.Timestamp('2026-01-01') + pd.to_timedelta(np.arange(rows), unit='s'),
+        'Estado': estado
+    })
+
+def legacy(df):
+    """Método anterior de los procesadores (por equipo)"""
+    df = df.copy()
+    df['Estado'] = df['Estado'].replace('Liberacion', 1)
+    df['Estado'] = df['Estado'].replace('Ocupacion', 0)
+    df = df[df['Estado'].isin([1, 0])]
+    df['Estado'] = df['Estado'].astype('float64')
+    df['Diff_Aux'] = df.groupby('Equipo')['Estado'].diff(periods=1)
+    df['Diff_Aux'] = df['Diff_Aux'].astype('string')
+    df = df.loc[~(df['Diff_Aux'].str.contains('0.0'))]
+    df = df.drop('Diff_Aux', axis=1)
+    df['Estado'] = df['Estado'].replace(1, 'Liberacion')
+    df['Estado'] = df['Estado'].replace(0, 'Ocupacion')
+    return df
+
+def kernel(df):
+    """Núcleo compartido de transiciones"""
+    codes = BaseProcessor.state_codes(df['Estado'], STATE_CODES)
+    valid = codes >= 0
+    df, codes = df[valid], codes[valid]
+    return df[BaseProcessor.transition_mask(codes, BaseProcessor.group_starts(df['Equipo']), keep_first=False)]
+
+def timed(function, df):
+    start = time.perf_counter()
+    result = function(df)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50_000_000)
+    parser.add_argument('--equipos', type=int, default=2000)
+    parser.add_argument('--skip-legacy', action='store_true', help='medir solo el núcleo vectorizado')
+    args = parser.parse_args()
+
+    print(f"Generando {args.rows:,} filas para {args.equipos:,} equipos...")
+    df = build_frame(args.rows, args.equipos)
+
+    new, new_seconds = timed(kernel, df)
+    print(f"Núcleo vectorizado: {new_seconds:.2f} s ({args.rows / new_seconds / 1e6:.1f} M filas/s), {len(new):,} transiciones")
+
+    if not args.skip_legacy:
+        old, old_seconds = timed(legacy, df)
+        print(f"Método anterior:    {old_seconds:.2f} s ({args.rows / old_seconds / 1e6:.1f} M filas/s), {len(old):,} transiciones")
+        same = old.index.equals(new.index)
+        print(f"Aceleración: {old_seconds / new_seconds:.1f}x; mismas filas: {'sí' if same else 'NO'}")
+        if not same:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,7 @@ import os
 import threading
 from datetime import datetime
 from dashboard.dashboard_integration import DashboardIntegration
+from processors.shared_scan import SharedScan
 
 class LineTab:
     """Clase para gestionar las pestañas de cada línea"""
@@ -255,19 +256,19 @@ class LineTab:
         self.log_text.delete(1.0, tk.END)
         self.log("Log limpiado")
     
-    def start_processing(self, analysis_type):
-        """Iniciar procesamiento de datos para un tipo específico"""
+    def start_processing(self, analysis_type, shared_scan=None):
+        """Iniciar procesamiento de datos para un tipo específico; devuelve si se inició"""
         # Verificar que se hayan seleccionado las carpetas
         source_path = self.source_path_var.get()
         dest_path = self.dest_path_var.get()
         
         if not source_path or not os.path.exists(source_path):
             messagebox.showerror("Error", "Seleccione una carpeta de origen válida")
-            return
+            return False
         
         if not dest_path or not os.path.exists(dest_path):
             messagebox.showerror("Error", "Seleccione una carpeta de destino válida")
-            return
+            return False
         
         # Obtener datos para procesamiento
         line = self.title.replace("Línea ", "L")
@@ -281,7 +282,7 @@ class LineTab:
             if data_type == "SCADA" and line == "L2":
                 messagebox.showinfo("Información", "El análisis con datos SCADA para Línea 2 está en desarrollo y no disponible en esta versión.")
                 self.log("El análisis con datos SCADA para Línea 2 está en desarrollo")
-                return
+                return False
         
         # Verificar umbrales para CDV
         parameters = {}
@@ -292,7 +293,7 @@ class LineTab:
                 
                 if not (0 < f_oc_1 <= 1) or not (0 < f_lb_2 <= 1):
                     messagebox.showerror("Error", "Los factores de umbral deben estar entre 0 y 1")
-                    return
+                    return False
                 
                 parameters = {
                     'f_oc_1': f_oc_1,
@@ -300,11 +301,15 @@ class LineTab:
                 }
             except ValueError:
                 messagebox.showerror("Error", "Los factores de umbral deben ser valores numéricos")
-                return
+                return False
         
         # Añadir tipo de datos a los parámetros
         parameters['data_type'] = data_type
         
+        # Lectura compartida de archivos cuando se procesan CDV y ADV a la vez
+        if shared_scan is not None:
+            parameters['shared_scan'] = shared_scan
+        
         # Registrar en el log el tipo de datos seleccionado
         if line == "L2":
             self.log(f"Tipo de datos seleccionado: {data_type}")
@@ -326,6 +331,8 @@ class LineTab:
         
         if not success:
             self.log(f"Error al iniciar el procesamiento de {analysis_type}")
+        
+        return success
     
     def start_both_processing(self):
         """Iniciar procesamiento tanto para CDV como para ADV"""
@@ -341,11 +348,16 @@ class LineTab:
             messagebox.showerror("Error", "Seleccione una carpeta de destino válida")
             return
         
-        # Iniciar procesamiento para CDV
-        self.start_processing("CDV")
+        # Ambos procesadores leen cada archivo fuente una sola vez
+        shared_scan = SharedScan(["CDV", "ADV"])
+        
+        # Iniciar procesamiento para CDV (si no se inicia, no se retienen archivos para él)
+        if not self.start_processing("CDV", shared_scan):
+            shared_scan.release("CDV")
         
         # Iniciar procesamiento para ADV
-        self.start_processing("ADV")
+        if not self.start_processing("ADV", shared_scan):
+            shared_scan.release("ADV")
     
     def process_velcom(self):
         """Procesar archivo Velcom"""
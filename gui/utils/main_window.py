@@ -166,4 +166,9 @@ class MetroAnalyzerApp:
             
             # Eliminar la referencia al hilo en caso de error
             if thread_key in self.processing_threads:
-                del self.processing_threads[thread_key]
\ No newline at end of file
+                del self.processing_threads[thread_key]
+        
+        finally:
+            # Dejar de retener archivos de la lectura compartida para este procesador
+            if getattr(processor, 'shared_scan', None) is not None:
+                processor.shared_scan.release(processor.analysis_type)
\ No newline at end of file
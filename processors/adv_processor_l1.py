@@ -2,14 +2,30 @@
 import pandas as pd
 import numpy as np
 import os
-import zipfile
 import io
+import zipfile
+import re
 from datetime import datetime, timedelta
-from processors.base_processor import BaseProcessor
+from processors.base_processor import BaseProcessor, count_rows, merge_counts
+from processors.zip_reader import ZipMemberReader
+from processors.workbook_cache import read_workbook
+from processors.source_formats import L1_S2K, StrippedByteStream, read_source
+
+# Prefiltro de líneas de S2K: solo las de agujas llegan al parser
+S2K_LINE_FILTER = re.compile(rb'AG_')
+
+# Claves del conteo diario de movimientos, calculado dentro de cada lectura de S2K
+MOVEMENT_COUNT_KEYS = ['Equipo', 'Fecha']
 
 class ADVProcessorL1(BaseProcessor):
     """Procesador para datos ADV (Agujas) de la Línea 1"""
     
+    # v3: lectura de S2K con descriptor de formato (columnas 0, 2 y 9) y prefiltro de líneas
+    # v4: los ZIP de S2K se guardan como conteos diarios de movimientos por equipo
+    PARSER_VERSION = 4
+    # Versión de la conversión de los Excel de AlarmList guardada en la caché de libros
+    ALARMLIST_WORKBOOK_VERSION = 1
+    
     def __init__(self):
         super().__init__(line="L1", analysis_type="ADV")
         # Atributos específicos para ADV L1
@@ -17,7 +33,12 @@ class ADVProcessorL1(BaseProcessor):
         self.df_L1_ADV_MOV = None   # Movimientos de agujas
         self.zip_files_alarmlist = []
         self.zip_files_s2k = []
-        self.extracted_files = []
+        
+        # Miembros de los ZIP leídos en paralelo por procesos
+        self.ingest_mode = 'process'
+        self.ingest_workers = os.cpu_count() or 1
+        self._zip_reader = None
+        self._workbook_cache = None
     
     def find_files(self):
         """Encontrar archivos ZIP para análisis ADV de Línea 1"""
@@ -25,20 +46,21 @@ class ADVProcessorL1(BaseProcessor):
         self.zip_files_s2k = []
         
         # Buscar archivos AlarmList (discordancias)
+        self.source_files = []
         alarmlist_path = os.path.join(self.root_folder_path, 'CBI Alarmlist')
         if os.path.exists(alarmlist_path):
-            for root, _, files in os.walk(alarmlist_path):
-                for file in files:
-                    if file.endswith('.zip') and 'CBI_1_AlarmList' in file:
-                        self.zip_files_alarmlist.append(os.path.join(root, file))
+            for source in self.discover_files(alarmlist_path):
+                if source.name.endswith('.zip') and 'CBI_1_AlarmList' in source.name:
+                    self.zip_files_alarmlist.append(source.path)
+                    self.source_files.append(source)
         
         # Buscar archivos S2K (movimientos)
         s2k_path = os.path.join(self.root_folder_path, 'S2K')
         if os.path.exists(s2k_path):
-            for root, _, files in os.walk(s2k_path):
-                for file in files:
-                    if file.endswith('.zip'):
-                        self.zip_files_s2k.append(os.path.join(root, file))
+            for source in self.discover_files(s2k_path):
+                if source.name.endswith('.zip'):
+                    self.zip_files_s2k.append(source.path)
+                    self.source_files.append(source)
         
         return len(self.zip_files_alarmlist) + len(self.zip_files_s2k)
     
@@ -48,39 +70,26 @@ class ADVProcessorL1(BaseProcessor):
         if progress_callback:
             progress_callback(5, "Procesando archivos de discordancias...")
         
-        discordancias_dfs = []
-        for i, zip_file in enumerate(self.zip_files_alarmlist):
-            try:
-                discordancias_dfs.extend(self.extract_filtered_rows_from_alarmlist_zip(zip_file))
-                if progress_callback:
-                    progress = 5 + (i / len(self.zip_files_alarmlist)) * 10
-                    progress_callback(progress, f"Procesando archivo {i+1} de {len(self.zip_files_alarmlist)}: {os.path.basename(zip_file)}")
-            except Exception as e:
-                if progress_callback:
-                    progress_callback(None, f"Error al procesar {os.path.basename(zip_file)}: {str(e)}")
-        
-        # Procesar archivos S2K (movimientos)
-        if progress_callback:
-            progress_callback(15, "Procesando archivos de movimientos...")
-        
-        movimientos_dfs = []
-        for i, zip_file in enumerate(self.zip_files_s2k):
-            try:
-                # Extraer y procesar archivos S2K
-                extracted_files = self.extract_zip_file(zip_file)
-                
-                for file_path in extracted_files:
-                    if file_path.endswith('.csv'):
-                        df = self.read_and_clean_csv(file_path)
-                        if not df.empty:
-                            movimientos_dfs.append(df)
-                
-                if progress_callback:
-                    progress = 15 + (i / len(self.zip_files_s2k)) * 10
-                    progress_callback(progress, f"Procesando archivo {i+1} de {len(self.zip_files_s2k)}: {os.path.basename(zip_file)}")
-            except Exception as e:
-                if progress_callback:
-                    progress_callback(None, f"Error al procesar {os.path.basename(zip_file)}: {str(e)}")
+        # Leer solo los ZIP nuevos o modificados (manifiesto de ingesta); varios ZIP
+        # a la vez y sus miembros repartidos entre los trabajadores del lector de ZIP
+        with ZipMemberReader(self.ingest_workers, self.ingest_mode) as zip_reader:
+            self._zip_reader = zip_reader
+            self._workbook_cache = self.open_workbook_cache()
+            discordancias_dfs = self.ingest_files(
+                self.zip_files_alarmlist, self._read_alarmlist_zip, "AlarmList", progress_callback,
+                progress_start=5, progress_end=15, max_workers=self.ingest_workers, mode='thread'
+            )
+            
+            # Procesar archivos S2K (movimientos), leídos directamente desde el ZIP
+            if progress_callback:
+                progress_callback(15, "Procesando archivos de movimientos...")
+            
+            movimientos_dfs = self.ingest_files(
+                self.zip_files_s2k, self._read_s2k_zip, "S2K", progress_callback,
+                progress_start=15, progress_end=25, max_workers=self.ingest_workers, mode='thread'
+            )
+        self._zip_reader = None
+        self._workbook_cache = None
         
         # Combinar resultados
         if discordancias_dfs:
@@ -91,102 +100,115 @@ class ADVProcessorL1(BaseProcessor):
             self.df_L1_ADV_DISC["Linea"] = "L1"
         
         if movimientos_dfs:
-            combined_df = pd.concat(movimientos_dfs, ignore_index=True)
-            # Extraer el estado (últimos 7 caracteres)
-            combined_df['Estado'] = combined_df['Estado'].apply(lambda x: x[-7:] if isinstance(x, str) else x)
-            
-            # Convertir la columna 'Fecha Hora' a formato de fecha y hora
-            combined_df['Fecha Hora'] = pd.to_datetime(combined_df['Fecha Hora'], errors='coerce')
-            # Extraer el año, mes y día de la columna 'Fecha Hora'
-            combined_df['Fecha'] = combined_df['Fecha Hora'].dt.date
-            
-            # Agrupar y contar
-            self.df_L1_ADV_MOV = combined_df.groupby(['Equipo', 'Fecha']).size().reset_index(name='Count')
+            # Unir los conteos parciales de cada ZIP (memoria según equipos x días)
+            self.df_L1_ADV_MOV = merge_counts(movimientos_dfs, MOVEMENT_COUNT_KEYS)
             self.df_L1_ADV_MOV['Estacion'] = self.df_L1_ADV_MOV['Equipo'].apply(lambda x: x[-2:] if isinstance(x, str) else x)
         
-        # Limpiar archivos extraídos temporales
-        for file_path in self.extracted_files:
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                except:
-                    pass
-        
-        self.extracted_files = []
-        
         return (self.df_L1_ADV_DISC is not None) or (self.df_L1_ADV_MOV is not None)
     
+    def _read_alarmlist_zip(self, zip_file):
+        """Leer un ZIP de AlarmList y devolver sus discordancias en un solo DataFrame"""
+        filas_filtradas = self.extract_filtered_rows_from_alarmlist_zip(zip_file)
+        return pd.concat(filas_filtradas, ignore_index=True) if filas_filtradas else pd.DataFrame()
+    
+    def _read_s2k_zip(self, zip_file):
+        """Leer los CSV de un ZIP de S2K y devolver sus movimientos contados por equipo y día"""
+        movimientos = []
+        try:
+            zip_reader = self._zip_reader or ZipMemberReader(max_workers=1)
+            movimientos = zip_reader.read(
+                zip_file, lambda nombre: nombre.endswith('.csv'), self.count_s2k_csv,
+                lambda nombre_archivo, e: print(f"Error al procesar el archivo '{nombre_archivo}': {e}")
+            )
+        except Exception as e:
+            print(f"Error al abrir ZIP {zip_file}: {e}")
+        movimientos = [df for df in movimientos if not df.empty]
+        return merge_counts(movimientos, MOVEMENT_COUNT_KEYS) if movimientos else pd.DataFrame()
+    
     def extract_filtered_rows_from_alarmlist_zip(self, archivo_zip):
         """Extraer y filtrar datos de archivos Excel en un ZIP de AlarmList"""
         filas_filtradas = []
         try:
+            # Los Excel ya convertidos se identifican por CRC y tamaño dentro del ZIP,
+            # sin descomprimirlos
             with zipfile.ZipFile(archivo_zip, 'r') as zip_ref:
-                for nombre_archivo in zip_ref.namelist():
-                    if nombre_archivo.endswith('.xls'):
-                        try:
-                            contenido = zip_ref.read(nombre_archivo)
-                            with io.BytesIO(contenido) as f:
-                                df = pd.read_excel(f)
-                            # Filtrar columnas
-                            df = df.iloc[:, [0, 1, 4]]
-                            # Renombrar columnas
-                            df.columns = ['Fecha Hora', 'Equipo', 'Estado']
-                            # Filtrar filas
-                            df = df[(df['Equipo'].str.contains('AG', na=False)) & 
-                                    (df['Estado'].str.contains('DISCREP', na=False))]
-                            filas_filtradas.append(df)
-                        except Exception as e:
-                            print(f"Error al procesar {nombre_archivo}: {e}")
+                miembros = {
+                    info.filename: f"{info.CRC:08x}_{info.file_size}"
+                    for info in zip_ref.infolist() if info.filename.endswith('.xls')
+                }
+            cache = self._workbook_cache
+            convertidos = {}
+            if cache is not None:
+                for nombre_archivo, firma in miembros.items():
+                    df = cache.get(cache.entry_key('AlarmList', firma, self.ALARMLIST_WORKBOOK_VERSION))
+                    if df is not None:
+                        convertidos[nombre_archivo] = df
+            
+            # Convertir en paralelo solo los Excel que no están en la caché
+            zip_reader = self._zip_reader or ZipMemberReader(max_workers=1)
+            nuevos = zip_reader.read(
+                archivo_zip, lambda nombre: nombre in miembros and nombre not in convertidos,
+                self._convert_alarmlist_member,
+                lambda nombre_archivo, e: print(f"Error al procesar {nombre_archivo}: {e}"),
+                with_names=True
+            )
+            for nombre_archivo, df in nuevos:
+                convertidos[nombre_archivo] = df
+                if cache is not None:
+                    try:
+                        cache.put(cache.entry_key('AlarmList', miembros[nombre_archivo], self.ALARMLIST_WORKBOOK_VERSION), df)
+                    except Exception as e:
+                        print(f"No se pudo guardar en caché {nombre_archivo}: {e}")
+            
+            # Filtrar filas conservando el orden de los archivos dentro del ZIP
+            filas_filtradas = [
+                self._filter_alarmlist_rows(convertidos[nombre_archivo])
+                for nombre_archivo in miembros if nombre_archivo in convertidos
+            ]
         except Exception as e:
             print(f"Error al abrir ZIP {archivo_zip}: {e}")
         
         return filas_filtradas
     
-    def extract_zip_file(self, ruta_zip):
-        """Extraer archivos de un archivo ZIP y devolver una lista de rutas de archivos extraídos."""
-        rutas_archivos = []
-        try:
-            # Crear un directorio temporal único para este ZIP
-            temp_dir = os.path.join(os.getcwd(), f"temp_{datetime.now().strftime('%Y%m%d%H%M%S')}")
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            with zipfile.ZipFile(ruta_zip, 'r') as archivo_zip:
-                for archivo in archivo_zip.namelist():
-                    # Extraer solo archivos CSV
-                    if archivo.endswith('.csv'):
-                        archivo_zip.extract(archivo, temp_dir)
-                        ruta_completa = os.path.join(temp_dir, archivo)
-                        rutas_archivos.append(ruta_completa)
-                        self.extracted_files.append(ruta_completa)
-        except Exception as e:
-            print(f"Error al extraer {ruta_zip}: {e}")
+    @staticmethod
+    def _convert_alarmlist_member(archivo):
+        """Leer un Excel de AlarmList desde el flujo descomprimido conservando solo las columnas usadas"""
+        with io.BytesIO(archivo.read()) as f:
+            df = read_workbook(f)
+        # Filtrar columnas
+        df = df.iloc[:, [0, 1, 4]]
+        # Renombrar columnas
+        df.columns = ['Fecha Hora', 'Equipo', 'Estado']
+        return df
+    
+    @staticmethod
+    def _filter_alarmlist_rows(df):
+        """Conservar solo las discordancias de agujas de un Excel de AlarmList convertido"""
+        return df[(df['Equipo'].str.contains('AG', na=False)) & 
+                  (df['Estado'].str.contains('DISCREP', na=False))]
+    
+    @staticmethod
+    def count_s2k_csv(archivo):
+        """Leer un CSV de S2K desde su flujo y contar sus movimientos por equipo y día (dentro del trabajador)"""
+        df = ADVProcessorL1.read_and_clean_csv(archivo)
+        df = df.assign(Fecha=pd.to_datetime(df['Fecha Hora'], errors='coerce').dt.date)
+        return count_rows(df, MOVEMENT_COUNT_KEYS)
+    
+    @staticmethod
+    def read_and_clean_csv(archivo):
+        """Leer y limpiar un CSV de S2K desde su flujo, eliminando caracteres problemáticos y seleccionando columnas específicas."""
+        # Eliminar los caracteres NUL por bloques y leer solo las líneas de agujas
+        # y las columnas usadas (0, 2 y 9), sin copiar el archivo completo
+        df = read_source(StrippedByteStream(archivo), L1_S2K, line_filter=S2K_LINE_FILTER)
         
-        return rutas_archivos
-
-    def read_and_clean_csv(self, file_path):
-        """Leer y limpiar un archivo CSV, eliminando caracteres problemáticos y seleccionando columnas específicas."""
-        try:
-            with open(file_path, 'r', encoding='Latin-1') as file:
-                content = file.read()
-            
-            # Reemplazar caracteres problemáticos
-            content = content.replace('\x00', '')
-
-            # Usar StringIO para leer el contenido limpiado en un DataFrame
-            df = pd.read_csv(io.StringIO(content), sep=',', header=None, encoding='Latin-1', engine='python')
-            
-            # Seleccionar y renombrar columnas según sea necesario
-            df = df[[0, 2, 9]]
-            df.columns = ['Equipo', 'Fecha Hora', 'Estado']
-            df = df[(df['Equipo'].str.contains('AG_', na=False)) & 
-                    (df['Estado'].str.contains('en posición', na=False)) &
-                    (~df['Estado'].str.contains('libre', na=False)) & 
-                    (~df['Estado'].str.contains('ocupada', na=False))]
-            
-            return df
-        except Exception as e:
-            print(f"Error al procesar el archivo '{file_path}': {e}")
-            return pd.DataFrame()  # Retorna un DataFrame vacío en caso de error
+        # Renombrar columnas según sea necesario
+        df.columns = ['Equipo', 'Fecha Hora', 'Estado']
+        df = df[(df['Equipo'].str.contains('AG_', na=False)) & 
+                (df['Estado'].str.contains('en posición', na=False)) &
+                (~df['Estado'].str.contains('libre', na=False)) & 
+                (~df['Estado'].str.contains('ocupada', na=False))]
+        
+        return df
     
     def preprocess_data(self, progress_callback=None):
         """Realizar el preprocesamiento inicial de los datos"""
@@ -2,14 +2,23 @@
 import pandas as pd
 import numpy as np
 import os
+import functools
 from datetime import datetime, timedelta
 from processors.base_processor import BaseProcessor
+from processors.workbook_cache import read_sacem_workbook, read_workbook_header
+from processors.csv_dialect import read_csv_once, read_csv_header
 
 class ADVProcessorL2(BaseProcessor):
     """Procesador para datos ADV (Agujas) de la Línea 2"""
     
+    # v2: CSV leídos con el dialecto detectado (antes un CSV con comas quedaba en una sola columna)
+    PARSER_VERSION = 2
+    
     def __init__(self):
         super().__init__(line="L2", analysis_type="ADV")
+        # Conversión de libros Excel en procesos cuando no están en caché
+        self.ingest_mode = 'process'
+        self.ingest_workers = os.cpu_count() or 1
         # Atributos específicos para ADV L2
         self.df = None
         self.df_L2_ADV_DISC = None  # Discordancias de agujas
@@ -29,165 +38,33 @@ class ADVProcessorL2(BaseProcessor):
             raise FileNotFoundError(f"La ruta {self.root_folder_path} no existe")
         
         # Recorrer carpetas y encontrar archivos CSV o Excel
-        for root, dirs, files in os.walk(self.root_folder_path):
-            for file in files:
-                # Filtrar según el tipo de datos
-                if self.data_type == "Sacem":
-                    # Buscar archivos de Sacem relacionados con agujas
-                    if file.endswith(('.xlsx', '.xls', '.csv')) and ('AGS' in file or 'adv' in file.lower() or 'aguja' in file.lower()):
-                        self.data_files.append(os.path.join(root, file))
-                elif self.data_type == "SCADA":
-                    # En el futuro, aquí se implementará la lógica para archivos SCADA
-                    # Por ahora, solo registramos que está en desarrollo
-                    continue
+        self.source_files = []
+        for source in self.discover_files(self.root_folder_path):
+            file = source.name
+            # Filtrar según el tipo de datos
+            if self.data_type == "Sacem":
+                # Buscar archivos de Sacem relacionados con agujas
+                if file.endswith(('.xlsx', '.xls', '.csv')) and ('AGS' in file or 'adv' in file.lower() or 'aguja' in file.lower()):
+                    self.data_files.append(source.path)
+                    self.source_files.append(source)
+            elif self.data_type == "SCADA":
+                # En el futuro, aquí se implementará la lógica para archivos SCADA
+                # Por ahora, solo registramos que está en desarrollo
+                continue
         
         return len(self.data_files)
     
     def read_files(self, progress_callback=None):
         """Leer archivos CSV/Excel para análisis ADV de Línea 2"""
-        # Listas para almacenar datos de movimientos y discordancias
-        mov_data_frames = []
-        disc_data_frames = []
-        total_files = len(self.data_files)
+        # Leer solo los archivos nuevos o modificados (manifiesto de ingesta); los
+        # libros Excel se convierten una sola vez y se reutilizan desde su caché
+        read_file = functools.partial(self._read_sacem_file, workbook_cache=self.open_workbook_cache())
+        df_list = self.ingest_files(self.data_files, read_file, "Sacem", progress_callback,
+                                    progress_start=5, progress_end=20, max_workers=self.ingest_workers)
         
-        for i, file_path in enumerate(self.data_files):
-            try:
-                if progress_callback:
-                    progress = (i / total_files) * 15
-                    progress_callback(5 + progress, f"Procesando archivo {i+1} de {total_files}: {os.path.basename(file_path)}")
-                
-                # Leer archivo según su extensión
-                if file_path.lower().endswith('.csv'):
-                    # Probar diferentes codificaciones y separadores comunes para CSV
-                    try:
-                        # Primero intentar con separador punto y coma (común en configuraciones europeas)
-                        df = pd.read_csv(file_path, sep=';', encoding='utf-8')
-                    except:
-                        try:
-                            # Luego intentar con separador coma (estándar)
-                            df = pd.read_csv(file_path, sep=',', encoding='utf-8')
-                        except:
-                            try:
-                                # Intentar con codificación Latin-1
-                                df = pd.read_csv(file_path, sep=';', encoding='latin1')
-                            except:
-                                # Último intento con coma y Latin-1
-                                df = pd.read_csv(file_path, sep=',', encoding='latin1')
-                else:
-                    # Para archivos Excel
-                    try:
-                        # Primero intentar con pandas directamente
-                        df = pd.read_excel(file_path)
-                    except Exception as e1:
-                        # Si falla, intentar con engine='openpyxl'
-                        try:
-                            df = pd.read_excel(file_path, engine='openpyxl')
-                        except Exception as e2:
-                            # Último intento con engine='xlrd'
-                            df = pd.read_excel(file_path, engine='xlrd')
-                
-                # Determinar si el archivo contiene datos de movimientos o discordancias
-                is_movement_file = False
-                is_discordance_file = False
-                
-                # Comprobar el contenido del archivo para clasificarlo
-                if 'FECHA' in df.columns and 'HORA' in df.columns:
-                    # Verificar columnas con nombres que sugieran agujas
-                    ags_cols = [col for col in df.columns if (
-                        col.startswith('AGS') or 
-                        'AGUJA' in col.upper() or 
-                        'ADV' in col.upper()
-                    )]
-                    
-                    if ags_cols:
-                        # Si no hay columnas con 'DISCOR' o 'FALLO' en el nombre, asumimos que son movimientos
-                        if not any('DISCOR' in col.upper() or 'FALLO' in col.upper() for col in df.columns):
-                            is_movement_file = True
-                        else:
-                            is_discordance_file = True
-                
-                # Procesar movimientos
-                if is_movement_file:
-                    # Tomar las columnas necesarias
-                    ags_cols = [col for col in df.columns if (
-                        col.startswith('AGS') or 
-                        'AGUJA' in col.upper() or 
-                        'ADV' in col.upper()
-                    )]
-                    
-                    cols_to_keep = ['ciclo', 'FECHA', 'HORA'] + ags_cols
-                    cols_to_keep = [col for col in cols_to_keep if col in df.columns]
-                    
-                    if len(cols_to_keep) > 3:  # Asegurarnos de que hay al menos una columna de aguja
-                        df_subset = df[cols_to_keep]
-                        
-                        # Crear una versión "derretida" (melted) del dataframe
-                        id_vars = ['ciclo', 'FECHA', 'HORA']
-                        id_vars = [col for col in id_vars if col in df_subset.columns]
-                        
-                        df_melted = pd.melt(
-                            df_subset, 
-                            id_vars=id_vars, 
-                            value_vars=[col for col in cols_to_keep if col not in id_vars],
-                            var_name='Equipo',
-                            value_name='Movimiento'
-                        )
-                        
-                        # Añadir información básica
-                        df_melted['Estacion'] = df_melted['Equipo'].str.extract(r'AGS\s*(\w+)')
-                        df_melted['Fecha Hora'] = pd.to_datetime(
-                            df_melted['FECHA'].astype(str) + ' ' + df_melted['HORA'].astype(str),
-                            errors='coerce'
-                        )
-                        
-                        # Solo mantener registros cuando hubo un movimiento (valor = 1)
-                        df_melted = df_melted[df_melted['Movimiento'] == 1]
-                        
-                        # Agregar a la lista de movimientos
-                        mov_data_frames.append(df_melted)
-                
-                # Procesar discordancias
-                elif is_discordance_file:
-                    # Procesar de manera similar a los movimientos, pero con criterio de discordancia
-                    ags_cols = [col for col in df.columns if (
-                        (col.startswith('AGS') or 'AGUJA' in col.upper() or 'ADV' in col.upper()) and
-                        ('DISCOR' in col.upper() or 'FALLO' in col.upper())
-                    )]
-                    
-                    cols_to_keep = ['ciclo', 'FECHA', 'HORA'] + ags_cols
-                    cols_to_keep = [col for col in cols_to_keep if col in df.columns]
-                    
-                    if len(cols_to_keep) > 3:  # Asegurarnos de que hay al menos una columna de discordancia
-                        df_subset = df[cols_to_keep]
-                        
-                        # Crear una versión "derretida" (melted) del dataframe
-                        id_vars = ['ciclo', 'FECHA', 'HORA']
-                        id_vars = [col for col in id_vars if col in df_subset.columns]
-                        
-                        df_melted = pd.melt(
-                            df_subset, 
-                            id_vars=id_vars, 
-                            value_vars=[col for col in cols_to_keep if col not in id_vars],
-                            var_name='Equipo',
-                            value_name='Discordancia'
-                        )
-                        
-                        # Añadir información básica
-                        df_melted['Estacion'] = df_melted['Equipo'].str.extract(r'AGS\s*(\w+)')
-                        df_melted['Fecha Hora'] = pd.to_datetime(
-                            df_melted['FECHA'].astype(str) + ' ' + df_melted['HORA'].astype(str),
-                            errors='coerce'
-                        )
-                        
-                        # Solo mantener registros cuando hubo una discordancia (valor = 1)
-                        df_melted = df_melted[df_melted['Discordancia'] == 1]
-                        
-                        # Agregar a la lista de discordancias
-                        disc_data_frames.append(df_melted)
-            
-            except Exception as e:
-                if progress_callback:
-                    progress_callback(None, f"Error en archivo {file_path}: {str(e)}")
+        # Separar movimientos y discordancias según la columna de valor
+        mov_data_frames = [df for df in df_list if 'Movimiento' in df.columns]
+        disc_data_frames = [df for df in df_list if 'Discordancia' in df.columns]
         
         # Procesar datos de movimientos
         if mov_data_frames:
@@ -260,6 +137,83 @@ class ADVProcessorL2(BaseProcessor):
         
         return (self.df_L2_ADV_MOV is not None) or (self.df_L2_ADV_DISC is not None)
     
+    @staticmethod
+    def _classify_sacem_columns(columns):
+        """Clasificar un archivo Sacem por sus nombres de columna.
+        
+        Devuelve ('Movimiento' o 'Discordancia', columnas de agujas a cargar),
+        o (None, []) si el archivo no tiene datos de agujas.
+        """
+        columns = [col for col in columns if isinstance(col, str)]
+        if 'FECHA' not in columns or 'HORA' not in columns:
+            return None, []
+        
+        # Columnas con nombres que sugieran agujas
+        ags_cols = [col for col in columns if (
+            col.startswith('AGS') or 
+            'AGUJA' in col.upper() or 
+            'ADV' in col.upper()
+        )]
+        if not ags_cols:
+            return None, []
+        
+        # Si no hay columnas con 'DISCOR' o 'FALLO' en el nombre, son movimientos
+        if not any('DISCOR' in col.upper() or 'FALLO' in col.upper() for col in columns):
+            return 'Movimiento', ags_cols
+        return 'Discordancia', [col for col in ags_cols if 'DISCOR' in col.upper() or 'FALLO' in col.upper()]
+    
+    @staticmethod
+    def _read_sacem_file(file_path, workbook_cache=None):
+        """Leer un archivo Sacem y devolver sus movimientos o discordancias de agujas en formato largo"""
+        is_csv = file_path.lower().endswith('.csv')
+        
+        # Clasificar el archivo leyendo solo su encabezado: los archivos sin
+        # datos de agujas no llegan a cargarse
+        if is_csv:
+            header = read_csv_header(file_path)
+        else:
+            header = read_workbook_header(file_path)
+        kind, ags_cols = ADVProcessorL2._classify_sacem_columns(header)
+        if kind is None:
+            return pd.DataFrame()
+        
+        cols_to_keep = ['ciclo', 'FECHA', 'HORA'] + ags_cols
+        cols_to_keep = [col for col in cols_to_keep if col in header]
+        if len(cols_to_keep) <= 3:  # Asegurarnos de que hay al menos una columna de aguja
+            return pd.DataFrame()
+        
+        # Cargar solo las columnas necesarias
+        if is_csv:
+            df = read_csv_once(file_path, usecols=cols_to_keep)
+        else:
+            # Libro completo desde la caché compartida con CDV (solo columnas Sacem)
+            df = read_sacem_workbook(file_path, workbook_cache)
+        df_subset = df[cols_to_keep]
+        
+        # Crear una versión "derretida" (melted) del dataframe
+        id_vars = ['ciclo', 'FECHA', 'HORA']
+        id_vars = [col for col in id_vars if col in df_subset.columns]
+        
+        df_melted = pd.melt(
+            df_subset, 
+            id_vars=id_vars, 
+            value_vars=[col for col in cols_to_keep if col not in id_vars],
+            var_name='Equipo',
+            value_name=kind
+        )
+        
+        # Añadir información básica
+        df_melted['Estacion'] = df_melted['Equipo'].str.extract(r'AGS\s*(\w+)')
+        df_melted['Fecha Hora'] = pd.to_datetime(
+            df_melted['FECHA'].astype(str) + ' ' + df_melted['HORA'].astype(str),
+            errors='coerce'
+        )
+        
+        # Solo mantener registros cuando hubo un movimiento o una discordancia (valor = 1)
+        df_melted = df_melted[df_melted[kind] == 1]
+        
+        return df_melted
+    
     def preprocess_data(self, progress_callback=None):
         """No se requiere preprocesamiento adicional ya que se realizó durante la lectura"""
         if progress_callback:
@@ -2,15 +2,31 @@
 import pandas as pd
 import numpy as np
 import os
-import concurrent.futures
+import re
 from datetime import datetime, timedelta
-from processors.base_processor import BaseProcessor
+from processors.base_processor import BaseProcessor, count_rows, merge_counts
+from processors.pipeline_schema import map_labels
+from processors.source_formats import L4_LOG, read_source
+
+# Prefiltros de líneas: solo las que pueden ser de agujas llegan al parser
+MOVEMENT_LINE_FILTER = re.compile(rb'AGS')
+DISCORDANCE_LINE_FILTER = re.compile(rb'discordancia')
+
+# Claves del conteo diario de movimientos, calculado dentro de cada lectura
+MOVEMENT_COUNT_KEYS = ['Equipo', 'Fecha']
 
 class ADVProcessorL4(BaseProcessor):
     """Procesador para datos ADV (Agujas) de la Línea 4"""
     
+    # v3: lectura con descriptor de formato (columnas 0 a 2) y prefiltro de líneas
+    # v4: los archivos VID se guardan como conteos diarios de movimientos por equipo
+    PARSER_VERSION = 4
+    
     def __init__(self):
         super().__init__(line="L4", analysis_type="ADV")
+        # Lectura en procesos: el parser 'python' de pandas no libera el GIL
+        self.ingest_mode = 'process'
+        self.ingest_workers = os.cpu_count() or 1
         # Atributos específicos para ADV L4
         self.df = None
         self.df_L4_ADV_DISC = None  # Discordancias de agujas
@@ -25,29 +41,18 @@ class ADVProcessorL4(BaseProcessor):
         if not os.path.exists(self.root_folder_path):
             raise FileNotFoundError(f"La ruta {self.root_folder_path} no existe")
         
-        # Iterar sobre las carpetas dentro de la carpeta raíz
-        for folder1 in os.listdir(self.root_folder_path):
-            folder_path1 = os.path.join(self.root_folder_path, folder1)
-            if os.path.isdir(folder_path1):
-                # Iterar sobre las carpetas dentro de la carpeta actual
-                for folder2 in os.listdir(folder_path1):
-                    folder_path2 = os.path.join(folder_path1, folder2)
-                    if os.path.isdir(folder_path2):
-                        # Iterar sobre los archivos dentro de cada carpeta
-                        for file in os.listdir(folder_path2):
-                            # Verificar si el archivo contiene "VID" (para movimientos)
-                            if "VID" in file:
-                                try:
-                                    self.csv_files_vid.append(os.path.join(folder_path2, file))
-                                except ValueError:
-                                    print(f"Error al analizar la fecha del archivo: {file}")
-                            
-                            # Verificar si el archivo contiene "vent" (para discordancias)
-                            elif "vent" in file:
-                                try:
-                                    self.csv_files_vent.append(os.path.join(folder_path2, file))
-                                except ValueError:
-                                    print(f"Error al analizar la fecha del archivo: {file}")
+        # Archivos dentro de las carpetas de segundo nivel (raíz/carpeta1/carpeta2/archivo)
+        self.source_files = []
+        for source in self.discover_files(self.root_folder_path, depth=2):
+            # Verificar si el archivo contiene "VID" (para movimientos)
+            if "VID" in source.name:
+                self.csv_files_vid.append(source.path)
+            # Verificar si el archivo contiene "vent" (para discordancias)
+            elif "vent" in source.name:
+                self.csv_files_vent.append(source.path)
+            else:
+                continue
+            self.source_files.append(source)
         
         return len(self.csv_files_vid) + len(self.csv_files_vent)
     
@@ -64,106 +69,82 @@ class ADVProcessorL4(BaseProcessor):
         
         return self.df_L4_ADV_MOV is not None or self.df_L4_ADV_DISC is not None
     
+    @staticmethod
+    def _read_movement_file(csv_file):
+        """Leer un archivo VID y conservar solo los movimientos de agujas"""
+        # Leer el archivo y filtrar por agujas (AGS)
+        df = read_source(csv_file, L4_LOG, line_filter=MOVEMENT_LINE_FILTER)
+        df = df[df[1].str.contains('AGS', na=False)]
+        
+        # Filtrar por eventos de posición (normal o reverso)
+        df = df[df[2].str.contains('normal|reverso')]
+        return df[df[1].str.contains('posicion')]
+    
+    @staticmethod
+    def _read_movement_counts(csv_file):
+        """Leer un archivo VID y devolver sus movimientos contados por equipo y día"""
+        df = ADVProcessorL4._movement_events(ADVProcessorL4._read_movement_file(csv_file))
+        df['Fecha'] = df['Fecha Hora'].dt.date
+        return count_rows(df, MOVEMENT_COUNT_KEYS)
+    
+    @staticmethod
+    def _movement_events(df):
+        """Obtener el equipo y la fecha y hora de cada movimiento en el horario operativo (6 a 23 h)"""
+        if df.empty:
+            return pd.DataFrame({'Fecha Hora': pd.Series(dtype='datetime64[ns]'), 'Equipo': pd.Series(dtype=object)})
+        
+        # Equipo (categórico): parte anterior a ':' de la columna 1, limpiada una vez por señal distinta
+        equipo = map_labels(df[1], ADVProcessorL4._equipment_labels)
+        df = pd.DataFrame({'Fecha Hora': pd.to_datetime(df[0], dayfirst=True), 'Equipo': equipo})
+        
+        # Filtrar por horario operativo (6am a 11pm)
+        hours = df['Fecha Hora'].dt.hour
+        return df[(hours >= 6) & (hours <= 23)].copy()
+    
+    @staticmethod
+    def _equipment_labels(labels):
+        """Nombre limpio del equipo de cada señal: sin '__', 'TR_' ni '_' tras un dígito"""
+        labels = labels.str.split(":", expand=True)[0].str.replace("__", "_")
+        labels = labels.str.replace("TR_", "")
+        for i in range(10):
+            labels = labels.str.replace(f"{i}_", f"{i}")
+        return labels
+    
+    @staticmethod
+    def _read_discordance_file(csv_file):
+        """Leer un archivo vent y conservar solo las discordancias de agujas"""
+        # Leer el archivo y filtrar por agujas (AGS)
+        df = read_source(csv_file, L4_LOG, line_filter=DISCORDANCE_LINE_FILTER)
+        df = df[df[1].str.contains('AGS', na=False)]
+        
+        # Filtrar por discordancias
+        return df[df[2].str.contains('discordancia')]
+    
     def _process_movement_files(self, progress_callback=None):
         """Procesar archivos de movimientos de agujas (VID)"""
         if progress_callback:
             progress_callback(10, "Procesando archivos de movimientos...")
         
-        df_list = []
-        total_files = len(self.csv_files_vid)
-        
-        # Función para procesar un solo archivo
-        def process_file(index_file_tuple):
-            index, csv_file = index_file_tuple
-            try:
-                # Leer el archivo y filtrar por agujas (AGS)
-                df = pd.read_table(csv_file, encoding="Latin-1", sep="|", skiprows=0, header=None, engine='python')
-                df = df[df[1].str.contains('AGS', na=False)]
-                
-                # Filtrar por eventos de posición (normal o reverso)
-                df = df[df[2].str.contains('normal|reverso')]
-                df = df[df[1].str.contains('posicion')]
-                
-                if progress_callback and index % 5 == 0:  # Actualizar cada 5 archivos para no saturar la UI
-                    progress = 10 + (index / total_files) * 10
-                    progress_callback(progress, f"Procesando archivo de movimientos {index+1} de {total_files}")
-                
-                return df
-            except Exception as e:
-                if progress_callback:
-                    progress_callback(None, f"No se pudo leer el archivo {csv_file} debido a un error: {e}")
-                return pd.DataFrame()  # Retornar DataFrame vacío en caso de error
-        
-        # Usar ThreadPoolExecutor para procesar archivos en paralelo
-        with concurrent.futures.ThreadPoolExecutor(max_workers=min(10, os.cpu_count() or 1)) as executor:
-            results = list(executor.map(process_file, enumerate(self.csv_files_vid)))
-        
-        # Filtrar DataFrames vacíos y concatenar resultados
-        df_list = [df for df in results if not df.empty]
+        # Leer en paralelo solo los archivos nuevos o modificados (manifiesto de ingesta),
+        # compartiendo la lectura con el procesador CDV si ambos corren a la vez; cada
+        # lectura entrega solo el conteo diario de movimientos por equipo
+        df_list = self.ingest_files(
+            self.csv_files_vid, self._read_movement_counts, "VID", progress_callback,
+            progress_start=10, progress_end=20, max_workers=min(10, os.cpu_count() or 1), shared=True,
+            split_header=L4_LOG.skiprows
+        )
         
         if not df_list:
             if progress_callback:
                 progress_callback(None, "No se encontraron datos válidos en los archivos de movimientos.")
             return None
         
-        # Concatenar resultados
+        # Unir los conteos parciales de cada archivo (memoria según equipos x días,
+        # no según la cantidad de eventos)
         if progress_callback:
             progress_callback(20, "Procesando datos de movimientos...")
         
-        df = pd.concat(df_list, ignore_index=True)
-        
-        # Procesamiento para extraer información
-        df_aux = df[1].str.split(":", expand=True)
-        df_aux.columns = ["COL.1", "COL.2"]
-        df = df.join(df_aux)
-        
-        df_aux_2 = df["COL.2"].str.split("_", expand=True)
-        df_aux_2.columns = ["COL.3", "COL.4"]
-        df = df.join(df_aux_2)
-        
-        df["COL.1"] = df["COL.1"].str.replace("__", "_")
-        df_aux_3 = df["COL.1"].str.split("_", expand=True)
-        df_aux_3.columns = ["COL.5", "COL.6", "COL.7", "COL.8", "COL.9"]
-        df = df.join(df_aux_3)
-        
-        # Seleccionar columnas y renombrar
-        cols = [0, 4, 8, 10, 11, 7, 2, 3, 5, 6, 1, 9, 12]
-        df = df.iloc[:, cols]
-        df = df.drop(df.columns[[7, 8, 9, 10, 11, 12]], axis=1)
-        
-        df.rename(
-            columns={0: "Fecha Hora", "COL.1": "Equipo", "COL.5": "Estacion", 
-                    "COL.7": "Subsistema", "COL.8": "Numero Equipo", "COL.4": "Atributo", 2: "Estado"},
-            inplace=True
-        )
-        
-        # Limpieza y preparación adicional
-        df["Numero Equipo"] = df["Numero Equipo"].astype("string")
-        df = df.sort_values(["Equipo", "Fecha Hora"])
-        df["Fecha Hora"] = pd.to_datetime(df["Fecha Hora"], dayfirst=True)
-        df = df.reset_index()
-        
-        if "index" in df.columns:
-            df = df.drop("index", axis=1)
-        
-        # Eliminar columnas no necesarias
-        df = df.drop(["Subsistema", "Numero Equipo", "Atributo"], axis=1)
-        
-        # Filtrar por horario operativo (6am a 11pm)
-        df.set_index('Fecha Hora', inplace=True)
-        df = df[(df.index.hour >= 6) & (df.index.hour <= 23)]
-        df = df.reset_index()
-        
-        # Limpiar y procesar equipo
-        df["Equipo"] = df["Equipo"].str.replace("TR_", "")
-        for i in range(10):
-            df["Equipo"] = df["Equipo"].str.replace(f"{i}_", f"{i}")
-        
-        # Extraer fecha para agrupar por día
-        df['Fecha'] = df['Fecha Hora'].dt.date
-        
-        # Agrupar por equipo y fecha para contar movimientos
-        df_mov = df.groupby(['Equipo', 'Fecha']).size().reset_index(name='Count')
+        df_mov = merge_counts(df_list, MOVEMENT_COUNT_KEYS)
         
         # Dividir la columna 'Equipo' para obtener estación
         equipo_split = df_mov['Equipo'].str.split('_', n=1, expand=True)
@@ -183,36 +164,12 @@ class ADVProcessorL4(BaseProcessor):
         if progress_callback:
             progress_callback(30, "Procesando archivos de discordancias...")
         
-        df_list = []
-        total_files = len(self.csv_files_vent)
-        
-        # Función para procesar un solo archivo
-        def process_file(index_file_tuple):
-            index, csv_file = index_file_tuple
-            try:
-                # Leer el archivo y filtrar por agujas (AGS)
-                df = pd.read_table(csv_file, encoding="Latin-1", sep="|", skiprows=0, header=None, engine='python')
-                df = df[df[1].str.contains('AGS', na=False)]
-                
-                # Filtrar por discordancias
-                df = df[df[2].str.contains('discordancia')]
-                
-                if progress_callback and index % 5 == 0:  # Actualizar cada 5 archivos para no saturar la UI
-                    progress = 30 + (index / total_files) * 10
-                    progress_callback(progress, f"Procesando archivo de discordancias {index+1} de {total_files}")
-                
-                return df
-            except Exception as e:
-                if progress_callback:
-                    progress_callback(None, f"No se pudo leer el archivo {csv_file} debido a un error: {e}")
-                return pd.DataFrame()  # Retornar DataFrame vacío en caso de error
-        
-        # Usar ThreadPoolExecutor para procesar archivos en paralelo
-        with concurrent.futures.ThreadPoolExecutor(max_workers=min(10, os.cpu_count() or 1)) as executor:
-            results = list(executor.map(process_file, enumerate(self.csv_files_vent)))
-        
-        # Filtrar DataFrames vacíos y concatenar resultados
-        df_list = [df for df in results if not df.empty]
+        # Leer en paralelo solo los archivos nuevos o modificados (manifiesto de ingesta)
+        df_list = self.ingest_files(
+            self.csv_files_vent, self._read_discordance_file, "vent", progress_callback,
+            progress_start=30, progress_end=40, max_workers=min(10, os.cpu_count() or 1),
+            split_header=L4_LOG.skiprows
+        )
         
         if not df_list:
             if progress_callback:
@@ -2,12 +2,20 @@
 import pandas as pd
 import numpy as np
 import os
+import re
 from datetime import datetime, timedelta
 from processors.base_processor import BaseProcessor
+from processors.source_formats import L5_TXT, TXT_EXTENSIONS, scan_mapped
+
+# Prefiltro de líneas: solo las que son de posición de agujas llegan al parser
+POSITION_LINE_FILTER = re.compile(rb'Posicion aguja')
 
 class ADVProcessorL5(BaseProcessor):
     """Procesador para datos ADV (Agujas) de la Línea 5"""
     
+    # v3: lectura con descriptor de formato (columnas 0 a 5) y prefiltro de líneas
+    PARSER_VERSION = 3
+    
     def __init__(self):
         super().__init__(line="L5", analysis_type="ADV")
         # Atributos específicos para ADV L5
@@ -23,35 +31,22 @@ class ADVProcessorL5(BaseProcessor):
         if not os.path.exists(self.root_folder_path):
             raise FileNotFoundError(f"La ruta {self.root_folder_path} no existe")
             
-        # Recorrer carpetas y encontrar archivos TXT
-        for folder in os.listdir(self.root_folder_path):
-            folder_path = os.path.join(self.root_folder_path, folder)
-            if os.path.isdir(folder_path):
-                for file in os.listdir(folder_path):
-                    if file.endswith('.txt'):
-                        self.txt_files.append(os.path.join(folder_path, file))
+        # Recorrer carpetas y encontrar archivos TXT, también comprimidos (un nivel por debajo de la raíz)
+        self.source_files = [
+            source for source in self.discover_files(self.root_folder_path, depth=1)
+            if source.name.endswith(TXT_EXTENSIONS)
+        ]
+        self.txt_files = [source.path for source in self.source_files]
         
         return len(self.txt_files)
     
     def read_files(self, progress_callback=None):
         """Leer archivos TXT para análisis ADV de Línea 5"""
-        df_list = []
-        total_files = len(self.txt_files)
-        
-        for i, txt in enumerate(self.txt_files):
-            try:
-                if progress_callback:
-                    progress = (i / total_files) * 15
-                    progress_callback(5 + progress, f"Procesando archivo {i+1} de {total_files}: {os.path.basename(txt)}")
-                
-                # Leer archivo TXT
-                df = pd.read_csv(txt, encoding="Latin-1", sep=";", skiprows=7, header=None, engine='python')
-                # Filtrar solo filas con datos de agujas
-                df = df[df[5].str.contains('Posicion aguja', na=False)]
-                df_list.append(df)
-            except Exception as e:
-                if progress_callback:
-                    progress_callback(None, f"Error en archivo {txt}: {str(e)}")
+        # Leer solo los archivos nuevos o modificados (manifiesto de ingesta), compartiendo
+        # la lectura con el procesador CDV si ambos corren a la vez
+        df_list = self.ingest_files(self.txt_files, self._read_txt_file, "TXT", progress_callback,
+                                    progress_start=5, progress_end=20, shared=True,
+                                    split_header=L5_TXT.skiprows)
         
         if df_list:
             self.df = pd.concat(df_list, ignore_index=True)
@@ -60,6 +55,14 @@ class ADVProcessorL5(BaseProcessor):
         else:
             return False
     
+    @staticmethod
+    def _read_txt_file(txt):
+        """Leer un archivo TXT y conservar solo las filas de agujas"""
+        # Leer archivo TXT
+        df = scan_mapped(txt, L5_TXT, line_filter=POSITION_LINE_FILTER)
+        # Filtrar solo filas con datos de agujas
+        return df[df[5].str.contains('Posicion aguja', na=False)]
+    
     def preprocess_data(self, progress_callback=None):
         """Realizar el preprocesamiento inicial de los datos"""
         if progress_callback:
@@ -70,9 +73,7 @@ class ADVProcessorL5(BaseProcessor):
         self.df["Fecha Hora"] = pd.to_datetime(self.df["Fecha Hora"], dayfirst=True, errors='coerce')
         
         # Eliminar columnas innecesarias y reordenar
-        self.df = self.df.drop(self.df.columns[[0,1,6,7]], axis=1)
-        cols = [4,2,0,1,3]
-        self.df = self.df.iloc[:,cols]
+        self.df = self.df[["Fecha Hora", 4, 2, 3, 5]]
         
         # Renombrar columnas
         self.df.rename(
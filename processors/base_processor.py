@@ -3,10 +3,49 @@ import pandas as pd
 import numpy as np
 import os
 from datetime import datetime, timedelta
+from processors.ingest_manifest import IngestManifest
+from processors.parsed_cache import ParsedCache
+from processors.workbook_cache import WorkbookCache
+from processors.baseline_store import BaselineStore
+from processors.pipeline_schema import is_categorical, label_codes
+from processors.source_discovery import SourceDiscovery, probe_last_date
+from processors.read_ahead import is_network_path
+from processors.file_ingest import FileIngest
+
+# Columnas de diferencias con los registros vecinos: desplazamiento en filas
+# (positivo: registros anteriores; negativo: siguientes)
+NEIGHBOUR_OFFSETS = (
+    ('Diff.Time_-1_row', 1),
+    ('Diff.Time_-2_row', 2),
+    ('Diff.Time_+1_row', -1),
+    ('Diff.Time_+2_row', -2),
+)
+
+# Estadísticas por equipo y clase de estado, en el orden de las columnas de salida
+STATE_STATISTICS = ('mean', 'median', 'std')
+
+def count_rows(df, keys):
+    """Conteo parcial de filas por `keys`, para agregar dentro de cada lectura en lugar de devolver las filas"""
+    return df.groupby(keys, observed=True).size().reset_index(name='Count')
+
+def merge_counts(partials, keys):
+    """Unir conteos parciales de `count_rows` sumándolos por `keys`"""
+    if not partials:
+        return pd.DataFrame(columns=list(keys) + ['Count'])
+    merged = pd.concat(partials, ignore_index=True)
+    return merged.groupby(keys, observed=True)['Count'].sum().reset_index()
 
 class BaseProcessor:
     """Clase base para procesadores de datos del Metro de Santiago"""
     
+    # Versión de los lectores de archivos fuente: incrementarla en una subclase
+    # cuando cambie el filtrado por archivo invalida su caché de lecturas
+    PARSER_VERSION = 1
+    
+    # Días de margen al descartar archivos por la ventana de análisis (cambios
+    # de día, zonas horarias y datos escritos después de la fecha del nombre)
+    WINDOW_MARGIN_DAYS = 1
+    
     def __init__(self, line="L5", analysis_type="CDV"):
         self.line = line
         self.analysis_type = analysis_type
@@ -15,6 +54,56 @@ class BaseProcessor:
         self.txt_files = []
         self.df = None  # DataFrame principal
         
+        # Manifiesto de ingesta para reutilizar archivos sin cambios entre ejecuciones
+        self.use_ingest_manifest = True
+        # Tamaño máximo total de las cachés en disco (MB), repartido según su
+        # BUDGET_SHARE: lecturas 50 %, libros Excel 40 %, estadísticas de referencia 10 %
+        self.parsed_cache_max_mb = 2048
+        
+        # Ejecución de la lectura en paralelo: 'thread' o 'process'. En modo
+        # 'process' la función de lectura debe poder serializarse (función de
+        # módulo o staticmethod). ingest_workers=None usa el valor del procesador
+        self.ingest_mode = 'thread'
+        self.ingest_workers = None
+        self.ingest_chunksize = 1
+        
+        # Lectura compartida con el procesador de la otra especialidad (CDV/ADV)
+        # cuando ambos corren a la vez sobre los mismos archivos
+        self.shared_scan = None
+        
+        # Búsqueda de archivos: hilos para recorrer las carpetas de primer nivel
+        # (None usa el valor por defecto) y registros de los archivos encontrados
+        self.discovery_workers = None
+        self.source_files = []
+        
+        # Ventana de análisis en días (None: se leen todos los archivos). Los
+        # archivos cuyos datos terminan antes de la ventana no se leen
+        self.window_days = None
+        
+        # Lectura anticipada de los archivos fuente mientras se interpretan otros:
+        # True, False o 'auto' (solo si la carpeta de origen está en un recurso de
+        # red). prefetch_latency agrega una espera por bloque leído (pruebas)
+        self.prefetch = 'auto'
+        self.prefetch_workers = 4
+        self.prefetch_max_mb = 256
+        self.prefetch_latency = 0.0
+        
+        # Lectura por tramos de los archivos grandes (desde split_min_mb MB): se
+        # dividen en tramos de unos split_chunk_mb MB que se leen en paralelo con
+        # split_workers trabajadores (None usa la cantidad de CPU)
+        self.split_min_mb = 256
+        self.split_chunk_mb = 64
+        self.split_workers = None
+        
+        # Estadísticas de referencia por equipo (medianas de los umbrales FO/FL):
+        # 'exact' las recalcula sobre toda la ventana en cada ejecución;
+        # 'incremental' combina resúmenes diarios guardados en la carpeta de
+        # salida y solo resume los días nuevos o modificados, pero la mediana es
+        # aproximada (error relativo baseline_alpha) y las marcas FO/FL de los
+        # eventos cercanos al umbral pueden cambiar
+        self.baseline_mode = 'exact'
+        self.baseline_alpha = BaselineStore.DEFAULT_ALPHA
+        
     def set_paths(self, root_folder_path, output_folder_path):
         """Establecer rutas de origen y destino"""
         self.root_folder_path = root_folder_path
@@ -24,6 +113,334 @@ class BaseProcessor:
         """Establecer tipo de análisis (CDV o ADV)"""
         self.analysis_type = analysis_type
     
+    def open_manifest(self, variant):
+        """Abrir el manifiesto de ingesta para una variante de lectura del procesador"""
+        if not self.use_ingest_manifest or not self.output_folder_path:
+            return None
+        key = f"{self.line}_{self.analysis_type}_{variant}"
+        try:
+            return IngestManifest(self.output_folder_path, key, self.line, self.analysis_type)
+        except OSError:
+            return None
+    
+    def cache_max_bytes(self, cache_class):
+        """Parte de `parsed_cache_max_mb` que corresponde a una caché en disco (bytes)"""
+        return int(self.parsed_cache_max_mb * cache_class.BUDGET_SHARE * 1024 * 1024)
+    
+    def open_parsed_cache(self):
+        """Abrir la caché de lecturas compartida de la carpeta de salida"""
+        if not self.use_ingest_manifest or not self.output_folder_path:
+            return None
+        try:
+            base_folder = os.path.join(self.output_folder_path, IngestManifest.MANIFEST_DIR)
+            return ParsedCache(base_folder, self.cache_max_bytes(ParsedCache))
+        except OSError:
+            return None
+    
+    def open_workbook_cache(self):
+        """Abrir la caché de libros Excel convertidos de la carpeta de salida"""
+        if not self.use_ingest_manifest or not self.output_folder_path:
+            return None
+        try:
+            base_folder = os.path.join(self.output_folder_path, IngestManifest.MANIFEST_DIR)
+            return WorkbookCache(base_folder, self.cache_max_bytes(WorkbookCache))
+        except OSError:
+            return None
+    
+    def open_baseline_store(self, value, classes):
+        """Abrir el almacén de estadísticas de referencia del procesador para `value` y `classes`"""
+        if not self.use_ingest_manifest or not self.output_folder_path:
+            return None
+        # Las clases y la columna resumida forman parte del nombre del almacén
+        variant = IngestManifest.bytes_hash(repr((value, tuple(classes))).encode('utf-8'))[:8]
+        try:
+            base_folder = os.path.join(self.output_folder_path, IngestManifest.MANIFEST_DIR)
+            return BaselineStore(base_folder, f"{self.line}_{self.analysis_type}_{variant}",
+                                 self.baseline_alpha, self.cache_max_bytes(BaselineStore))
+        except OSError:
+            return None
+    
+    def discover_files(self, root, depth=None):
+        """Buscar los archivos bajo `root` y devolver sus registros (`SourceFile`).
+        
+        Los listados de carpetas se guardan en la carpeta de salida para no
+        volver a listar en la próxima ejecución las carpetas que no cambiaron.
+        Con `depth=n` solo se devuelven los archivos que están exactamente `n`
+        carpetas por debajo de `root`.
+        """
+        if self.use_ingest_manifest and self.output_folder_path:
+            cache_folder = os.path.join(self.output_folder_path, IngestManifest.MANIFEST_DIR)
+            discovery = SourceDiscovery.for_root(cache_folder, root, max_workers=self.discovery_workers)
+        else:
+            discovery = SourceDiscovery(max_workers=self.discovery_workers)
+        
+        files = discovery.discover(root, depth)
+        try:
+            discovery.save()
+        except OSError as e:
+            print(f"No se pudo guardar la caché de listados de {root}: {e}")
+        return files
+    
+    def window_start(self):
+        """Primer día de la ventana de análisis, con margen (None si no hay ventana)"""
+        if not self.window_days:
+            return None
+        return (datetime.now() - timedelta(days=self.window_days + self.WINDOW_MARGIN_DAYS)).date()
+    
+    def source_last_date(self, path, size, mtime, manifest=None, name_date=None):
+        """Estimar la fecha de los últimos datos de un archivo sin interpretarlo.
+        
+        Se usa la fecha del nombre del archivo o de sus carpetas; si no la hay,
+        la registrada en el manifiesto o, en su defecto, la de la última línea
+        (o de los miembros de un ZIP). Si el archivo se modificó después de la
+        fecha de su nombre (más el margen de la ventana), esa fecha no acota sus
+        datos y se examina la última línea. La fecha de modificación es siempre
+        una cota superior. Devuelve None si no se puede estimar.
+        """
+        last_date = datetime.fromtimestamp(mtime / 1e9).date()
+        if name_date is not None and last_date > name_date + timedelta(days=self.WINDOW_MARGIN_DAYS):
+            # P. ej. un registro al que se siguen agregando líneas: solo se
+            # descarta si su última línea lo confirma
+            name_date = None
+        elif name_date is None and manifest is not None:
+            name_date = manifest.last_date(path, size, mtime)
+        if name_date is None and last_date >= self.window_start():
+            try:
+                name_date = probe_last_date(path)
+            except (OSError, ValueError) as e:
+                print(f"No se pudo examinar el final del archivo {path}: {e}")
+        if name_date is not None:
+            last_date = min(last_date, name_date)
+        return last_date
+    
+    def staging_mode(self, buffered, mode):
+        """Modo de lectura anticipada de una ingesta: None (desactivada), 'memory' o 'local'"""
+        if not self.prefetch:
+            return None
+        if self.prefetch == 'auto' and not (self.root_folder_path and is_network_path(self.root_folder_path)):
+            return None
+        # Los procesos de trabajo y los lectores que necesitan una ruta usan copias locales
+        return 'memory' if buffered and mode != 'process' else 'local'
+    
+    def ingest_files(self, files, parse_file, variant, progress_callback=None,
+                     progress_start=5, progress_end=20, max_workers=1, shared=False, mode=None,
+                     split_header=None):
+        """Leer una lista de archivos reutilizando las filas de los que no cambiaron.
+        
+        `parse_file(path)` debe devolver un DataFrame con las filas ya filtradas
+        del archivo. Si `max_workers` > 1 los archivos se leen en paralelo con
+        hilos o procesos según `mode` (por defecto `ingest_mode`). Con
+        `shared=True` y un `shared_scan` asignado, el contenido de cada archivo
+        se obtiene de la lectura compartida y `parse_file` recibe un buffer en
+        lugar de la ruta. Los archivos sin cambios (mismo tamaño y mtime) y las
+        copias idénticas con otro nombre (mismo hash) se cargan desde la caché
+        de lecturas sin volver a interpretarlos. Devuelve la lista de
+        DataFrames no vacíos en el orden de `files`.
+
+        Las etapas de la ingesta están en `FileIngest`.
+        
+        Con `split_header` (líneas de encabezado del formato, su `skiprows`) los
+        archivos de al menos `split_min_mb` MB se dividen en tramos que se leen
+        en paralelo y se unen en orden; `parse_file` recibe entonces cada tramo
+        (un `ByteRange`, que `read_source` acepta) y debe filtrar fila a fila.
+        """
+        return FileIngest(self, files, parse_file, variant, progress_callback, progress_start,
+                          progress_end, max_workers, shared, mode, split_header).run()
+    
+    @staticmethod
+    def state_codes(states, labels):
+        """Códigos de estado int8 según `labels` (etiqueta -> código); otros valores quedan en -1"""
+        codes, uniques = label_codes(pd.Series(states))
+        # Un código por etiqueta distinta; la última posición es la de los nulos
+        mapped = pd.Series(np.asarray(uniques, dtype=object)).map(labels).fillna(-1).to_numpy(dtype=np.int8)
+        return np.append(mapped, np.int8(-1))[codes]
+    
+    @staticmethod
+    def group_starts(keys):
+        """Marcar la primera fila de cada grupo en una secuencia ya ordenada por `keys` (p. ej. equipo)"""
+        if is_categorical(keys):
+            keys = keys.cat.codes
+        keys = np.asarray(keys)
+        if not np.issubdtype(keys.dtype, np.integer):
+            keys = pd.factorize(keys)[0]
+        starts = np.ones(len(keys), dtype=bool)
+        np.not_equal(keys[1:], keys[:-1], out=starts[1:])
+        return starts
+    
+    @staticmethod
+    def transition_mask(codes, starts=None, keep_first=True):
+        """Filas que inician un estado en una sola pasada vectorizada.
+        
+        `codes` son los códigos de estado ordenados por equipo y fecha, y `starts`
+        marca la primera fila de cada equipo (None: un solo grupo). Una fila se
+        conserva si su estado difiere del de la fila anterior del mismo grupo, es
+        decir, se eliminan los estados repetidos consecutivos. La primera fila de
+        cada grupo no tiene estado anterior: se conserva con `keep_first=True` y
+        se descarta con `keep_first=False` (como el antiguo `diff()` por texto,
+        que dejaba NA en esas filas).
+        """
+        codes = np.asarray(codes)
+        mask = np.empty(len(codes), dtype=bool)
+        mask[:1] = keep_first
+        np.not_equal(codes[1:], codes[:-1], out=mask[1:])
+        if starts is not None:
+            mask[starts] = keep_first
+        return mask
+    
+    @staticmethod
+    def neighbour_deltas(times, starts=None, decimals=1):
+        """Diferencias en segundos con los registros vecinos (±1 y ±2 filas) en una sola pasada.
+        
+        `times` son las fechas ya ordenadas y `starts` marca la primera fila de
+        cada equipo (None: un solo grupo, la comparación es continua). Devuelve
+        un diccionario columna -> arreglo float64 redondeado a `decimals` (las
+        diferencias hacia adelante en positivo; NaN sin vecino en el grupo o con
+        fecha nula) y la máscara de filas con las cuatro diferencias >= 0.
+        """
+        ns = np.asarray(times, dtype='datetime64[ns]').view(np.int64)
+        size = len(ns)
+        present = ns != np.iinfo(np.int64).min  # NaT
+        group = np.cumsum(starts) if starts is not None else None
+        
+        deltas = {}
+        valid = np.ones(size, dtype=bool)
+        for column, offset in NEIGHBOUR_OFFSETS:
+            delta = np.full(size, np.nan)
+            shift = abs(offset)
+            if shift < size:
+                # Fila actual y vecina: anterior (offset > 0) o siguiente (offset < 0)
+                current, other = (slice(shift, None), slice(None, -shift)) if offset > 0 else (slice(None, -shift), slice(shift, None))
+                paired = present[current] & present[other]
+                if group is not None:
+                    paired &= group[current] == group[other]
+                seconds = (ns[current] - ns[other]) / 10**9
+                delta[current] = np.where(paired, seconds if offset > 0 else -seconds, np.nan)
+            np.round(delta, decimals, out=delta)
+            valid &= delta >= 0.0
+            deltas[column] = delta
+        return deltas, valid
+    
+    def time_differences(self, df, decimals=1, by_equipment=False):
+        """Agregar las diferencias con los registros vecinos y el tiempo conjunto, conservando solo las filas válidas.
+        
+        Equivale a calcular cada `diff(periods=±1/±2)` (por equipo si
+        `by_equipment`), pasarla a segundos redondeados a `decimals`, filtrar
+        los tiempos negativos o nulos y sumar `Diff.Time_-1_row` y
+        `Diff.Time_+2_row` (redondeado a 2 decimales) en `Tiempo Conjunto`.
+        """
+        starts = self.group_starts(df['Equipo']) if by_equipment else None
+        deltas, valid = self.neighbour_deltas(df['Fecha Hora'].to_numpy(), starts, decimals)
+        if by_equipment:
+            # groupby() deja sin diferencias a los registros sin equipo
+            valid &= df['Equipo'].notna().to_numpy()
+        
+        columns = {column: delta[valid] for column, delta in deltas.items()}
+        columns['Tiempo Conjunto'] = np.round(columns['Diff.Time_-1_row'] + columns['Diff.Time_+2_row'], 2)
+        return df[valid].assign(**columns)
+
+    @staticmethod
+    def label_mask(labels, pattern):
+        """`labels.str.contains(pattern)` evaluado una vez por etiqueta distinta (nulos: False)"""
+        codes, uniques = label_codes(labels)
+        matches = np.append(pd.Series(uniques, dtype=object).str.contains(pattern, na=False).to_numpy(dtype=bool), False)
+        return matches[codes]
+
+    @staticmethod
+    def sorted_by(df, columns):
+        """Indicar si el DataFrame ya está ordenado (ascendente) por `columns`"""
+        if len(df) < 2:
+            return True
+        equal = np.ones(len(df) - 1, dtype=bool)
+        ordered = np.zeros(len(df) - 1, dtype=bool)
+        try:
+            for column in columns:
+                values = df[column]
+                if is_categorical(values) and values.cat.categories.is_monotonic_increasing:
+                    # Categorías en orden lexicográfico: los códigos ordenan igual que el texto
+                    values = values.cat.codes
+                values = values.to_numpy()
+                ordered |= equal & (values[:-1] < values[1:])
+                equal &= values[:-1] == values[1:]
+        except TypeError:
+            return False
+        return bool((ordered | equal).all())
+
+    def state_statistics(self, df, classes, value="Diff.Time_-1_row", stats=STATE_STATISTICS):
+        """Agregar a cada fila las estadísticas de `value` de su equipo para cada clase de estado.
+
+        `classes` asocia un sufijo (p. ej. 'lib' u 'oc') a la máscara de filas de
+        esa clase. Todas las clases se agregan en un único `groupby` por
+        (equipo, clase) y se reparten a las filas por el código del equipo.
+        Equivale a un `pivot_table` por clase seguido de `merge(on="Equipo")`
+        y `sort_values(["Equipo", "Fecha Hora"])`: solo quedan los equipos con
+        datos en todas las clases y el índice se renumera. Con
+        `baseline_mode='incremental'` las estadísticas salen del almacén de
+        resúmenes (`baseline_statistics`) en lugar del `groupby`.
+        """
+        codes, uniques = label_codes(df['Equipo'])
+        n_classes = len(classes)
+        n_groups = (int(codes.max()) + 1 if len(codes) else 0) * n_classes
+
+        state = np.full(len(df), -1, dtype=np.int64)
+        for position, mask in enumerate(classes.values()):
+            state[np.asarray(mask, dtype=bool) & (state < 0)] = position
+        selected = (state >= 0) & (codes >= 0)
+
+        summary = None
+        if self.baseline_mode == 'incremental' and tuple(stats) == BaselineStore.STATISTICS:
+            summary = self.baseline_statistics(df, classes, value, uniques, codes, state, selected)
+        if summary is None:
+            values = pd.Series(df[value].to_numpy()[selected])
+            summary = values.groupby(codes[selected] * n_classes + state[selected]).agg(list(stats))
+            # pivot_table descarta los grupos sin ningún valor
+            summary = summary[summary.notna().any(axis=1)]
+
+        table = np.full((n_groups, len(stats)), np.nan)
+        table[summary.index.to_numpy()] = summary.to_numpy()
+        present = np.zeros(n_groups, dtype=bool)
+        present[summary.index.to_numpy()] = True
+        complete = present.reshape(-1, n_classes).all(axis=1)
+
+        keep = codes >= 0
+        keep[keep] = complete[codes[keep]]
+        result = df[keep].reset_index(drop=True)
+        row_codes = codes[keep]
+        if not self.sorted_by(result, ["Equipo", "Fecha Hora"]):
+            result = result.sort_values(["Equipo", "Fecha Hora"])
+            row_codes = row_codes[result.index.to_numpy()]
+
+        columns = {}
+        for position, suffix in enumerate(classes):
+            rows = row_codes * n_classes + position
+            for column, stat in enumerate(stats):
+                columns[f"{stat}_{suffix}"] = table[rows, column]
+        return result.assign(**columns)
+
+    def baseline_statistics(self, df, classes, value, uniques, codes, state, selected):
+        """Estadísticas por (equipo, clase) desde el resumen persistente de la ventana (`BaselineStore`).
+
+        Solo se resumen los días nuevos o modificados de `df`; los días que ya
+        no están en `df` se restan del resumen. Devuelve las estadísticas
+        indexadas por `código de equipo * clases + clase`, como el cálculo
+        exacto de `state_statistics`, o None si no hay almacén disponible.
+        """
+        store = self.open_baseline_store(value, classes)
+        if store is None:
+            return None
+
+        times = df['Fecha Hora'].to_numpy()
+        days = times.astype('datetime64[D]').view('int64')
+        store.update(days, codes, uniques, state, df[value].to_numpy(), selected & ~np.isnat(times))
+        try:
+            store.save()
+        except OSError as e:
+            print(f"No se pudieron guardar las estadísticas de referencia: {e}")
+
+        summary = store.summary()
+        equipment = pd.Index(uniques).get_indexer(summary.index.get_level_values(0))
+        summary.index = equipment * len(classes) + summary.index.get_level_values(1).to_numpy()
+        return summary[equipment >= 0]
+
     def find_files(self):
         """Método base para encontrar archivos - debe ser implementado por las subclases"""
         raise NotImplementedError("Las subclases deben implementar este método")
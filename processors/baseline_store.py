@@ -0,0 +1,235 @@
+# processors/baseline_store.py
+import numpy as np
+import pandas as pd
+from processors.parsed_cache import ParsedCache
+
+# Columnas de un resumen: una fila por (Equipo, Clase, cubeta del sketch) con
+# su conteo; n, suma y suma de cuadrados de las duraciones de cada (Equipo,
+# Clase) están repartidas entre sus filas (se combinan sumándolas)
+SUMMARY_KEYS = ['Equipo', 'Clase', 'Bucket']
+SUMMARY_SUMS = ['Count', 'n', 's1', 's2']
+
+class BaselineStore(ParsedCache):
+    """Resúmenes persistentes de las duraciones por equipo y clase de estado.
+
+    Para cada día, equipo y clase (p. ej. liberación/ocupación) se guardan la
+    cantidad, la suma y la suma de cuadrados de las duraciones y un sketch de
+    cuantiles logarítmico (DDSketch: conteos por cubeta ``ceil(log_gamma(x))``,
+    con error relativo acotado por ``alpha``). Todo se combina sumando, y
+    también se puede restar: además de los días se guarda el resumen de la
+    ventana completa, y cada ejecución solo resume los días nuevos o
+    modificados, suma su diferencia a la ventana y resta los días que
+    salieron de ella. Media, mediana y desviación estándar salen del resumen
+    de la ventana, sin volver a recorrer sus eventos.
+    """
+
+    CACHE_DIR = 'baselines'
+    BUDGET_SHARE = 0.1
+    # Versión del formato de los resúmenes (incrementar si cambia su cálculo)
+    # v2: firma de los días por (día, equipo, clase)
+    VERSION = 2
+    DEFAULT_ALPHA = 0.001
+    # Cubeta de las duraciones nulas (el logaritmo no está definido en 0)
+    ZERO_BUCKET = np.iinfo(np.int32).min
+    STATISTICS = ('mean', 'median', 'std')
+
+    def __init__(self, base_folder, name, alpha=None, max_bytes=None):
+        super().__init__(base_folder, max_bytes)
+        self.alpha = alpha or self.DEFAULT_ALPHA
+        self.gamma = (1 + self.alpha) / (1 - self.alpha)
+        self.log_gamma = np.log(self.gamma)
+        # La precisión forma parte de la clave: resúmenes con otro alpha no se combinan
+        self.key = self.entry_key(name, f"a{self.alpha:g}", self.VERSION)
+        self.pending = {}
+        self.expired = set()
+        self.days = self.get(self.key + '_days')
+        self.window = self.get(self.key + '_window')
+        if self.days is None or self.window is None:
+            self.days, self.window = self.empty_days(), self.empty_summary()
+
+    @staticmethod
+    def empty_days():
+        return pd.DataFrame({'Dia': pd.Series(dtype='int64'), 'Equipo': pd.Series(dtype=object),
+                             'Clase': pd.Series(dtype='int64'), 'Filas': pd.Series(dtype='int64'),
+                             'Total': pd.Series(dtype='float64')})
+
+    @staticmethod
+    def empty_summary():
+        return pd.DataFrame({'Equipo': pd.Series(dtype=object), 'Clase': pd.Series(dtype='int64'),
+                             'Bucket': pd.Series(dtype='int32'), 'Count': pd.Series(dtype='int64'),
+                             'n': pd.Series(dtype='int64'), 's1': pd.Series(dtype='float64'),
+                             's2': pd.Series(dtype='float64')})
+
+    def day_key(self, day):
+        """Clave de la entrada de un día"""
+        return f"{self.key}_d{day}"
+
+    def save(self):
+        """Guardar los días resumidos, la ventana y la firma de los días, y eliminar los días expirados"""
+        # La firma se escribe al final: si una escritura queda a medias, la
+        # próxima ejecución no la encuentra y reconstruye la ventana
+        for path in self._paths(self.key + '_days'):
+            self._remove(path)
+        for day, summary in sorted(self.pending.items()):
+            self.put(self.day_key(day), summary)
+        self.put(self.key + '_window', self.window)
+        self.put(self.key + '_days', self.days)
+        for day in self.expired:
+            for path in self._paths(self.day_key(day)):
+                self._remove(path)
+        self.pending = {}
+        self.expired = set()
+
+    def bucket_index(self, values):
+        """Cubeta del sketch de cada duración (las duraciones <= 0 van a la cubeta nula)"""
+        values = np.asarray(values, dtype='float64')
+        positive = values > 0
+        index = np.full(len(values), self.ZERO_BUCKET, dtype=np.int32)
+        index[positive] = np.ceil(np.log(values[positive]) / self.log_gamma)
+        return index
+
+    def bucket_value(self, index):
+        """Valor representativo de cada cubeta (error relativo <= alpha)"""
+        index = np.asarray(index)
+        values = 2 * np.power(self.gamma, index.astype('float64')) / (self.gamma + 1)
+        return np.where(index == self.ZERO_BUCKET, 0.0, values)
+
+    @classmethod
+    def combine(cls, parts, signs):
+        """Sumar (o restar, con signo -1) resúmenes"""
+        parts = [part if sign > 0 else part.assign(**{column: -part[column] for column in SUMMARY_SUMS})
+                 for part, sign in zip(parts, signs) if len(part)]
+        if not parts:
+            return cls.empty_summary()
+        combined = pd.concat(parts, ignore_index=True).groupby(SUMMARY_KEYS, sort=False)[SUMMARY_SUMS].sum().reset_index()
+        # Quitar los grupos que quedaron vacíos (y sus restos de redondeo en s1/s2)
+        groups = combined.groupby(['Equipo', 'Clase'], sort=False)['n'].transform('sum')
+        combined = combined[(groups > 0) & ((combined['Count'] != 0) | (combined['n'] != 0))]
+        return combined.reset_index(drop=True)
+
+    def summarize(self, day, codes, equipment, clase, values):
+        """Resumir las filas de cada día; devuelve {día: resumen}"""
+        if not len(day):
+            return {}
+        n_classes = int(clase.max()) + 1
+        first_day = int(day.min())
+        group = ((day - first_day) * len(equipment) + codes) * n_classes + clase
+        frame = pd.DataFrame({'Grupo': group, 'Bucket': self.bucket_index(values), 'Valor': values})
+        moments = frame.groupby('Grupo')['Valor'].agg(['count', 'sum'])
+        moments['s2'] = (frame['Valor'] ** 2).groupby(frame['Grupo']).sum()
+        buckets = frame.groupby(['Grupo', 'Bucket']).size()
+
+        # Momentos de cada grupo en su primera fila (las cubetas están ordenadas por grupo)
+        group = buckets.index.get_level_values(0).to_numpy()
+        first = np.r_[True, group[1:] != group[:-1]]
+        sums = {column: np.zeros(len(group)) for column in ('n', 's1', 's2')}
+        sums['n'][first] = moments['count'].to_numpy()
+        sums['s1'][first] = moments['sum'].to_numpy()
+        sums['s2'][first] = moments['s2'].to_numpy()
+        summaries = pd.DataFrame({
+            'Equipo': np.asarray(equipment, dtype=object)[group // n_classes % len(equipment)],
+            'Clase': group % n_classes, 'Bucket': buckets.index.get_level_values(1).to_numpy(),
+            'Count': buckets.to_numpy(dtype='int64'), 'n': sums['n'].astype('int64'), 's1': sums['s1'], 's2': sums['s2']
+        })
+
+        group_day = group // n_classes // len(equipment) + first_day
+        bounds = np.flatnonzero(np.r_[True, group_day[1:] != group_day[:-1], True])
+        return {int(group_day[start]): summaries.iloc[start:end].reset_index(drop=True)
+                for start, end in zip(bounds[:-1], bounds[1:])}
+
+    def update(self, day, codes, equipment, clase, values, selected):
+        """Actualizar la ventana con las filas de los días nuevos o modificados y descartar los días ausentes.
+
+        `day` son días desde la época, `codes` el código de equipo de cada fila
+        (posición en `equipment`), `clase` la posición de su clase de estado y
+        `selected` la máscara de filas a resumir. Un día se vuelve a resumir
+        cuando cambian la cantidad de filas o la suma de los valores de alguno
+        de sus equipos y clases (p. ej. el último día, que sigue recibiendo
+        eventos, o el primero, recortado por la ventana). Si falta el resumen guardado de un día que hay que restar,
+        la ventana se reconstruye desde cero. Devuelve la cantidad de días
+        resumidos.
+        """
+        values = np.asarray(values, dtype='float64')
+        selected = selected & ~np.isnan(values)
+        if not selected.any():
+            self.expired |= set(self.days['Dia'].tolist())
+            self.days, self.window = self.empty_days(), self.empty_summary()
+            return 0
+
+        # Firma de cada día presente: cantidad de filas y suma de valores por
+        # (día, equipo, clase), para que un cambio que se compensa entre equipos
+        # o clases del mismo día no pase inadvertido
+        first_day = int(day[selected].min())
+        n_classes = int(clase[selected].max()) + 1
+        offset = np.where(selected, day - first_day, 0)
+        group = (offset * len(equipment) + codes) * n_classes + clase
+        groups, position = np.unique(group[selected], return_inverse=True)
+        rows = np.bincount(position).astype('int64')
+        totals = np.bincount(position, weights=values[selected])
+        signature = pd.DataFrame({
+            'Dia': groups // n_classes // len(equipment) + first_day,
+            'Equipo': np.asarray(equipment, dtype=object)[groups // n_classes % len(equipment)],
+            'Clase': groups % n_classes, 'Filas': rows, 'Total': totals
+        })
+        stored = signature.merge(self.days, on=['Dia', 'Equipo', 'Clase'], how='outer', suffixes=('', '_guardado'))
+        changed = stored['Dia'][(stored['Filas'] != stored['Filas_guardado']) | (stored['Total'] != stored['Total_guardado'])]
+        days = np.unique(signature['Dia'].to_numpy()) - first_day
+        unchanged = ~np.isin(days + first_day, changed.to_numpy())
+
+        # Días a restar de la ventana: los modificados y los que ya no están
+        removed = sorted(set(self.days['Dia'].tolist()) - set((days[unchanged] + first_day).tolist()))
+        previous = [self.get(self.day_key(value)) for value in removed]
+        if any(summary is None for summary in previous):
+            # Ventana inconsistente con los días guardados: se vuelven a resumir todos
+            previous = []
+            self.window = self.empty_summary()
+            unchanged[:] = False
+
+        refresh_days = np.zeros(int(days.max()) + 1, dtype=bool)
+        refresh_days[days[~unchanged]] = True
+        refresh = refresh_days[offset] & selected
+        added = self.summarize(day[refresh], codes[refresh], equipment, clase[refresh], values[refresh])
+
+        self.window = self.combine([self.window] + list(added.values()) + previous,
+                                   [1] * (1 + len(added)) + [-1] * len(previous))
+        self.pending.update(added)
+        self.expired |= set(removed) - set(added)
+        self.days = signature
+        return len(added)
+
+    def summary(self):
+        """Media, mediana y desviación estándar (ddof=1) de la ventana por (Equipo, Clase)"""
+        window = self.window
+        codes, groups = pd.MultiIndex.from_frame(window[['Equipo', 'Clase']]).factorize()
+        n_groups = len(groups)
+        if not n_groups:
+            return pd.DataFrame(columns=list(self.STATISTICS),
+                                index=pd.MultiIndex.from_arrays([[], []], names=['Equipo', 'Clase']))
+
+        count = np.bincount(codes, weights=window['n'].to_numpy(dtype='float64'), minlength=n_groups)
+        s1 = np.bincount(codes, weights=window['s1'].to_numpy(), minlength=n_groups)
+        s2 = np.bincount(codes, weights=window['s2'].to_numpy(), minlength=n_groups)
+        mean = s1 / count
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std = np.where(count > 1, np.sqrt(np.maximum(s2 - s1 * mean, 0) / (count - 1)), np.nan)
+
+        # Sketch de la ventana en una matriz densa (grupo x cubeta); la columna 0 es la cubeta nula
+        bucket_index = window['Bucket'].to_numpy()
+        positive = bucket_index != self.ZERO_BUCKET
+        lowest = int(bucket_index[positive].min()) if positive.any() else 0
+        highest = int(bucket_index[positive].max()) if positive.any() else 0
+        width = highest - lowest + 2
+        column = np.where(positive, bucket_index.astype('int64') - lowest + 1, 0)
+        dense = np.bincount(codes * width + column, weights=window['Count'].to_numpy(),
+                            minlength=n_groups * width).reshape(n_groups, width)
+        cumulative = np.cumsum(dense, axis=1)
+
+        def rank_value(rank):
+            # Primera cubeta cuyo conteo acumulado supera el rango
+            position = np.minimum((cumulative <= rank[:, None]).sum(axis=1), width - 1)
+            return np.where(position == 0, 0.0, self.bucket_value(position - 1 + lowest))
+
+        total = np.rint(count).astype('int64')
+        median = (rank_value((total - 1) // 2) + rank_value(total // 2)) / 2
+        return pd.DataFrame({'mean': mean, 'median': median, 'std': std},
+                            index=groups.set_names(['Equipo', 'Clase']))
@@ -2,16 +2,27 @@
 import pandas as pd
 import numpy as np
 import os
-import zipfile
+import functools
 import io
 from datetime import datetime, timedelta
 from processors.base_processor import BaseProcessor
+from processors.pipeline_schema import map_labels, flag_labels, repeated_label, decode_columns
+from processors.zip_reader import ZipMemberReader
 
 class CDVProcessorL1(BaseProcessor):
     """Procesador para datos CDV de la Línea 1"""
     
+    # v2: conversión vectorizada de los CSV SMIO a formato largo
+    PARSER_VERSION = 2
+    
     def __init__(self):
         super().__init__(line="L1", analysis_type="CDV")
+        # Ventana de análisis: los archivos sin datos de los últimos 45 días no se leen
+        self.window_days = 45
+        # Miembros de los ZIP leídos en paralelo por procesos
+        self.ingest_mode = 'process'
+        self.ingest_workers = os.cpu_count() or 1
+        self._zip_reader = None
         # Atributos específicos para CDV L1
         self.df = None
         self.df_L1_2 = None
@@ -33,71 +44,28 @@ class CDVProcessorL1(BaseProcessor):
         
         # Recorrer el directorio SMIO_CBI para buscar archivos ZIP
         smio_path = os.path.join(self.root_folder_path, 'SMIO_CBI')
+        self.source_files = []
         if os.path.exists(smio_path):
-            for root, _, files in os.walk(smio_path):
-                for file in files:
-                    if file.endswith('.zip') and 'SMIO_CBI' in file:
-                        self.zip_files.append(os.path.join(root, file))
+            self.source_files = [
+                source for source in self.discover_files(smio_path)
+                if source.name.endswith('.zip') and 'SMIO_CBI' in source.name
+            ]
+            self.zip_files = [source.path for source in self.source_files]
         
         return len(self.zip_files)
     
     def read_files(self, progress_callback=None):
         """Leer archivos ZIP para análisis CDV de Línea 1"""
-        data = []
-        total_files = len(self.zip_files)
-        
-        for i, zip_path in enumerate(self.zip_files):
-            try:
-                if progress_callback:
-                    progress = (i / total_files) * 15
-                    progress_callback(5 + progress, f"Procesando archivo {i+1} de {total_files}: {os.path.basename(zip_path)}")
-                
-                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                    for csv_filename in zip_ref.namelist():
-                        if csv_filename.endswith('.csv'):
-                            try:
-                                with zip_ref.open(csv_filename) as file:
-                                    df = pd.read_csv(file)
-                                    
-                                    # Tomar la segunda columna (Fecha Hora)
-                                    fecha_hora = df.iloc[:, 1]
-                                    
-                                    # Iterar sobre cada columna (ignorando las primeras dos)
-                                    for col_name in df.columns[2:]:
-                                        # Conservar las filas donde haya un valor no nulo
-                                        non_empty_rows = df[df[col_name].notna()]
-                                        
-                                        # Generar el DataFrame resultante
-                                        new_df = pd.DataFrame({
-                                            'Fecha Hora': fecha_hora[non_empty_rows.index],
-                                            'Estado': non_empty_rows[col_name],
-                                            'Equipo': col_name
-                                        })
-                                        
-                                        # Convertir 'Fecha Hora' a formato datetime
-                                        new_df["Fecha Hora"] = new_df["Fecha Hora"].astype("datetime64[ns]")
-                                        
-                                        # Extraer los últimos 9 caracteres de 'Equipo'
-                                        new_df["Equipo"] = new_df["Equipo"].str.slice(start=-9)
-                                        
-                                        # Ordenar y eliminar duplicados para mantener solo los eventos únicos
-                                        new_df = new_df.sort_values(by=['Fecha Hora', 'Equipo'])
-                                        new_df["Estado"] = new_df["Estado"].astype("int64")
-                                        new_df = new_df[new_df['Estado'].isin([1, 0])]
-                                        
-                                        # Eliminar eventos duplicados consecutivos
-                                        new_df["Diff_Aux"] = new_df["Estado"].diff().astype(str)
-                                        new_df = new_df[~new_df["Diff_Aux"].str.contains("0.0")]
-                                        new_df = new_df.drop("Diff_Aux", axis=1)
-                                        
-                                        # Agregar el DataFrame a la lista
-                                        data.append(new_df)
-                            except Exception as e:
-                                if progress_callback:
-                                    progress_callback(None, f"Error al procesar {csv_filename} en {zip_path}: {str(e)}")
-            except Exception as e:
-                if progress_callback:
-                    progress_callback(None, f"Error al abrir {zip_path}: {str(e)}")
+        # Leer solo los ZIP nuevos o modificados (manifiesto de ingesta); varios ZIP
+        # a la vez y sus CSV repartidos entre los trabajadores del lector de ZIP
+        with ZipMemberReader(self.ingest_workers, self.ingest_mode) as zip_reader:
+            self._zip_reader = zip_reader
+            data = self.ingest_files(
+                self.zip_files, functools.partial(self._read_smio_zip, progress_callback=progress_callback),
+                "SMIO_CBI", progress_callback, progress_start=5, progress_end=20,
+                max_workers=self.ingest_workers, mode='thread'
+            )
+        self._zip_reader = None
         
         if data:
             self.df = pd.concat(data, ignore_index=True)
@@ -105,77 +73,105 @@ class CDVProcessorL1(BaseProcessor):
         else:
             return False
     
+    def _read_smio_zip(self, zip_path, progress_callback=None):
+        """Leer los CSV de un ZIP SMIO_CBI y devolver los cambios de estado de cada CDV"""
+        def on_error(csv_filename, e):
+            if progress_callback:
+                progress_callback(None, f"Error al procesar {csv_filename} en {zip_path}: {str(e)}")
+        
+        zip_reader = self._zip_reader or ZipMemberReader(max_workers=1)
+        data = zip_reader.read(zip_path, lambda name: name.endswith('.csv'), self._read_smio_member, on_error)
+        
+        return pd.concat(data, ignore_index=True) if data else pd.DataFrame()
+    
+    @staticmethod
+    def _read_smio_member(file):
+        """Leer un CSV SMIO desde el flujo descomprimido del ZIP"""
+        return CDVProcessorL1._smio_to_long(pd.read_csv(file))
+    
+    @staticmethod
+    def _smio_to_long(df):
+        """Pasar un CSV SMIO (una columna por CDV) a formato largo con solo los cambios de estado.
+        
+        Equivale a recorrer cada columna desde la tercera: se toman las celdas no
+        nulas, se ordenan por fecha, se conservan los estados 0/1 y se eliminan
+        los estados repetidos consecutivos de cada columna, pero en una sola
+        operación vectorizada para todo el archivo.
+        """
+        values = df.iloc[:, 2:].to_numpy()
+        
+        # Celdas no nulas en orden columna -> fila
+        col_idx, row_idx = np.nonzero(pd.notna(values).T)
+        
+        # Convertir la fecha una sola vez para todo el archivo
+        fecha_hora = df.iloc[:, 1].astype("datetime64[ns]").to_numpy()
+        
+        # Extraer los últimos 9 caracteres de cada nombre de columna
+        equipos = pd.Index(df.columns[2:].astype(str)).str.slice(start=-9)
+        
+        long_df = pd.DataFrame({
+            'Fecha Hora': fecha_hora[row_idx],
+            'Estado': pd.Series(values[row_idx, col_idx]).astype("int64").to_numpy(),
+            'Columna': col_idx
+        })
+        
+        # Ordenar por fecha dentro de cada columna y conservar solo estados 0/1
+        long_df = long_df.sort_values(by=['Columna', 'Fecha Hora'], kind='stable')
+        long_df = long_df[long_df['Estado'].isin([1, 0])]
+        
+        # Eliminar eventos duplicados consecutivos de cada columna
+        long_df = long_df[BaseProcessor.transition_mask(
+            long_df['Estado'].to_numpy(), BaseProcessor.group_starts(long_df['Columna'].to_numpy())
+        )]
+        
+        long_df['Equipo'] = equipos[long_df['Columna'].to_numpy()]
+        return long_df.drop(columns='Columna').reset_index(drop=True)
+    
     def preprocess_data(self, progress_callback=None):
         """Preprocesar datos para análisis CDV de Línea 1"""
         if progress_callback:
             progress_callback(20, "Preprocesando datos...")
         
-        # Convertir a string para crear ID único
+        # Convertir a string para crear ID único (el estado como etiquetas categóricas)
         self.df["Fecha Hora"] = self.df["Fecha Hora"].astype(str)
-        self.df["Estado"] = self.df["Estado"].astype(str)
-        self.df['ID'] = self.df['Fecha Hora'] + "*" + self.df['Estado'] + "*" + self.df['Equipo']
+        self.df["Estado"] = map_labels(self.df["Estado"], lambda labels: labels.astype(str))
+        self.df['ID'] = self.df['Fecha Hora'] + "*" + self.df['Estado'].astype(str) + "*" + self.df['Equipo']
         
         # Convertir de nuevo a formato de fecha
         self.df["Fecha Hora"] = pd.to_datetime(self.df["Fecha Hora"], errors='coerce')
         
         # Filtrar por fecha (últimos 45 días)
-        fecha_limite = datetime.now() - timedelta(days=45)
+        fecha_limite = datetime.now() - timedelta(days=self.window_days)
         self.df = self.df[self.df['Fecha Hora'] >= fecha_limite]
         
-        # Procesar nombres de equipos
-        self.df['Equipo'] = self.df['Equipo'].str.replace('_CDV', 'CDV')
-        
-        # Separar columna Equipo
-        split_df = self.df['Equipo'].str.split('_', expand=True)
-        split_df = split_df.drop(columns=[0])
-        split_df.columns = ['CDV', 'Estacion']
-        self.df = pd.concat([self.df, split_df], axis=1)
+        # Estación y nombre de cada equipo como categóricas (una vez por equipo distinto)
+        equipo = map_labels(self.df['Equipo'], self._equipment_labels)
         self.df = self.df.drop(columns=['Equipo'])
-        self.df['Equipo'] = self.df['Estacion'] + '_CDV_' + self.df['CDV']
-        self.df = self.df.drop("CDV", axis=1)
+        self.df['Estacion'] = equipo['Estacion']
+        self.df['Equipo'] = equipo['Equipo']
         
         if progress_callback:
             progress_callback(40, "Preprocesamiento completado")
         
         return True
     
+    @staticmethod
+    def _equipment_labels(labels):
+        """Estación y nombre (<estación>_CDV_<cdv>) de cada equipo SMIO"""
+        split_df = labels.str.replace('_CDV', 'CDV').str.split('_', expand=True)
+        split_df = split_df.drop(columns=[0])
+        split_df.columns = ['CDV', 'Estacion']
+        return pd.DataFrame({'Estacion': split_df['Estacion'],
+                             'Equipo': split_df['Estacion'] + '_CDV_' + split_df['CDV']})
+    
     def calculate_time_differences(self, progress_callback=None):
         """Calcular diferencias temporales entre eventos"""
         if progress_callback:
             progress_callback(40, "Calculando diferencias temporales...")
         
-        # Diferencias con registros anteriores
-        self.df["Diff.Time_-1_row"] = self.df["Fecha Hora"].diff(periods=1)
-        self.df["Diff.Time_-1_row"] = self.df["Diff.Time_-1_row"].dt.total_seconds()
-        self.df["Diff.Time_-1_row"] = self.df["Diff.Time_-1_row"].astype("float64")
-        self.df["Diff.Time_-1_row"] = round(self.df["Diff.Time_-1_row"], 1)
-        
-        self.df["Diff.Time_-2_row"] = self.df["Fecha Hora"].diff(periods=2)
-        self.df["Diff.Time_-2_row"] = self.df["Diff.Time_-2_row"].dt.total_seconds()
-        self.df["Diff.Time_-2_row"] = self.df["Diff.Time_-2_row"].astype("float64")
-        self.df["Diff.Time_-2_row"] = round(self.df["Diff.Time_-2_row"], 1)
-        
-        # Diferencias con registros siguientes
-        self.df["Diff.Time_+1_row"] = self.df["Fecha Hora"].diff(periods=-1)
-        self.df["Diff.Time_+1_row"] = -1 * self.df["Diff.Time_+1_row"].dt.total_seconds()
-        self.df["Diff.Time_+1_row"] = self.df["Diff.Time_+1_row"].astype("float64")
-        self.df["Diff.Time_+1_row"] = round(self.df["Diff.Time_+1_row"], 1)
-        
-        self.df["Diff.Time_+2_row"] = self.df["Fecha Hora"].diff(periods=-2)
-        self.df["Diff.Time_+2_row"] = -1 * self.df["Diff.Time_+2_row"].dt.total_seconds()
-        self.df["Diff.Time_+2_row"] = self.df["Diff.Time_+2_row"].astype("float64")
-        self.df["Diff.Time_+2_row"] = round(self.df["Diff.Time_+2_row"], 1)
-        
-        # Filtrar tiempos válidos
-        self.df = self.df.loc[self.df["Diff.Time_-1_row"] >= 0.0]
-        self.df = self.df.loc[self.df["Diff.Time_-2_row"] >= 0.0]
-        self.df = self.df.loc[self.df["Diff.Time_+1_row"] >= 0.0]
-        self.df = self.df.loc[self.df["Diff.Time_+2_row"] >= 0.0]
-        
-        # Calcular tiempo conjunto
-        self.df["Tiempo Conjunto"] = self.df["Diff.Time_-1_row"] + (self.df["Diff.Time_+2_row"])
-        self.df["Tiempo Conjunto"] = self.df["Tiempo Conjunto"].astype("float64")
-        self.df["Tiempo Conjunto"] = round(self.df["Tiempo Conjunto"], 2)
+        # Diferencias con los registros anteriores y siguientes (±1 y ±2), filtro de
+        # tiempos válidos y tiempo conjunto en una sola pasada
+        self.df = self.time_differences(self.df, decimals=1)
         
         if progress_callback:
             progress_callback(60, "Cálculo de diferencias temporales completado")
@@ -187,49 +183,9 @@ class CDVProcessorL1(BaseProcessor):
         if progress_callback:
             progress_callback(60, "Calculando estadísticas...")
         
-        # Copias para análisis
-        df_L1_lb = self.df.copy()
-        df_L1_oc = self.df.copy()
-        
-        # Estadísticas generales
-        df_L1_aux_avg = self.df.pivot_table(
-            index=["Equipo", "Estado"],
-            values="Diff.Time_+1_row",
-            aggfunc={np.mean, np.std, np.median}
-        )
-        
-        # Estadísticas para estado 0 (liberación)
-        df_L1_lb["Estado"] = df_L1_lb["Estado"].astype(str)
-        df_L1_lb = df_L1_lb.loc[df_L1_lb["Estado"] == "0"]
-        df_L1_aux_lb = df_L1_lb.pivot_table(
-            index=["Equipo", "Estado"],
-            values="Diff.Time_-1_row",
-            aggfunc={np.mean, np.std, np.median}
-        )
-        df_L1_aux_lb.rename(
-            columns={"mean": "mean_lib", "std": "std_lib", "median": "median_lib"},
-            inplace=True
-        )
-        
-        # Estadísticas para estado 1 (ocupación)
-        df_L1_oc["Estado"] = df_L1_oc["Estado"].astype(str)
-        df_L1_oc = df_L1_oc.loc[df_L1_oc["Estado"] == "1"]
-        df_L1_aux_oc = df_L1_oc.pivot_table(
-            index=["Equipo", "Estado"],
-            values="Diff.Time_-1_row",
-            aggfunc={np.mean, np.std, np.median}
-        )
-        df_L1_aux_oc.rename(
-            columns={"mean": "mean_oc", "std": "std_oc", "median": "median_oc"},
-            inplace=True
-        )
-        
-        # Combinar estadísticas
-        self.df = self.df.merge(df_L1_aux_lb, on="Equipo")
-        self.df = self.df.merge(df_L1_aux_oc, on="Equipo")
-        
-        # Ordenar
-        self.df = self.df.sort_values(["Equipo", "Fecha Hora"])
+        # Estadísticas de liberación (estado 0) y ocupación (estado 1) por equipo en una sola pasada
+        estado = self.df["Estado"]
+        self.df = self.state_statistics(self.df, {"lib": estado == "0", "oc": estado == "1"})
         
         # Limpiar ID y redondear
         self.df = self.df.drop("ID", axis=1)
@@ -257,26 +213,21 @@ class CDVProcessorL1(BaseProcessor):
         self.df['Diff.Time_+1_row'] = self.df['Diff.Time_+1_row'].abs()
         
         # Preparar condiciones
-        self.df["Estado"] = self.df["Estado"].astype(str)
         estado_0 = self.df["Estado"] == "0"
         estado_1 = self.df["Estado"] == "1"
         
         # Detectar Fallos de Ocupación (FO)
-        self.df["FO"] = np.where(
-            estado_0, 
-            np.where(self.df["Diff.Time_+1_row"] < (self.f_oc_1 * self.df["median_oc"]), "PFO", "NFO"), 
-            "NA"
+        self.df["FO"] = flag_labels(
+            estado_0, self.df["Diff.Time_+1_row"] < (self.f_oc_1 * self.df["median_oc"]), "PFO", "NFO"
         )
         
         # Detectar Fallos de Liberación (FL)
-        self.df["FL"] = np.where(
-            estado_1, 
-            np.where(self.df["Diff.Time_+1_row"] < (self.f_lb_2 * self.df["median_lib"]), "PFL", "NFL"), 
-            "NA"
+        self.df["FL"] = flag_labels(
+            estado_1, self.df["Diff.Time_+1_row"] < (self.f_lb_2 * self.df["median_lib"]), "PFL", "NFL"
         )
         
         # Agregar identificador de línea
-        self.df["Linea"] = "L1"
+        self.df["Linea"] = repeated_label("L1", len(self.df))
         
         if progress_callback:
             progress_callback(80, "Detección de anomalías completada")
@@ -291,11 +242,11 @@ class CDVProcessorL1(BaseProcessor):
         # 1. Preparar reporte de fallos de ocupación (FO)
         self.df_L1_FO = self.df.loc[self.df['FO'] == 'PFO']
         
-        # Eliminar columnas innecesarias
+        # Eliminar columnas innecesarias y devolver las etiquetas a texto
         columns_to_drop = ['Estado', 'Diff.Time_-1_row', 'Diff.Time_-2_row', 'Diff.Time_+2_row', 
                            'Tiempo Conjunto', 'mean_lib', 'median_lib', 'std_lib', 
                            'mean_oc', 'median_oc', 'std_oc', 'FL']
-        self.df_L1_FO = self.df_L1_FO.drop(columns=columns_to_drop)
+        self.df_L1_FO = decode_columns(self.df_L1_FO.drop(columns=columns_to_drop))
         
         # Crear ID único
         self.df_L1_FO['Fecha Hora'] = self.df_L1_FO['Fecha Hora'].astype(str)
@@ -307,8 +258,8 @@ class CDVProcessorL1(BaseProcessor):
         df = self.df.copy()
         df['Fecha'] = df['Fecha Hora'].dt.to_period('D')
         df_pfo = df[df['FO'] == 'PFO']
-        pfo_count = df_pfo.groupby(['Fecha', 'Equipo']).size().reset_index(name='PFO')
-        pfo_na_count = df.groupby(['Fecha', 'Equipo']).size().reset_index(name='OCUPACIONES')
+        pfo_count = df_pfo.groupby(['Fecha', 'Equipo'], observed=True).size().reset_index(name='PFO')
+        pfo_na_count = df.groupby(['Fecha', 'Equipo'], observed=True).size().reset_index(name='OCUPACIONES')
         
         pfo_count['PFO'] = pfo_count['PFO'].astype(int)
         pfo_na_count['OCUPACIONES'] = pfo_na_count['OCUPACIONES'].astype(int)
@@ -331,11 +282,11 @@ class CDVProcessorL1(BaseProcessor):
         # 3. Preparar reporte de fallos de liberación (FL)
         self.df_L1_FL = self.df.loc[self.df['FL'] == 'PFL']
         
-        # Eliminar columnas innecesarias
+        # Eliminar columnas innecesarias y devolver las etiquetas a texto
         columns_to_drop = ['Estado', 'Diff.Time_-1_row', 'Diff.Time_-2_row', 'Diff.Time_+2_row', 
                           'Tiempo Conjunto', 'mean_lib', 'median_lib', 'std_lib', 
                           'mean_oc', 'median_oc', 'std_oc', 'FO', 'Fecha']
-        self.df_L1_FL = self.df_L1_FL.drop(columns=columns_to_drop)
+        self.df_L1_FL = decode_columns(self.df_L1_FL.drop(columns=columns_to_drop))
         
         # Crear ID único
         self.df_L1_FL['Fecha Hora'] = self.df_L1_FL['Fecha Hora'].astype(str)
@@ -412,7 +363,7 @@ class CDVProcessorL1(BaseProcessor):
         """Guardar el DataFrame principal"""
         try:
             # Guardar el DataFrame principal
-            fecha_limite = datetime.now() - timedelta(days=45)
+            fecha_limite = datetime.now() - timedelta(days=self.window_days)
             self.df = self.df[self.df['Fecha Hora'] >= fecha_limite]
             
             main_file_path = os.path.join(self.output_folder_path, 'df_L1_CDV.csv')
@@ -2,14 +2,32 @@
 import pandas as pd
 import numpy as np
 import os
+import functools
 from datetime import datetime, timedelta
 from processors.base_processor import BaseProcessor
+from processors.pipeline_schema import encode_columns, flag_labels, repeated_label, decode_columns
+from processors.workbook_cache import read_sacem_workbook
+from processors.csv_dialect import read_csv_once
+
+# Códigos de estado de los CDV para el núcleo de transiciones
+STATE_CODES = {'Ocupacion': 0, 'Liberacion': 1}
 
 class CDVProcessorL2(BaseProcessor):
     """Procesador para datos CDV de la Línea 2"""
     
+    # v2: CSV leídos con el dialecto detectado (antes un CSV con comas quedaba en una sola columna)
+    # v3: solo los cambios de estado, con los filtros de fecha y hora aplicados al leer
+    # v4: sin el filtro de fecha al leer (la lectura no depende del día de la ejecución)
+    # v5: también la última muestra de cada racha de estado
+    PARSER_VERSION = 5
+    
     def __init__(self):
         super().__init__(line="L2", analysis_type="CDV")
+        # Ventana de análisis: los archivos sin datos de los últimos 40 días no se leen
+        self.window_days = 40
+        # Conversión de libros Excel en procesos cuando no están en caché
+        self.ingest_mode = 'process'
+        self.ingest_workers = os.cpu_count() or 1
         # Atributos específicos para CDV L2
         self.df_L2_2 = None
         self.df_L2_FO = None
@@ -34,100 +52,38 @@ class CDVProcessorL2(BaseProcessor):
             raise FileNotFoundError(f"La ruta {self.root_folder_path} no existe")
         
         # Recorrer carpetas y encontrar archivos CSV o Excel
-        for root, dirs, files in os.walk(self.root_folder_path):
-            for file in files:
-                # Filtrar según el tipo de datos
-                if self.data_type == "Sacem":
-                    # Buscar archivos de Sacem (actual implementación)
-                    if file.endswith(('.xlsx', '.xls', '.csv')):
-                        self.data_files.append(os.path.join(root, file))
-                elif self.data_type == "SCADA":
-                    # En el futuro, aquí se implementará la lógica para archivos SCADA
-                    # Por ahora, solo registramos que está en desarrollo
-                    continue
+        self.source_files = []
+        for source in self.discover_files(self.root_folder_path):
+            # Filtrar según el tipo de datos
+            if self.data_type == "Sacem":
+                # Buscar archivos de Sacem (actual implementación)
+                if source.name.endswith(('.xlsx', '.xls', '.csv')):
+                    self.data_files.append(source.path)
+                    self.source_files.append(source)
+            elif self.data_type == "SCADA":
+                # En el futuro, aquí se implementará la lógica para archivos SCADA
+                # Por ahora, solo registramos que está en desarrollo
+                continue
         
         return len(self.data_files)
     
     def read_files(self, progress_callback=None):
         """Leer archivos CSV/Excel para análisis CDV de Línea 2"""
-        df_list = []
-        total_files = len(self.data_files)
-        
-        for i, file_path in enumerate(self.data_files):
-            try:
-                if progress_callback:
-                    progress = (i / total_files) * 15
-                    progress_callback(5 + progress, f"Procesando archivo {i+1} de {total_files}: {os.path.basename(file_path)}")
-                
-                # Leer archivo según su extensión
-                if file_path.lower().endswith('.csv'):
-                    # Probar diferentes codificaciones y separadores comunes para CSV
-                    try:
-                        # Primero intentar con separador punto y coma (común en configuraciones europeas)
-                        df = pd.read_csv(file_path, sep=';', encoding='utf-8')
-                    except:
-                        try:
-                            # Luego intentar con separador coma (estándar)
-                            df = pd.read_csv(file_path, sep=',', encoding='utf-8')
-                        except:
-                            try:
-                                # Intentar con codificación Latin-1
-                                df = pd.read_csv(file_path, sep=';', encoding='latin1')
-                            except:
-                                # Último intento con coma y Latin-1
-                                df = pd.read_csv(file_path, sep=',', encoding='latin1')
-                else:
-                    # Para archivos Excel
-                    df = pd.read_excel(file_path)
-                
-                # Verificar si es un archivo con formato esperado
-                if 'FECHA' in df.columns and 'HORA' in df.columns:
-                    # Filtrar columnas que empiezan con 'CDV'
-                    cdv_cols = [col for col in df.columns if col.startswith('CDV')]
-                    if not cdv_cols:
-                        continue
-                    
-                    # Tomar sólo las columnas necesarias
-                    cols_to_keep = ['ciclo', 'FECHA', 'HORA'] + cdv_cols
-                    cols_to_keep = [col for col in cols_to_keep if col in df.columns]
-                    df = df[cols_to_keep]
-                    
-                    # Crear una versión "derretida" (melted) del dataframe para análisis
-                    id_vars = ['ciclo', 'FECHA', 'HORA']
-                    id_vars = [col for col in id_vars if col in df.columns]
-                    
-                    df_melted = pd.melt(
-                        df, 
-                        id_vars=id_vars, 
-                        value_vars=cdv_cols,
-                        var_name='Equipo',
-                        value_name='Estado'
-                    )
-                    
-                    # Agregar columna de estación basada en el nombre del CDV
-                    df_melted['Estacion'] = df_melted['Equipo'].str.extract(r'CDV\s+(\d+)')
-                    df_melted['Subsistema'] = 'CDV'
-                    
-                    # Crear columna de fecha y hora combinada
-                    df_melted['Fecha Hora'] = pd.to_datetime(
-                        df_melted['FECHA'].astype(str) + ' ' + df_melted['HORA'].astype(str),
-                        errors='coerce'
-                    )
-                    
-                    # Modificar Estado: considerar 1 como "Ocupacion" y 0 como "Liberacion"
-                    df_melted['Estado'] = df_melted['Estado'].apply(
-                        lambda x: 'Ocupacion' if x == 0 else 'Liberacion' if x == 1 else 'Desconocido'
-                    )
-                    
-                    # Seleccionar columnas finales
-                    df_melted = df_melted[['Fecha Hora', 'Equipo', 'Estacion', 'Subsistema', 'Estado']]
-                    
-                    # Agregar al listado
-                    df_list.append(df_melted)
-                
-            except Exception as e:
-                if progress_callback:
-                    progress_callback(None, f"Error en archivo {file_path}: {str(e)}")
+        # Leer solo los archivos nuevos o modificados (manifiesto de ingesta); los
+        # libros Excel se convierten una sola vez y se reutilizan desde su caché
+        workbook_cache = self.open_workbook_cache()
+        read_file = functools.partial(self._read_sacem_file, workbook_cache=workbook_cache)
+        df_list = self.ingest_files(self.data_files, read_file, "Sacem", progress_callback,
+                                    progress_start=5, progress_end=20, max_workers=self.ingest_workers)
+        
+        # Las rachas se reducen por archivo: si las muestras de un CDV en dos
+        # archivos se intercalan en el tiempo, se leen todas las muestras
+        if df_list and self._files_overlap(df_list):
+            if progress_callback:
+                progress_callback(20, "Archivos intercalados en el tiempo: leyendo todas las muestras...")
+            read_file = functools.partial(self._read_sacem_file, workbook_cache=workbook_cache, runs=False)
+            df_list = self.ingest_files(self.data_files, read_file, "SacemMuestras", progress_callback,
+                                        progress_start=5, progress_end=20, max_workers=self.ingest_workers)
         
         if df_list:
             self.df = pd.concat(df_list, ignore_index=True)
@@ -136,19 +92,121 @@ class CDVProcessorL2(BaseProcessor):
         else:
             return False
     
+    @staticmethod
+    def _read_sacem_file(file_path, workbook_cache=None, runs=True):
+        """Leer un archivo Sacem y devolver los estados de sus CDV en formato largo.
+        
+        Con `runs=True` solo se devuelven los extremos de cada racha de estado
+        (ver `_sacem_transitions`); con `runs=False`, todas las muestras válidas.
+        """
+        # Leer archivo según su extensión
+        if file_path.lower().endswith('.csv'):
+            # Dialecto (codificación, separador, encabezado) detectado desde los
+            # primeros bytes y reutilizado por familia de archivos: una sola lectura
+            df = read_csv_once(file_path)
+        else:
+            # Para archivos Excel (solo las columnas usadas, desde la caché si existe)
+            df = read_sacem_workbook(file_path, workbook_cache)
+        
+        # Verificar si es un archivo con formato esperado
+        if 'FECHA' in df.columns and 'HORA' in df.columns:
+            # Filtrar columnas que empiezan con 'CDV'
+            cdv_cols = [col for col in df.columns if col.startswith('CDV')]
+            if not cdv_cols:
+                return pd.DataFrame()
+            
+            # Extraer los estados sin pasar la tabla a formato largo
+            return CDVProcessorL2._sacem_transitions(df, cdv_cols, runs)
+        
+        return pd.DataFrame()
+    
+    @staticmethod
+    def _sacem_transitions(df, cdv_cols, runs=True):
+        """Obtener los cambios de estado de CDV directamente desde la tabla ancha.
+        
+        Equivale a fundir la tabla (una fila por muestra y CDV), aplicar el
+        filtro de hora del día del preprocesamiento y descartar estados
+        distintos de 0/1, pero de cada racha de estados repetidos de un CDV solo
+        se conservan la primera y la última muestra. La fecha se interpreta una
+        vez por fila y la estación una vez por columna.
+        
+        La última muestra de cada racha hace que el filtro de fecha de
+        preprocess_data dé el mismo resultado que sobre todas las muestras: si
+        el inicio de la ventana corta una racha, su primera fila dentro de la
+        ventana tiene el estado de la racha y process_states la descarta, como
+        haría con la muestra completa. Esto supone que las muestras de un CDV
+        en distintos archivos no se intercalan en el tiempo (ver
+        `_files_overlap`); con `runs=False` se conservan todas las muestras.
+        """
+        # Fecha y hora una sola vez por fila
+        fecha_hora = pd.to_datetime(
+            df['FECHA'].astype(str) + ' ' + df['HORA'].astype(str),
+            errors='coerce'
+        )
+        
+        # Mismo filtro de hora del día que el preprocesamiento; el de fecha depende
+        # del día de la ejecución y se aplica en preprocess_data (los archivos
+        # fuera de la ventana ya no se leen)
+        hora = fecha_hora.dt.hour
+        keep = fecha_hora.notna() & (hora >= 6) & (hora <= 23)
+        rows = np.flatnonzero(keep.to_numpy())
+        fecha_hora = fecha_hora.to_numpy()[rows]
+        order = np.argsort(fecha_hora, kind='stable')
+        rows, fecha_hora = rows[order], fecha_hora[order]
+        
+        # Estados como códigos: 0 = Ocupacion, 1 = Liberacion, -1 = otro valor
+        block = df[cdv_cols].iloc[rows]
+        codes = np.where((block == 0).to_numpy(), 0, np.where((block == 1).to_numpy(), 1, -1))
+        
+        # Celdas válidas en orden columna -> fecha; de cada racha de estado de una
+        # columna, su inicio (un cambio) y su última muestra (antes del cambio siguiente)
+        col_idx, row_idx = np.nonzero((codes >= 0).T)
+        estado = codes[row_idx, col_idx]
+        cambio = BaseProcessor.transition_mask(estado, BaseProcessor.group_starts(col_idx))
+        fin = np.append(cambio[1:], True)
+        extremo = cambio | fin if runs else np.ones(len(estado), dtype=bool)
+        col_idx, row_idx, estado = col_idx[extremo], row_idx[extremo], estado[extremo]
+        
+        # Estación una sola vez por nombre de columna
+        equipos = np.asarray(cdv_cols, dtype=object)
+        estaciones = pd.Series(cdv_cols, dtype=object).str.extract(r'CDV\s+(\d+)', expand=False).to_numpy()
+        
+        return pd.DataFrame({
+            'Fecha Hora': fecha_hora[row_idx],
+            'Equipo': equipos[col_idx],
+            'Estacion': estaciones[col_idx],
+            'Subsistema': 'CDV',
+            'Estado': np.where(estado == 0, 'Ocupacion', 'Liberacion').astype(object)
+        })
+    
+    @staticmethod
+    def _files_overlap(df_list):
+        """Indicar si las muestras de algún CDV en un archivo se intercalan en el tiempo con las de otro.
+        
+        Cada DataFrame es la lectura de un archivo y conserva la primera y la
+        última muestra de cada CDV, así que sus extremos son los del archivo.
+        """
+        spans = pd.concat([df.groupby('Equipo', sort=False)['Fecha Hora'].agg(['min', 'max'])
+                           for df in df_list if len(df)])
+        spans = spans.reset_index().sort_values(['Equipo', 'min'], kind='stable')
+        same = spans['Equipo'].eq(spans['Equipo'].shift())
+        # Ordenados por inicio, si dos rangos se solapan también lo hacen dos consecutivos
+        return bool((same & (spans['min'] < spans['max'].shift())).any())
+    
     def preprocess_data(self, progress_callback=None):
         """Realizar el preprocesamiento inicial de los datos"""
         if progress_callback:
             progress_callback(20, "Iniciando preprocesamiento de datos...")
         
-        # Ordenar por equipo y fecha/hora
-        self.df = self.df.sort_values(["Equipo", "Fecha Hora"])
+        # Columnas de texto como categóricas y ordenar por equipo y fecha/hora
+        # (las categorías siguen el orden del texto)
+        self.df = encode_columns(self.df).sort_values(["Equipo", "Fecha Hora"])
         
         if progress_callback:
             progress_callback(25, "Filtrando por fecha...")
             
         # Filtrar por fecha (últimos 40 días)
-        date_threshold = datetime.now() - timedelta(days=40)
+        date_threshold = datetime.now() - timedelta(days=self.window_days)
         self.df = self.df[self.df["Fecha Hora"] >= date_threshold]
         
         if progress_callback:
@@ -172,27 +230,16 @@ class CDVProcessorL2(BaseProcessor):
     
     def process_states(self):
         """Procesar estados para CDV de Línea 2"""
-        # Crear copia del DataFrame
-        self.df_L2_2 = self.df.copy()
-        
-        # Convertir estados a numéricos
-        self.df_L2_2['Estado'] = self.df_L2_2['Estado'].replace('Liberacion', 1)
-        self.df_L2_2['Estado'] = self.df_L2_2['Estado'].replace('Ocupacion', 0)
-        
-        # Ordenar y filtrar
-        self.df_L2_2 = self.df_L2_2.sort_values(["Equipo", "Fecha Hora"])
-        self.df_L2_2 = self.df_L2_2[self.df_L2_2['Estado'].isin([1, 0])]
-        self.df_L2_2["Estado"] = self.df_L2_2["Estado"].astype("float64")
+        # Ordenar por equipo y fecha, con estados como códigos (0 = Ocupacion, 1 = Liberacion)
+        self.df_L2_2 = self.df.sort_values(["Equipo", "Fecha Hora"])
+        codes = self.state_codes(self.df_L2_2['Estado'], STATE_CODES)
         
-        # Detectar cambios de estado
-        self.df_L2_2["Diff_Aux"] = self.df_L2_2.groupby("Equipo")["Estado"].diff(periods=1)
-        self.df_L2_2["Diff_Aux"] = self.df_L2_2["Diff_Aux"].astype("string")
-        self.df_L2_2 = self.df_L2_2.loc[~(self.df_L2_2["Diff_Aux"].str.contains("0.0"))]
-        
-        # Limpiar y restaurar etiquetas originales
-        self.df_L2_2 = self.df_L2_2.drop('Diff_Aux', axis=1)
-        self.df_L2_2['Estado'] = self.df_L2_2['Estado'].replace(1, 'Liberacion')
-        self.df_L2_2['Estado'] = self.df_L2_2['Estado'].replace(0, 'Ocupacion')
+        # Conservar solo estados válidos y los cambios de estado de cada equipo (el
+        # primer registro de cada equipo no tiene estado anterior y se descarta)
+        valid = codes >= 0
+        self.df_L2_2, codes = self.df_L2_2[valid], codes[valid]
+        starts = self.group_starts(self.df_L2_2['Equipo'])
+        self.df_L2_2 = self.df_L2_2[self.transition_mask(codes, starts, keep_first=False)]
         
         # Actualizar DataFrame principal
         self.df = self.df_L2_2.copy()
@@ -202,47 +249,9 @@ class CDVProcessorL2(BaseProcessor):
         if progress_callback:
             progress_callback(45, "Calculando diferencias temporales...")
             
-        # Calcular diferencia con registros anteriores (por equipo)
-        self.df["Diff.Time_-1_row"] = self.df.groupby("Equipo")["Fecha Hora"].diff(periods=1)
-        self.df["Diff.Time_-1_row"] = self.df["Diff.Time_-1_row"].dt.total_seconds()
-        self.df["Diff.Time_-1_row"] = self.df["Diff.Time_-1_row"].astype("float64")
-        self.df["Diff.Time_-1_row"] = round(self.df["Diff.Time_-1_row"], 1)
-        
-        self.df["Diff.Time_-2_row"] = self.df.groupby("Equipo")["Fecha Hora"].diff(periods=2)
-        self.df["Diff.Time_-2_row"] = self.df["Diff.Time_-2_row"].dt.total_seconds()
-        self.df["Diff.Time_-2_row"] = self.df["Diff.Time_-2_row"].astype("float64")
-        self.df["Diff.Time_-2_row"] = round(self.df["Diff.Time_-2_row"], 1)
-        
-        if progress_callback:
-            progress_callback(50, "Calculando diferencias temporales hacia adelante...")
-            
-        # Calcular diferencia con registros siguientes (por equipo)
-        self.df["Diff.Time_+1_row"] = -1 * self.df.groupby("Equipo")["Fecha Hora"].diff(periods=-1)
-        self.df["Diff.Time_+1_row"] = self.df["Diff.Time_+1_row"].dt.total_seconds()
-        self.df["Diff.Time_+1_row"] = self.df["Diff.Time_+1_row"].astype("float64")
-        self.df["Diff.Time_+1_row"] = round(self.df["Diff.Time_+1_row"], 1)
-        
-        self.df["Diff.Time_+2_row"] = -1 * self.df.groupby("Equipo")["Fecha Hora"].diff(periods=-2)
-        self.df["Diff.Time_+2_row"] = self.df["Diff.Time_+2_row"].dt.total_seconds()
-        self.df["Diff.Time_+2_row"] = self.df["Diff.Time_+2_row"].astype("float64")
-        self.df["Diff.Time_+2_row"] = round(self.df["Diff.Time_+2_row"], 1)
-        
-        if progress_callback:
-            progress_callback(55, "Filtrando datos por tiempos válidos...")
-            
-        # Filtrar por tiempos positivos
-        self.df = self.df.loc[self.df["Diff.Time_-1_row"] >= 0.0]
-        self.df = self.df.loc[self.df["Diff.Time_-2_row"] >= 0.0]
-        self.df = self.df.loc[self.df["Diff.Time_+1_row"] >= 0.0]
-        self.df = self.df.loc[self.df["Diff.Time_+2_row"] >= 0.0]
-        
-        if progress_callback:
-            progress_callback(60, "Calculando tiempo conjunto...")
-            
-        # Calcular tiempo conjunto
-        self.df["Tiempo Conjunto"] = self.df["Diff.Time_-1_row"] + (self.df["Diff.Time_+2_row"])
-        self.df["Tiempo Conjunto"] = self.df["Tiempo Conjunto"].astype("float64")
-        self.df["Tiempo Conjunto"] = round(self.df["Tiempo Conjunto"], 2)
+        # Diferencias con los registros anteriores y siguientes (±1 y ±2 por equipo), filtro de
+        # tiempos válidos y tiempo conjunto en una sola pasada
+        self.df = self.time_differences(self.df, decimals=1, by_equipment=True)
         
         if progress_callback:
             progress_callback(65, "Cálculo de diferencias temporales completado")
@@ -254,59 +263,12 @@ class CDVProcessorL2(BaseProcessor):
         if progress_callback:
             progress_callback(65, "Iniciando cálculo de estadísticas...")
             
-        # Crear copias para análisis separados
-        df_L2_lb = self.df.copy()
-        df_L2_oc = self.df.copy()
-        
-        if progress_callback:
-            progress_callback(67, "Calculando estadísticas generales...")
-            
-        # Calcular estadísticas generales
-        df_L2_aux_avg = self.df.pivot_table(
-            index=["Equipo", "Estado"],
-            values="Diff.Time_+1_row",
-            aggfunc={np.mean, np.std, np.median}
-        )
-        
-        if progress_callback:
-            progress_callback(69, "Calculando estadísticas para liberación...")
-            
-        # Estadísticas para liberación
-        df_L2_lb = df_L2_lb.loc[df_L2_lb["Estado"].str.contains("Ocupacion")]
-        df_L2_aux_lb = df_L2_lb.pivot_table(
-            index=["Equipo", "Estado"],
-            values="Diff.Time_-1_row",
-            aggfunc={np.mean, np.std, np.median}
-        )
-        df_L2_aux_lb.rename(
-            columns={"mean": "mean_lib", "std": "std_lib", "median": "median_lib"},
-            inplace=True
-        )
-        
-        if progress_callback:
-            progress_callback(71, "Calculando estadísticas para ocupación...")
-            
-        # Estadísticas para ocupación
-        df_L2_oc = df_L2_oc.loc[df_L2_oc["Estado"].str.contains("Liberacion")]
-        df_L2_aux_oc = df_L2_oc.pivot_table(
-            index=["Equipo", "Estado"],
-            values="Diff.Time_-1_row",
-            aggfunc={np.mean, np.std, np.median}
-        )
-        df_L2_aux_oc.rename(
-            columns={"mean": "mean_oc", "std": "std_oc", "median": "median_oc"},
-            inplace=True
-        )
-        
-        if progress_callback:
-            progress_callback(73, "Combinando estadísticas...")
-            
-        # Combinar estadísticas con el DataFrame principal
-        self.df = self.df.merge(df_L2_aux_lb, on="Equipo")
-        self.df = self.df.merge(df_L2_aux_oc, on="Equipo")
-        
-        # Ordenar los datos
-        self.df = self.df.sort_values(["Equipo", "Fecha Hora"])
+        # Estadísticas de liberación y ocupación por equipo en una sola pasada,
+        # ordenadas por equipo y fecha
+        self.df = self.state_statistics(self.df, {
+            "lib": self.label_mask(self.df["Estado"], "Ocupacion"),
+            "oc": self.label_mask(self.df["Estado"], "Liberacion")
+        })
         
         # Redondear valores estadísticos
         for col in ["Diff.Time_-1_row", "Diff.Time_-2_row", "Diff.Time_+1_row", 
@@ -325,24 +287,22 @@ class CDVProcessorL2(BaseProcessor):
             progress_callback(75, "Iniciando detección de anomalías...")
             
         # Detectar Fallos de Ocupación (FO)
-        self.df["FO"] = np.where(
-            (self.df["Estado"].str.contains("Ocupacion")), 
-            np.where((self.df["Diff.Time_+1_row"] < (self.f_oc_1 * self.df["median_oc"])), "PFO", "NFO"), 
-            "NA"
+        self.df["FO"] = flag_labels(
+            self.label_mask(self.df["Estado"], "Ocupacion"),
+            self.df["Diff.Time_+1_row"] < (self.f_oc_1 * self.df["median_oc"]), "PFO", "NFO"
         )
         
         if progress_callback:
             progress_callback(80, "Detectando fallos de liberación...")
             
         # Detectar Fallos de Liberación (FL)
-        self.df["FL"] = np.where(
-            (self.df["Estado"].str.contains("Liberacion")), 
-            np.where((self.df["Diff.Time_+1_row"] < (self.f_lb_2 * self.df["median_lib"])), "PFL", "NFL"), 
-            "NA"
+        self.df["FL"] = flag_labels(
+            self.label_mask(self.df["Estado"], "Liberacion"),
+            self.df["Diff.Time_+1_row"] < (self.f_lb_2 * self.df["median_lib"]), "PFL", "NFL"
         )
         
         # Agregar identificador de línea
-        self.df["Linea"] = "L2"
+        self.df["Linea"] = repeated_label("L2", len(self.df))
         
         if progress_callback:
             progress_callback(85, "Detección de anomalías completada")
@@ -357,11 +317,11 @@ class CDVProcessorL2(BaseProcessor):
         # 1. Preparar reporte de fallos de ocupación (FO)
         self.df_L2_FO = self.df.loc[self.df['FO'] == 'PFO']
         
-        # Eliminar columnas innecesarias
+        # Eliminar columnas innecesarias y devolver las etiquetas a texto
         columns_to_drop = ['Estado', 'Diff.Time_-1_row', 'Diff.Time_-2_row', 'Diff.Time_+2_row', 
                            'Tiempo Conjunto', 'mean_lib', 'median_lib', 'std_lib', 
                            'mean_oc', 'median_oc', 'std_oc', 'FL']
-        self.df_L2_FO = self.df_L2_FO.drop(columns=columns_to_drop)
+        self.df_L2_FO = decode_columns(self.df_L2_FO.drop(columns=columns_to_drop))
         
         # Crear ID único
         self.df_L2_FO['Fecha Hora'] = self.df_L2_FO['Fecha Hora'].astype(str)
@@ -378,7 +338,7 @@ class CDVProcessorL2(BaseProcessor):
         
         # Filtrar y agrupar
         self.df_L2_OCUP = self.df[self.df['Estado'] == 'Ocupacion']
-        self.df_L2_OCUP = self.df_L2_OCUP.groupby(['Equipo', 'Fecha']).size().reset_index(name='Count')
+        self.df_L2_OCUP = self.df_L2_OCUP.groupby(['Equipo', 'Fecha'], observed=True).size().reset_index(name='Count')
         
         # Crear ID único
         self.df_L2_OCUP['Fecha'] = self.df_L2_OCUP['Fecha'].astype(str)
@@ -392,11 +352,11 @@ class CDVProcessorL2(BaseProcessor):
         # 3. Preparar reporte de fallos de liberación (FL)
         self.df_L2_FL = self.df.loc[self.df['FL'] == 'PFL']
         
-        # Eliminar columnas innecesarias
+        # Eliminar columnas innecesarias y devolver las etiquetas a texto
         columns_to_drop = ['Estado', 'Diff.Time_-1_row', 'Diff.Time_-2_row', 'Diff.Time_+2_row', 
                           'Tiempo Conjunto', 'mean_lib', 'median_lib', 'std_lib', 
                           'mean_oc', 'median_oc', 'std_oc', 'FO', 'Fecha']
-        self.df_L2_FL = self.df_L2_FL.drop(columns=columns_to_drop)
+        self.df_L2_FL = decode_columns(self.df_L2_FL.drop(columns=columns_to_drop))
         
         # Crear ID único
         self.df_L2_FL['Fecha Hora'] = self.df_L2_FL['Fecha Hora'].astype(str)
@@ -2,15 +2,28 @@
 import pandas as pd
 import numpy as np
 import os
-import concurrent.futures
+import re
 from datetime import datetime, timedelta
 from processors.base_processor import BaseProcessor
+from processors.pipeline_schema import categorical, coded_labels, map_labels, flag_labels, repeated_label, decode_columns
+from processors.source_formats import L4_LOG, read_source
+
+# Prefiltro de líneas: solo las que mencionan un CDV llegan al parser
+CDV_LINE_FILTER = re.compile(rb'TR_CDV')
 
 class CDVProcessorL4(BaseProcessor):
     """Procesador para datos CDV de la Línea 4"""
     
+    # v3: lectura con descriptor de formato (columnas 0 a 2) y prefiltro de líneas
+    PARSER_VERSION = 3
+    
     def __init__(self):
         super().__init__(line="L4", analysis_type="CDV")
+        # Ventana de análisis: los archivos sin datos de los últimos 40 días no se leen
+        self.window_days = 40
+        # Lectura en procesos: el parser 'python' de pandas no libera el GIL
+        self.ingest_mode = 'process'
+        self.ingest_workers = os.cpu_count() or 1
         # Atributos específicos para CDV L4
         self.df = None
         self.df_L4_2 = None
@@ -30,22 +43,13 @@ class CDVProcessorL4(BaseProcessor):
         if not os.path.exists(self.root_folder_path):
             raise FileNotFoundError(f"La ruta {self.root_folder_path} no existe")
         
-        # Iterar sobre las carpetas dentro de la carpeta raíz
-        for folder1 in os.listdir(self.root_folder_path):   
-            folder_path1 = os.path.join(self.root_folder_path, folder1)
-            if os.path.isdir(folder_path1):
-                # Iterar sobre las carpetas dentro de la carpeta actual
-                for folder2 in os.listdir(folder_path1):
-                    folder_path2 = os.path.join(folder_path1, folder2)
-                    if os.path.isdir(folder_path2):
-                        # Iterar sobre los archivos dentro de cada carpeta
-                        for file in os.listdir(folder_path2):
-                            # Verificar si el archivo contiene "VID"
-                            if "VID" in file:
-                                try:
-                                    self.csv_files.append(os.path.join(folder_path2, file))
-                                except ValueError:
-                                    print(f"Error al analizar la fecha del archivo: {file}")
+        # Archivos dentro de las carpetas de segundo nivel (raíz/carpeta1/carpeta2/archivo)
+        self.source_files = [
+            source for source in self.discover_files(self.root_folder_path, depth=2)
+            # Verificar si el archivo contiene "VID"
+            if "VID" in source.name
+        ]
+        self.csv_files = [source.path for source in self.source_files]
         
         return len(self.csv_files)
     
@@ -54,33 +58,13 @@ class CDVProcessorL4(BaseProcessor):
         if progress_callback:
             progress_callback(5, f"Leyendo {len(self.csv_files)} archivos...")
         
-        df_L4_list = []
-        total_files = len(self.csv_files)
-        
-        # Función para procesar un solo archivo
-        def process_file(index_file_tuple):
-            index, csv_file = index_file_tuple
-            try:
-                # Leer el archivo y filtrar por CDV
-                df = pd.read_table(csv_file, encoding="Latin-1", sep="|", skiprows=0, header=None, engine='python')
-                df = df[df[1].str.contains('TR_CDV', na=False)]
-                
-                if progress_callback and index % 5 == 0:  # Actualizar cada 5 archivos para no saturar la UI
-                    progress = 5 + (index / total_files) * 15
-                    progress_callback(progress, f"Procesando archivo {index+1} de {total_files}")
-                
-                return df
-            except Exception as e:
-                if progress_callback:
-                    progress_callback(None, f"No se pudo leer el archivo {csv_file} debido a un error: {e}")
-                return pd.DataFrame()  # Retornar DataFrame vacío en caso de error
-        
-        # Usar ThreadPoolExecutor para procesar archivos en paralelo
-        with concurrent.futures.ThreadPoolExecutor(max_workers=min(10, os.cpu_count() or 1)) as executor:
-            results = list(executor.map(process_file, enumerate(self.csv_files)))
-        
-        # Filtrar DataFrames vacíos y concatenar resultados
-        df_L4_list = [df for df in results if not df.empty]
+        # Leer en paralelo solo los archivos nuevos o modificados (manifiesto de ingesta),
+        # compartiendo la lectura con el procesador ADV si ambos corren a la vez
+        df_L4_list = self.ingest_files(
+            self.csv_files, self._read_vid_file, "VID", progress_callback,
+            progress_start=5, progress_end=20, max_workers=min(10, os.cpu_count() or 1), shared=True,
+            split_header=L4_LOG.skiprows
+        )
         
         if df_L4_list:
             if progress_callback:
@@ -94,6 +78,12 @@ class CDVProcessorL4(BaseProcessor):
                 progress_callback(None, "No se encontraron datos válidos en los archivos.")
             return False
     
+    @staticmethod
+    def _read_vid_file(csv_file):
+        """Leer un archivo VID y conservar solo las filas de CDV"""
+        df = read_source(csv_file, L4_LOG, line_filter=CDV_LINE_FILTER)
+        return df[df[1].str.contains('TR_CDV', na=False)]
+    
     def preprocess_data(self, progress_callback=None):
         """Preprocesar datos para análisis CDV de Línea 4"""
         if progress_callback:
@@ -101,123 +91,77 @@ class CDVProcessorL4(BaseProcessor):
         
         # Convertir a datetime y filtrar por fecha (últimos 40 días) - FILTRO TEMPRANO
         self.df[0] = pd.to_datetime(self.df[0], dayfirst=True, errors='coerce')
-        date_threshold = datetime.now() - timedelta(days=40)
+        date_threshold = datetime.now() - timedelta(days=self.window_days)
         self.df = self.df[self.df[0] >= date_threshold]
         
         if progress_callback:
             progress_callback(25, "Procesando columnas...")
         
-        # Procesar columnas como en el script original
-        df_aux = self.df[1].str.split(":", expand=True)
-        df_aux.columns = ["COL.1", "COL.2"]
-        self.df = self.df.join(df_aux)
-        
-        df_aux_2 = self.df["COL.2"].str.split("_", expand=True)
-        df_aux_2.columns = ["COL.3", "COL.4"]
-        self.df = self.df.join(df_aux_2)
-        
-        self.df["COL.1"] = self.df["COL.1"].str.replace("__", "_")
-        df_aux_3 = self.df["COL.1"].str.split("_", expand=True)
-        df_aux_3.columns = ["COL.5", "COL.6", "COL.7", "COL.8", "COL.9"]
-        self.df = self.df.join(df_aux_3)
-        
-        # Seleccionar columnas y renombrar
-        cols = [0, 4, 8, 10, 11, 7, 2, 3, 5, 6, 1, 9, 12]
-        self.df = self.df.iloc[:, cols]
-        self.df = self.df.drop(self.df.columns[[7, 8, 9, 10, 11, 12]], axis=1)
-        
-        self.df.rename(
-            columns={0: "Fecha Hora", "COL.1": "Equipo", "COL.5": "Estacion", 
-                    "COL.7": "Subsistema", "COL.8": "Numero Equipo", "COL.4": "Atributo", 2: "Estado"},
-            inplace=True
-        )
+        # Equipo y estación desde la señal (columna 1) y estado como columnas
+        # categóricas: las divisiones de texto se hacen una vez por señal distinta
+        senal = map_labels(self.df[1], self._signal_labels)
+        self.df = pd.DataFrame({
+            "Fecha Hora": self.df[0], "Equipo": senal["Equipo"],
+            "Estacion": senal["Estacion"], "Estado": categorical(self.df[2])
+        })
         
         if progress_callback:
             progress_callback(30, "Limpiando datos...")
         
-        # Limpieza y preparación adicional
-        self.df["Numero Equipo"] = self.df["Numero Equipo"].astype("string")
+        # Ordenar por equipo y fecha (las categorías siguen el orden del texto)
         self.df = self.df.sort_values(["Equipo", "Fecha Hora"])
-        self.df["Fecha Hora"] = pd.to_datetime(self.df["Fecha Hora"], dayfirst=True)
-        self.df = self.df.reset_index()
-        
-        if "index" in self.df.columns:
-            self.df = self.df.drop("index", axis=1)
-        
-        # Eliminar columnas no necesarias
-        self.df = self.df.drop(["Subsistema", "Numero Equipo", "Atributo"], axis=1)
+        self.df = self.df.reset_index(drop=True)
         
         # Filtrar por horario operativo (6am a 11pm)
         self.df.set_index('Fecha Hora', inplace=True)
         self.df = self.df[(self.df.index.hour >= 6) & (self.df.index.hour <= 23)]
         self.df = self.df.reset_index()
         
-        # Convertir estados "libre" a 1 y "ocupado" a 0
-        self.df['Estado'] = self.df['Estado'].replace(' ', '')
-        self.df['Estado'] = self.df['Estado'].apply(lambda x: 0 if 'ocupado' in str(x).lower() else x)
-        self.df['Estado'] = self.df['Estado'].apply(lambda x: 1 if 'libre' in str(x).lower() else x)
-        self.df['Estado'] = self.df['Estado'].replace('ocupado', 0)
-        self.df['Estado'] = self.df['Estado'].replace('libre', 1)
-        
-        # Mantener solo estados válidos y eliminar repeticiones consecutivas
-        self.df = self.df[self.df['Estado'].isin([1, 0])]
-        self.df["Estado"] = self.df["Estado"].astype("float64")
-        self.df["Diff_Aux"] = self.df["Estado"].diff(periods=1)
-        self.df["Diff_Aux"] = self.df["Diff_Aux"].astype("string")
-        self.df = self.df.loc[~(self.df["Diff_Aux"].str.contains("0.0"))]
-        self.df = self.df.drop('Diff_Aux', axis=1)
-        
-        # Convertir de nuevo a formato texto para facilitar análisis
-        self.df['Estado'] = self.df['Estado'].replace(1, 'libre')
-        self.df['Estado'] = self.df['Estado'].replace(0, 'ocupado')
-        
-        # Limpiar nombres de equipos
-        self.df["Equipo"] = self.df["Equipo"].str.replace("TR_", "")
-        for i in range(10):
-            self.df["Equipo"] = self.df["Equipo"].str.replace(f"{i}_", f"{i}")
+        # Estados como códigos: 0 si contiene "ocupado", 1 si contiene "libre", -1 otro valor
+        estado = map_labels(self.df['Estado'], lambda labels: labels.astype(str).str.lower())
+        codes = np.where(self.label_mask(estado, 'ocupado'), 0,
+                         np.where(self.label_mask(estado, 'libre'), 1, -1)).astype(np.int8)
+        
+        # Mantener solo estados válidos y eliminar repeticiones consecutivas (comparación
+        # continua sobre la tabla ordenada; el primer registro se descarta)
+        valid = codes >= 0
+        self.df, codes = self.df[valid], codes[valid]
+        keep = self.transition_mask(codes, keep_first=False)
+        self.df, codes = self.df[keep].copy(), codes[keep]
+        
+        # Etiquetas de texto para facilitar análisis (categóricas sobre los códigos)
+        self.df['Estado'] = coded_labels(codes, ['ocupado', 'libre'])
+        
+        # Limpiar nombres de equipos (una vez por equipo distinto)
+        self.df["Equipo"] = map_labels(self.df["Equipo"], self._equipment_labels)
         
         if progress_callback:
             progress_callback(45, "Preprocesamiento completado")
         
         return True
     
+    @staticmethod
+    def _signal_labels(labels):
+        """Equipo (parte anterior a ':', sin '__') y estación (primer campo del equipo) de cada señal"""
+        equipo = labels.str.split(":", expand=True)[0].str.replace("__", "_")
+        return pd.DataFrame({"Equipo": equipo, "Estacion": equipo.str.split("_", expand=True)[0]})
+    
+    @staticmethod
+    def _equipment_labels(labels):
+        """Nombre limpio de cada equipo: sin 'TR_' ni '_' tras un dígito"""
+        labels = labels.str.replace("TR_", "")
+        for i in range(10):
+            labels = labels.str.replace(f"{i}_", f"{i}")
+        return labels
+    
     def calculate_time_differences(self, progress_callback=None):
         """Calcular diferencias de tiempo entre eventos"""
         if progress_callback:
             progress_callback(45, "Calculando diferencias temporales...")
         
-        # Diferencias con registros anteriores
-        self.df["Diff.Time_-1_row"] = self.df["Fecha Hora"].diff(periods=1)
-        self.df["Diff.Time_-1_row"] = self.df["Diff.Time_-1_row"].dt.total_seconds()
-        self.df["Diff.Time_-1_row"] = self.df["Diff.Time_-1_row"].astype("float64")
-        self.df["Diff.Time_-1_row"] = round(self.df["Diff.Time_-1_row"], 2)
-        
-        self.df["Diff.Time_-2_row"] = self.df["Fecha Hora"].diff(periods=2)
-        self.df["Diff.Time_-2_row"] = self.df["Diff.Time_-2_row"].dt.total_seconds()
-        self.df["Diff.Time_-2_row"] = self.df["Diff.Time_-2_row"].astype("float64")
-        self.df["Diff.Time_-2_row"] = round(self.df["Diff.Time_-2_row"], 2)
-        
-        # Diferencias con registros siguientes
-        self.df["Diff.Time_+1_row"] = self.df["Fecha Hora"].diff(periods=-1)
-        self.df["Diff.Time_+1_row"] = -1 * self.df["Diff.Time_+1_row"].dt.total_seconds()
-        self.df["Diff.Time_+1_row"] = self.df["Diff.Time_+1_row"].astype("float64")
-        self.df["Diff.Time_+1_row"] = round(self.df["Diff.Time_+1_row"], 2)
-        
-        self.df["Diff.Time_+2_row"] = self.df["Fecha Hora"].diff(periods=-2)
-        self.df["Diff.Time_+2_row"] = -1 * self.df["Diff.Time_+2_row"].dt.total_seconds()
-        self.df["Diff.Time_+2_row"] = self.df["Diff.Time_+2_row"].astype("float64")
-        self.df["Diff.Time_+2_row"] = round(self.df["Diff.Time_+2_row"], 2)
-        
-        # Filtrar tiempos válidos
-        self.df = self.df.loc[self.df["Diff.Time_-1_row"] >= 0.0]
-        self.df = self.df.loc[self.df["Diff.Time_-2_row"] >= 0.0]
-        self.df = self.df.loc[self.df["Diff.Time_+1_row"] >= 0.0]
-        self.df = self.df.loc[self.df["Diff.Time_+2_row"] >= 0.0]
-        
-        # Calcular tiempo conjunto
-        self.df["Tiempo Conjunto"] = self.df["Diff.Time_-1_row"] + self.df["Diff.Time_+2_row"]
-        self.df["Tiempo Conjunto"] = self.df["Tiempo Conjunto"].astype("float64")
-        self.df["Tiempo Conjunto"] = round(self.df["Tiempo Conjunto"], 2)
+        # Diferencias con los registros anteriores y siguientes (±1 y ±2), filtro de
+        # tiempos válidos y tiempo conjunto en una sola pasada
+        self.df = self.time_differences(self.df, decimals=2)
         
         if progress_callback:
             progress_callback(60, "Cálculo de diferencias temporales completado")
@@ -229,53 +173,12 @@ class CDVProcessorL4(BaseProcessor):
         if progress_callback:
             progress_callback(60, "Calculando estadísticas...")
         
-        # Crear copias para análisis por separado
-        df_L4_lb = self.df.copy()
-        df_L4_oc = self.df.copy()
-        
-        # Estadísticas generales
-        df_L4_aux_avg = self.df.pivot_table(
-            index=["Equipo", "Estado"],
-            values="Diff.Time_+1_row",
-            aggfunc={np.mean, np.std, np.median, np.min, np.max}
-        )
-        
-        # Estadísticas para estado "ocupado" (liberación)
-        df_L4_lb = df_L4_lb.loc[df_L4_lb["Estado"].str.contains("ocupado")]
-        df_L4_aux_lb = df_L4_lb.pivot_table(
-            index=["Equipo", "Estado"],
-            values="Diff.Time_-1_row",
-            aggfunc={np.mean, np.std, np.median, np.min, np.max}
-        )
-        df_L4_aux_lb.rename(
-            columns={"amax": "max_lib", "amin": "min_lib", "mean": "mean_lib", "std": "std_lib", "median": "median_lib"},
-            inplace=True
-        )
-        
-        # Estadísticas para estado "libre" (ocupación)
-        df_L4_oc = df_L4_oc.loc[df_L4_oc["Estado"].str.contains("libre")]
-        df_L4_aux_oc = df_L4_oc.pivot_table(
-            index=["Equipo", "Estado"],
-            values="Diff.Time_-1_row",
-            aggfunc={np.mean, np.std, np.median, np.min, np.max}
-        )
-        df_L4_aux_oc.rename(
-            columns={"amax": "max_oc", "amin": "min_oc", "mean": "mean_oc", "std": "std_oc", "median": "median_oc"},
-            inplace=True
-        )
-        
-        # Combinar estadísticas
-        self.df = self.df.merge(df_L4_aux_lb, on="Equipo")
-        self.df = self.df.merge(df_L4_aux_oc, on="Equipo")
-        
-        # Ordenar y eliminar columnas innecesarias
-        self.df = self.df.sort_values(["Equipo", "Fecha Hora"])
-        
-        # Eliminar columnas adicionales que puedan haberse generado
-        columns_to_drop = ["min_x", "max_x", "max_y", "min_y"]
-        for col in columns_to_drop:
-            if col in self.df.columns:
-                self.df = self.df.drop(col, axis=1)
+        # Estadísticas de los estados "ocupado" (liberación) y "libre" (ocupación)
+        # por equipo en una sola pasada, ordenadas por equipo y fecha
+        self.df = self.state_statistics(self.df, {
+            "lib": self.label_mask(self.df["Estado"], "ocupado"),
+            "oc": self.label_mask(self.df["Estado"], "libre")
+        })
         
         # Redondear columnas numéricas
         numeric_columns = [
@@ -298,21 +201,19 @@ class CDVProcessorL4(BaseProcessor):
             progress_callback(70, "Detectando anomalías...")
         
         # Detectar Fallos de Ocupación (FO)
-        self.df["FO"] = np.where(
-            self.df["Estado"].str.contains("ocupado"), 
-            np.where(self.df["Diff.Time_+1_row"] < (self.f_oc_1 * self.df["median_oc"]), "PFO", "NFO"), 
-            "NA"
+        self.df["FO"] = flag_labels(
+            self.label_mask(self.df["Estado"], "ocupado"),
+            self.df["Diff.Time_+1_row"] < (self.f_oc_1 * self.df["median_oc"]), "PFO", "NFO"
         )
         
         # Detectar Fallos de Liberación (FL)
-        self.df["FL"] = np.where(
-            self.df["Estado"].str.contains("libre"), 
-            np.where(self.df["Diff.Time_+1_row"] < (self.f_lb_2 * self.df["median_lib"]), "PFL", "NFL"), 
-            "NA"
+        self.df["FL"] = flag_labels(
+            self.label_mask(self.df["Estado"], "libre"),
+            self.df["Diff.Time_+1_row"] < (self.f_lb_2 * self.df["median_lib"]), "PFL", "NFL"
         )
         
         # Agregar identificador de línea
-        self.df["Linea"] = "L4"
+        self.df["Linea"] = repeated_label("L4", len(self.df))
         
         if progress_callback:
             progress_callback(80, "Detección de anomalías completada")
@@ -327,13 +228,13 @@ class CDVProcessorL4(BaseProcessor):
         # 1. Preparar reporte de fallos de ocupación (FO)
         self.df_L4_FO = self.df.loc[self.df['FO'] == 'PFO']
         
-        # Eliminar columnas innecesarias
+        # Eliminar columnas innecesarias y devolver las etiquetas a texto
         columns_to_drop = [
             'Estado', 'Diff.Time_-1_row', 'Diff.Time_-2_row', 'Diff.Time_+2_row', 
             'Tiempo Conjunto', 'mean_lib', 'median_lib', 'std_lib', 
             'mean_oc', 'median_oc', 'std_oc', 'FL'
         ]
-        self.df_L4_FO = self.df_L4_FO.drop(columns=columns_to_drop)
+        self.df_L4_FO = decode_columns(self.df_L4_FO.drop(columns=columns_to_drop))
         
         # Crear ID único
         self.df_L4_FO['Fecha Hora'] = self.df_L4_FO['Fecha Hora'].astype(str)
@@ -345,7 +246,7 @@ class CDVProcessorL4(BaseProcessor):
         self.df['Fecha'] = self.df['Fecha Hora'].dt.date
         
         self.df_L4_OCUP = self.df[self.df['Estado'] == 'ocupado']
-        self.df_L4_OCUP = self.df_L4_OCUP.groupby(['Equipo', 'Fecha']).size().reset_index(name='Count')
+        self.df_L4_OCUP = self.df_L4_OCUP.groupby(['Equipo', 'Fecha'], observed=True).size().reset_index(name='Count')
         
         # Crear ID único
         self.df_L4_OCUP['Fecha'] = self.df_L4_OCUP['Fecha'].astype(str)
@@ -357,13 +258,13 @@ class CDVProcessorL4(BaseProcessor):
         # 3. Preparar reporte de fallos de liberación (FL)
         self.df_L4_FL = self.df.loc[self.df['FL'] == 'PFL']
         
-        # Eliminar columnas innecesarias
+        # Eliminar columnas innecesarias y devolver las etiquetas a texto
         columns_to_drop = [
             'Estado', 'Diff.Time_-1_row', 'Diff.Time_-2_row', 'Diff.Time_+2_row', 
             'Tiempo Conjunto', 'mean_lib', 'median_lib', 'std_lib', 
             'mean_oc', 'median_oc', 'std_oc', 'FO', 'Fecha'
         ]
-        self.df_L4_FL = self.df_L4_FL.drop(columns=columns_to_drop)
+        self.df_L4_FL = decode_columns(self.df_L4_FL.drop(columns=columns_to_drop))
         
         # Crear ID único
         self.df_L4_FL['Fecha Hora'] = self.df_L4_FL['Fecha Hora'].astype(str)
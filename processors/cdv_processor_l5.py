@@ -1,15 +1,28 @@
 # processors/cdv_processor_l5.py
 import pandas as pd
-import numpy as np
 import os
+import re
 from datetime import datetime, timedelta
 from processors.base_processor import BaseProcessor
+from processors.pipeline_schema import encode_columns, map_labels, flag_labels, repeated_label, decode_columns
+from processors.source_formats import L5_TXT, TXT_EXTENSIONS, scan_mapped
+
+# Prefiltro de líneas: solo las que mencionan un CDV llegan al parser
+CDV_LINE_FILTER = re.compile(rb'CDV')
+
+# Códigos de estado de los CDV para el núcleo de transiciones
+STATE_CODES = {'Ocupacion': 0, 'Liberacion': 1}
 
 class CDVProcessorL5(BaseProcessor):
     """Procesador para datos CDV de la Línea 5"""
     
+    # v3: lectura con descriptor de formato (columnas 0 a 5) y prefiltro de líneas
+    PARSER_VERSION = 3
+    
     def __init__(self):
         super().__init__(line="L5", analysis_type="CDV")
+        # Ventana de análisis: los archivos sin datos de los últimos 40 días no se leen
+        self.window_days = 40
         # Atributos específicos para CDV L5
         self.df_L5_2 = None
         self.df_L5_FO = None
@@ -26,33 +39,22 @@ class CDVProcessorL5(BaseProcessor):
         if not os.path.exists(self.root_folder_path):
             raise FileNotFoundError(f"La ruta {self.root_folder_path} no existe")
             
-        # Recorrer carpetas y encontrar archivos TXT
-        for folder in os.listdir(self.root_folder_path):
-            folder_path = os.path.join(self.root_folder_path, folder)
-            if os.path.isdir(folder_path):
-                for file in os.listdir(folder_path):
-                    if file.endswith('.txt'):
-                        self.txt_files.append(os.path.join(folder_path, file))
+        # Recorrer carpetas y encontrar archivos TXT, también comprimidos (un nivel por debajo de la raíz)
+        self.source_files = [
+            source for source in self.discover_files(self.root_folder_path, depth=1)
+            if source.name.endswith(TXT_EXTENSIONS)
+        ]
+        self.txt_files = [source.path for source in self.source_files]
         
         return len(self.txt_files)
     
     def read_files(self, progress_callback=None):
         """Leer archivos TXT para análisis CDV de Línea 5"""
-        df_list = []
-        total_files = len(self.txt_files)
-        
-        for i, txt in enumerate(self.txt_files):
-            try:
-                if progress_callback:
-                    progress = (i / total_files) * 15
-                    progress_callback(5 + progress, f"Procesando archivo {i+1} de {total_files}: {os.path.basename(txt)}")
-                
-                df = pd.read_csv(txt, encoding="Latin-1", sep=";", skiprows=7, header=None, engine='python')
-                df = df[df[4].str.contains('CDV', na=False)]
-                df_list.append(df)
-            except Exception as e:
-                if progress_callback:
-                    progress_callback(None, f"Error en archivo {txt}: {str(e)}")
+        # Leer solo los archivos nuevos o modificados (manifiesto de ingesta), compartiendo
+        # la lectura con el procesador ADV si ambos corren a la vez
+        df_list = self.ingest_files(self.txt_files, self._read_txt_file, "TXT", progress_callback,
+                                    progress_start=5, progress_end=20, shared=True,
+                                    split_header=L5_TXT.skiprows)
         
         if df_list:
             self.df = pd.concat(df_list, ignore_index=True)
@@ -61,6 +63,12 @@ class CDVProcessorL5(BaseProcessor):
         else:
             return False
     
+    @staticmethod
+    def _read_txt_file(txt):
+        """Leer un archivo TXT y conservar solo las filas de CDV"""
+        df = scan_mapped(txt, L5_TXT, line_filter=CDV_LINE_FILTER)
+        return df[df[4].str.contains('CDV', na=False)]
+    
     def preprocess_data(self, progress_callback=None):
         """Realizar el preprocesamiento inicial de los datos"""
         if progress_callback:
@@ -74,9 +82,7 @@ class CDVProcessorL5(BaseProcessor):
             progress_callback(25, "Formateando datos...")
             
         # Eliminar columnas innecesarias y reordenar
-        self.df = self.df.drop(self.df.columns[[0,1,6,7]], axis=1)
-        cols = [4,2,0,1,3]
-        self.df = self.df.iloc[:,cols]
+        self.df = self.df[["Fecha Hora", 4, 2, 3, 5]]
         
         # Renombrar columnas
         self.df.rename(
@@ -88,16 +94,17 @@ class CDVProcessorL5(BaseProcessor):
             progress_callback(30, "Filtrando por fecha...")
             
         # Filtrar por fecha (últimos 40 días)
-        date_threshold = datetime.now() - timedelta(days=40)
+        date_threshold = datetime.now() - timedelta(days=self.window_days)
         self.df = self.df[self.df["Fecha Hora"] >= date_threshold]
         
         if progress_callback:
             progress_callback(35, "Ordenando datos...")
             
-        # Ordenar y filtrar por hora del día
-        self.df = self.df.sort_values(["Equipo", "Fecha Hora"])
+        # Columnas de texto como categóricas (las categorías siguen el orden del texto),
+        # ordenar y filtrar por hora del día
+        self.df = encode_columns(self.df).sort_values(["Equipo", "Fecha Hora"])
         self.df = self.df.reset_index()
-        self.df["Estado"] = self.df["Estado"].str.split(" ").str[0]
+        self.df["Estado"] = map_labels(self.df["Estado"], lambda labels: labels.str.split(" ").str[0])
         self.df.set_index('Fecha Hora', inplace=True)
         self.df = self.df[(self.df.index.hour >= 6) & (self.df.index.hour <= 23)]
         self.df = self.df.reset_index()
@@ -115,27 +122,15 @@ class CDVProcessorL5(BaseProcessor):
     
     def process_states(self):
         """Procesar estados para CDV de Línea 5"""
-        # Crear copia del DataFrame
-        self.df_L5_2 = self.df.copy()
-        
-        # Convertir estados a numéricos
-        self.df_L5_2['Estado'] = self.df_L5_2['Estado'].replace('Liberacion', 1)
-        self.df_L5_2['Estado'] = self.df_L5_2['Estado'].replace('Ocupacion', 0)
-        
-        # Ordenar y filtrar
-        self.df_L5_2 = self.df_L5_2.sort_values(["Equipo", "Fecha Hora"])
-        self.df_L5_2 = self.df_L5_2[self.df_L5_2['Estado'].isin([1, 0])]
-        self.df_L5_2["Estado"] = self.df_L5_2["Estado"].astype("float64")
+        # Ordenar por equipo y fecha, con estados como códigos (0 = Ocupacion, 1 = Liberacion)
+        self.df_L5_2 = self.df.sort_values(["Equipo", "Fecha Hora"])
+        codes = self.state_codes(self.df_L5_2['Estado'], STATE_CODES)
         
-        # Detectar cambios de estado
-        self.df_L5_2["Diff_Aux"] = self.df_L5_2["Estado"].diff(periods=1)
-        self.df_L5_2["Diff_Aux"] = self.df_L5_2["Diff_Aux"].astype("string")
-        self.df_L5_2 = self.df_L5_2.loc[~(self.df_L5_2["Diff_Aux"].str.contains("0.0"))]
-        
-        # Limpiar y restaurar etiquetas originales
-        self.df_L5_2 = self.df_L5_2.drop('Diff_Aux', axis=1)
-        self.df_L5_2['Estado'] = self.df_L5_2['Estado'].replace(1, 'Liberacion')
-        self.df_L5_2['Estado'] = self.df_L5_2['Estado'].replace(0, 'Ocupacion')
+        # Conservar solo estados válidos y los cambios respecto del registro anterior
+        # (comparación continua sobre la tabla ordenada; el primer registro se descarta)
+        valid = codes >= 0
+        self.df_L5_2, codes = self.df_L5_2[valid], codes[valid]
+        self.df_L5_2 = self.df_L5_2[self.transition_mask(codes, keep_first=False)]
         
         # Actualizar DataFrame principal
         self.df = self.df_L5_2.copy()
@@ -145,47 +140,9 @@ class CDVProcessorL5(BaseProcessor):
         if progress_callback:
             progress_callback(45, "Calculando diferencias temporales...")
             
-        # Calcular diferencia con registros anteriores
-        self.df["Diff.Time_-1_row"] = self.df["Fecha Hora"].diff(periods=1)
-        self.df["Diff.Time_-1_row"] = self.df["Diff.Time_-1_row"].dt.total_seconds()
-        self.df["Diff.Time_-1_row"] = self.df["Diff.Time_-1_row"].astype("float64")
-        self.df["Diff.Time_-1_row"] = round(self.df["Diff.Time_-1_row"], 1)
-        
-        self.df["Diff.Time_-2_row"] = self.df["Fecha Hora"].diff(periods=2)
-        self.df["Diff.Time_-2_row"] = self.df["Diff.Time_-2_row"].dt.total_seconds()
-        self.df["Diff.Time_-2_row"] = self.df["Diff.Time_-2_row"].astype("float64")
-        self.df["Diff.Time_-2_row"] = round(self.df["Diff.Time_-2_row"], 1)
-        
-        if progress_callback:
-            progress_callback(50, "Calculando diferencias temporales hacia adelante...")
-            
-        # Calcular diferencia con registros siguientes
-        self.df["Diff.Time_+1_row"] = self.df["Fecha Hora"].diff(periods=-1)
-        self.df["Diff.Time_+1_row"] = -1 * self.df["Diff.Time_+1_row"].dt.total_seconds()
-        self.df["Diff.Time_+1_row"] = self.df["Diff.Time_+1_row"].astype("float64")
-        self.df["Diff.Time_+1_row"] = round(self.df["Diff.Time_+1_row"], 1)
-        
-        self.df["Diff.Time_+2_row"] = self.df["Fecha Hora"].diff(periods=-2)
-        self.df["Diff.Time_+2_row"] = -1 * self.df["Diff.Time_+2_row"].dt.total_seconds()
-        self.df["Diff.Time_+2_row"] = self.df["Diff.Time_+2_row"].astype("float64")
-        self.df["Diff.Time_+2_row"] = round(self.df["Diff.Time_+2_row"], 1)
-        
-        if progress_callback:
-            progress_callback(55, "Filtrando datos por tiempos válidos...")
-            
-        # Filtrar por tiempos positivos
-        self.df = self.df.loc[self.df["Diff.Time_-1_row"] >= 0.0]
-        self.df = self.df.loc[self.df["Diff.Time_-2_row"] >= 0.0]
-        self.df = self.df.loc[self.df["Diff.Time_+1_row"] >= 0.0]
-        self.df = self.df.loc[self.df["Diff.Time_+2_row"] >= 0.0]
-        
-        if progress_callback:
-            progress_callback(60, "Calculando tiempo conjunto...")
-            
-        # Calcular tiempo conjunto
-        self.df["Tiempo Conjunto"] = self.df["Diff.Time_-1_row"] + (self.df["Diff.Time_+2_row"])
-        self.df["Tiempo Conjunto"] = self.df["Tiempo Conjunto"].astype("float64")
-        self.df["Tiempo Conjunto"] = round(self.df["Tiempo Conjunto"], 2)
+        # Diferencias con los registros anteriores y siguientes (±1 y ±2), filtro de
+        # tiempos válidos y tiempo conjunto en una sola pasada
+        self.df = self.time_differences(self.df, decimals=1)
         
         if progress_callback:
             progress_callback(65, "Cálculo de diferencias temporales completado")
@@ -197,59 +154,12 @@ class CDVProcessorL5(BaseProcessor):
         if progress_callback:
             progress_callback(65, "Iniciando cálculo de estadísticas...")
             
-        # Crear copias para análisis separados
-        df_L5_lb = self.df.copy()
-        df_L5_oc = self.df.copy()
-        
-        if progress_callback:
-            progress_callback(67, "Calculando estadísticas generales...")
-            
-        # Calcular estadísticas generales
-        df_L5_aux_avg = self.df.pivot_table(
-            index=["Equipo", "Estado"],
-            values="Diff.Time_+1_row",
-            aggfunc={np.mean, np.std, np.median}
-        )
-        
-        if progress_callback:
-            progress_callback(69, "Calculando estadísticas para liberación...")
-            
-        # Estadísticas para liberación
-        df_L5_lb = df_L5_lb.loc[df_L5_lb["Estado"].str.contains("Ocupacion")]
-        df_L5_aux_lb = df_L5_lb.pivot_table(
-            index=["Equipo", "Estado"],
-            values="Diff.Time_-1_row",
-            aggfunc={np.mean, np.std, np.median}
-        )
-        df_L5_aux_lb.rename(
-            columns={"mean": "mean_lib", "std": "std_lib", "median": "median_lib"},
-            inplace=True
-        )
-        
-        if progress_callback:
-            progress_callback(71, "Calculando estadísticas para ocupación...")
-            
-        # Estadísticas para ocupación
-        df_L5_oc = df_L5_oc.loc[df_L5_oc["Estado"].str.contains("Liberacion")]
-        df_L5_aux_oc = df_L5_oc.pivot_table(
-            index=["Equipo", "Estado"],
-            values="Diff.Time_-1_row",
-            aggfunc={np.mean, np.std, np.median}
-        )
-        df_L5_aux_oc.rename(
-            columns={"mean": "mean_oc", "std": "std_oc", "median": "median_oc"},
-            inplace=True
-        )
-        
-        if progress_callback:
-            progress_callback(73, "Combinando estadísticas...")
-            
-        # Combinar estadísticas con el DataFrame principal
-        self.df = self.df.merge(df_L5_aux_lb, on="Equipo")
-        self.df = self.df.merge(df_L5_aux_oc, on="Equipo")
-        
-        # Ordenar los datos
-        self.df = self.df.sort_values(["Equipo", "Fecha Hora"])
+        # Estadísticas de liberación y ocupación por equipo en una sola pasada,
+        # ordenadas por equipo y fecha
+        self.df = self.state_statistics(self.df, {
+            "lib": self.label_mask(self.df["Estado"], "Ocupacion"),
+            "oc": self.label_mask(self.df["Estado"], "Liberacion")
+        })
         
         # Redondear valores estadísticos
         for col in ["Diff.Time_-1_row", "Diff.Time_-2_row", "Diff.Time_+1_row", 
@@ -268,24 +178,22 @@ class CDVProcessorL5(BaseProcessor):
             progress_callback(75, "Iniciando detección de anomalías...")
             
         # Detectar Fallos de Ocupación (FO)
-        self.df["FO"] = np.where(
-            (self.df["Estado"].str.contains("Ocupacion")), 
-            np.where((self.df["Diff.Time_+1_row"] < (self.f_oc_1 * self.df["median_oc"])), "PFO", "NFO"), 
-            "NA"
+        self.df["FO"] = flag_labels(
+            self.label_mask(self.df["Estado"], "Ocupacion"),
+            self.df["Diff.Time_+1_row"] < (self.f_oc_1 * self.df["median_oc"]), "PFO", "NFO"
         )
         
         if progress_callback:
             progress_callback(80, "Detectando fallos de liberación...")
             
         # Detectar Fallos de Liberación (FL)
-        self.df["FL"] = np.where(
-            (self.df["Estado"].str.contains("Liberacion")), 
-            np.where((self.df["Diff.Time_+1_row"] < (self.f_lb_2 * self.df["median_lib"])), "PFL", "NFL"), 
-            "NA"
+        self.df["FL"] = flag_labels(
+            self.label_mask(self.df["Estado"], "Liberacion"),
+            self.df["Diff.Time_+1_row"] < (self.f_lb_2 * self.df["median_lib"]), "PFL", "NFL"
         )
         
         # Agregar identificador de línea
-        self.df["Linea"] = "L5"
+        self.df["Linea"] = repeated_label("L5", len(self.df))
         
         if progress_callback:
             progress_callback(85, "Detección de anomalías completada")
@@ -300,11 +208,11 @@ class CDVProcessorL5(BaseProcessor):
         # 1. Preparar reporte de fallos de ocupación (FO)
         self.df_L5_FO = self.df.loc[self.df['FO'] == 'PFO']
         
-        # Eliminar columnas innecesarias
+        # Eliminar columnas innecesarias y devolver las etiquetas a texto
         columns_to_drop = ['Estado', 'Diff.Time_-1_row', 'Diff.Time_-2_row', 'Diff.Time_+2_row', 
                            'Tiempo Conjunto', 'mean_lib', 'median_lib', 'std_lib', 
                            'mean_oc', 'median_oc', 'std_oc', 'FL']
-        self.df_L5_FO = self.df_L5_FO.drop(columns=columns_to_drop)
+        self.df_L5_FO = decode_columns(self.df_L5_FO.drop(columns=columns_to_drop))
         
         # Crear ID único
         self.df_L5_FO['Fecha Hora'] = self.df_L5_FO['Fecha Hora'].astype(str)
@@ -321,7 +229,7 @@ class CDVProcessorL5(BaseProcessor):
         
         # Filtrar y agrupar
         self.df_L5_OCUP = self.df[self.df['Estado'] == 'Ocupacion']
-        self.df_L5_OCUP = self.df_L5_OCUP.groupby(['Equipo', 'Fecha']).size().reset_index(name='Count')
+        self.df_L5_OCUP = self.df_L5_OCUP.groupby(['Equipo', 'Fecha'], observed=True).size().reset_index(name='Count')
         
         # Crear ID único
         self.df_L5_OCUP['Fecha'] = self.df_L5_OCUP['Fecha'].astype(str)
@@ -335,11 +243,11 @@ class CDVProcessorL5(BaseProcessor):
         # 3. Preparar reporte de fallos de liberación (FL)
         self.df_L5_FL = self.df.loc[self.df['FL'] == 'PFL']
         
-        # Eliminar columnas innecesarias
+        # Eliminar columnas innecesarias y devolver las etiquetas a texto
         columns_to_drop = ['Estado', 'Diff.Time_-1_row', 'Diff.Time_-2_row', 'Diff.Time_+2_row', 
                           'Tiempo Conjunto', 'mean_lib', 'median_lib', 'std_lib', 
                           'mean_oc', 'median_oc', 'std_oc', 'FO', 'Fecha']
-        self.df_L5_FL = self.df_L5_FL.drop(columns=columns_to_drop)
+        self.df_L5_FL = decode_columns(self.df_L5_FL.drop(columns=columns_to_drop))
         
         # Crear ID único
         self.df_L5_FL['Fecha Hora'] = self.df_L5_FL['Fecha Hora'].astype(str)
@@ -0,0 +1,152 @@
+# processors/csv_dialect.py
+import os
+import re
+import codecs
+import threading
+import pandas as pd
+
+# Bytes iniciales que se examinan para detectar el dialecto de un archivo nuevo
+DIALECT_SAMPLE_SIZE = 64 * 1024
+
+# Bytes iniciales que se examinan para confirmar un dialecto ya conocido
+DIALECT_PROBE_SIZE = 4 * 1024
+
+# Separadores candidatos, en orden de preferencia ante un empate
+CANDIDATE_SEPARATORS = (';', ',', '\t', '|')
+
+# Proporción mínima de líneas con el mismo número de campos para aceptar un separador
+MIN_CONSISTENCY = 0.9
+
+class CsvDialect:
+    """Codificación, separador y fila de encabezado de un archivo CSV"""
+
+    def __init__(self, encoding, sep, header_row=0):
+        self.encoding = encoding
+        self.sep = sep
+        self.header_row = header_row
+
+    def read_options(self):
+        """Argumentos de `pd.read_csv` para leer un archivo con este dialecto"""
+        return {'sep': self.sep, 'encoding': self.encoding, 'skiprows': self.header_row}
+
+    def matches(self, sample):
+        """Comprobar que el encabezado de una muestra es coherente con este dialecto"""
+        try:
+            lines = _sample_lines(sample, self.encoding)
+        except UnicodeDecodeError:
+            return False
+        if len(lines) <= self.header_row + 1:
+            # Muestra demasiado corta para confirmar: se vuelve a detectar
+            return False
+        header = lines[self.header_row].count(self.sep)
+        return header >= 1 and lines[self.header_row + 1].count(self.sep) == header
+
+    def __repr__(self):
+        return f"CsvDialect({self.encoding!r}, {self.sep!r}, header_row={self.header_row})"
+
+def sniff_dialect(sample):
+    """Detectar el dialecto a partir de los primeros bytes de un archivo.
+
+    La codificación es UTF-8 (con o sin BOM) si la muestra se decodifica como
+    tal, y Latin-1 en caso contrario. El separador es el candidato que da el
+    mismo número de campos (mayor que uno) en la mayoría de las líneas, y la
+    fila de encabezado es la primera línea con ese número de campos.
+    """
+    if sample.startswith(codecs.BOM_UTF8):
+        encoding = 'utf-8-sig'
+    else:
+        encoding = 'utf-8'
+    try:
+        lines = _sample_lines(sample, encoding)
+    except UnicodeDecodeError:
+        encoding = 'latin-1'
+        lines = _sample_lines(sample, encoding)
+    lines = [line for line in lines if line.strip()]
+
+    best = None
+    for sep in CANDIDATE_SEPARATORS:
+        counts = [line.count(sep) for line in lines]
+        if not counts:
+            break
+        fields = max(set(counts), key=lambda count: (counts.count(count), count))
+        consistency = counts.count(fields) / len(counts)
+        if fields < 1 or consistency < MIN_CONSISTENCY:
+            continue
+        if best is None or consistency > best[0]:
+            best = (consistency, sep, counts.index(fields))
+
+    if best is None:
+        # Sin separador reconocible: se mantiene el primer intento de antes
+        return CsvDialect(encoding, ';')
+    return CsvDialect(encoding, best[1], header_row=best[2])
+
+def _sample_lines(sample, encoding):
+    # La muestra puede terminar a mitad de un carácter o de una línea
+    text = codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+    lines = text.splitlines()
+    if lines and not text.endswith(('\n', '\r')):
+        lines = lines[:-1]
+    return lines
+
+def file_family(file_path):
+    """Familia de un archivo: su carpeta y su nombre sin dígitos (fechas, números de parte)"""
+    folder, name = os.path.split(file_path)
+    return folder, re.sub(r'\d+', '#', name.lower())
+
+class DialectCache:
+    """Dialectos detectados, por carpeta y familia de nombres de archivo.
+
+    Los archivos de una misma familia (p. ej. `sacem_20260922.csv`,
+    `sacem_20260923.csv`) comparten dialecto: solo el primero se examina por
+    completo y en los demás basta confirmar el encabezado. Puede usarse desde
+    varios hilos a la vez.
+    """
+
+    def __init__(self):
+        self.dialects = {}
+        self._lock = threading.Lock()
+
+    def detect(self, file_path):
+        """Obtener el dialecto de un archivo, reutilizando el de su familia si es válido"""
+        family = file_family(file_path)
+        with self._lock:
+            dialect = self.dialects.get(family)
+
+        with open(file_path, 'rb') as f:
+            sample = f.read(DIALECT_PROBE_SIZE if dialect is not None else DIALECT_SAMPLE_SIZE)
+            if dialect is not None and dialect.matches(sample):
+                return dialect
+            if dialect is not None:
+                sample += f.read(DIALECT_SAMPLE_SIZE - len(sample))
+
+        dialect = sniff_dialect(sample)
+        self.remember(file_path, dialect)
+        return dialect
+
+    def remember(self, file_path, dialect):
+        with self._lock:
+            self.dialects[file_family(file_path)] = dialect
+
+# Caché del proceso (cada proceso de trabajo de la ingesta mantiene la suya)
+dialect_cache = DialectCache()
+
+def read_csv_once(file_path, cache=None, **kwargs):
+    """Leer un CSV en una sola pasada con el dialecto detectado.
+
+    Los argumentos adicionales (p. ej. `usecols`) se pasan a `pd.read_csv`.
+    Si un byte no UTF-8 aparece después de la muestra examinada, el archivo
+    se vuelve a leer en Latin-1 y la familia queda registrada con esa
+    codificación.
+    """
+    cache = cache if cache is not None else dialect_cache
+    dialect = cache.detect(file_path)
+    try:
+        return pd.read_csv(file_path, **dialect.read_options(), **kwargs)
+    except UnicodeDecodeError:
+        dialect = CsvDialect('latin-1', dialect.sep, dialect.header_row)
+        cache.remember(file_path, dialect)
+        return pd.read_csv(file_path, **dialect.read_options(), **kwargs)
+
+def read_csv_header(file_path, cache=None):
+    """Leer solo los nombres de columna de un CSV"""
+    return list(read_csv_once(file_path, cache, nrows=0).columns)
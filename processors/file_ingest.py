@@ -0,0 +1,395 @@
+# processors/file_ingest.py
+import os
+import io
+import time
+import contextlib
+import concurrent.futures
+import pandas as pd
+from processors.ingest_manifest import IngestManifest
+from processors.read_ahead import ReadAheadStager
+from processors.source_discovery import infer_date
+from processors.source_formats import split_byte_ranges, is_compressed
+
+def compact_frame(df):
+    """Convertir las columnas de texto en categóricas para transferir menos datos entre procesos"""
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].astype('category')
+    return df
+
+def restore_frame(df):
+    """Deshacer `compact_frame` devolviendo las columnas categóricas a texto"""
+    for column in df.columns[df.dtypes == 'category']:
+        df[column] = df[column].astype(object)
+    return df
+
+def _parse_file_chunk(parse_file, paths):
+    """Leer un grupo de archivos en un proceso de trabajo.
+
+    Devuelve, por archivo, el DataFrame compactado o el texto del error, ya que
+    las excepciones y los DataFrames de objetos son costosos de enviar al proceso
+    principal.
+    """
+    results = []
+    for path in paths:
+        try:
+            results.append((compact_frame(parse_file(path).copy()), None))
+        except Exception as e:
+            results.append((None, str(e)))
+    return results
+
+class FileIngest:
+    """Una ingesta de archivos fuente de un procesador (`BaseProcessor.ingest_files`).
+
+    Guarda el estado que comparten sus etapas: la resolución de los archivos
+    (ventana de análisis, manifiesto y caché de lecturas), la división de los
+    archivos grandes en tramos y la lectura de los archivos pendientes con el
+    ejecutor que corresponda.
+    """
+
+    def __init__(self, processor, files, parse_file, variant, progress_callback=None,
+                 progress_start=5, progress_end=20, max_workers=1, shared=False, mode=None,
+                 split_header=None):
+        self.processor = processor
+        self.files = files
+        self.parse_file = parse_file
+        self.progress_callback = progress_callback
+        self.progress_start = progress_start
+        self.progress_end = progress_end
+        self.split_header = split_header
+
+        self.manifest = processor.open_manifest(variant)
+        self.cache = processor.open_parsed_cache() if self.manifest is not None else None
+        if self.cache is None:
+            self.manifest = None
+
+        self.mode = mode or processor.ingest_mode
+        self.scan = processor.shared_scan if shared else None
+        self.consumer = processor.analysis_type
+        if max_workers > 1 and processor.ingest_workers:
+            max_workers = processor.ingest_workers
+        self.max_workers = max_workers
+
+        # Lectura anticipada: en memoria si el lector acepta buffers, si no en copias locales
+        self.staging = processor.staging_mode(buffered=shared, mode=self.mode) if self.scan is None else None
+        self.deferred = set()  # rutas cuyo hash se calcula al leerlas (copia preparada o lectura compartida)
+        self.stager = None
+        self.contents = {}  # clave -> contenido ya obtenido de la lectura compartida
+
+        self.results = [None] * len(files)
+        self.pending = {}  # hash (o ruta sin manifiesto) -> [(índice, ruta, tamaño, mtime)]
+        self.split = {}  # clave -> (hash, tramos) de los archivos grandes
+        self.total_pending = 0
+
+    def run(self):
+        """Ejecutar la ingesta y devolver los DataFrames no vacíos en el orden de `files`"""
+        try:
+            self.resolve_files()
+            if self.scan is not None:
+                # La lectura compartida solo retiene para este consumidor lo que va a leer
+                self.scan.register(self.consumer, [copies[0][1] for copies in self.pending.values()])
+            keys = self.split_large_files(list(self.pending))
+            self.parse_pending(keys)
+        finally:
+            if self.scan is not None:
+                self.scan.release(self.consumer)
+
+        # Persistir el manifiesto para la próxima ejecución
+        if self.manifest is not None:
+            try:
+                self.manifest.save()
+            except OSError as e:
+                self.notify(None, f"No se pudo guardar el manifiesto de ingesta: {e}")
+
+        return [df for df in self.results if df is not None and not df.empty]
+
+    def notify(self, progress, message):
+        if self.progress_callback:
+            self.progress_callback(progress, message)
+
+    def cache_key(self, file_hash):
+        return self.cache.entry_key(self.manifest.key, file_hash, self.processor.PARSER_VERSION)
+
+    def read_content(self, path):
+        return self.scan.read_bytes(path, self.consumer)
+
+    def resolve_files(self):
+        """Descartar los archivos fuera de la ventana y resolver los que ya están en el manifiesto.
+
+        Los archivos sin cambios (mismo tamaño y mtime) y las copias idénticas
+        con otro nombre (mismo hash) se cargan desde la caché de lecturas; los
+        demás quedan en `pending`, una vez por contenido.
+        """
+        processor, manifest = self.processor, self.manifest
+        total_files = len(self.files)
+        reused = 0
+
+        # Ventana de análisis: fechas inferidas de los nombres en la búsqueda
+        window_start = processor.window_start()
+        name_dates = {source.path: source.date for source in processor.source_files}
+        pruned = 0
+
+        for index, path in enumerate(self.files):
+            signature = None
+            if window_start is not None:
+                try:
+                    signature = size, mtime = IngestManifest.file_signature(path)
+                    name_date = name_dates.get(path, infer_date(os.path.basename(path)))
+                    last_date = processor.source_last_date(path, size, mtime, manifest, name_date)
+                    if last_date < window_start:
+                        if manifest is not None:
+                            manifest.record(path, size, mtime, None, 0, last_date=last_date)
+                        pruned += 1
+                        continue
+                except OSError as e:
+                    self.notify(None, f"No se pudo leer el archivo {path} debido a un error: {e}")
+                    continue
+            if manifest is None:
+                self.pending.setdefault(path, []).append((index, path, None, None))
+                continue
+            try:
+                size, mtime = signature or manifest.file_signature(path)
+                file_hash = manifest.lookup(path, size, mtime)
+                if file_hash is None and (self.staging is not None or self.scan is not None):
+                    # Se identificará por contenido con la misma lectura que se interpreta
+                    self.pending[path] = [(index, path, size, mtime)]
+                    self.deferred.add(path)
+                    continue
+                if file_hash is None:
+                    # Archivo nuevo o modificado: identificarlo por contenido
+                    file_hash = manifest.content_hash(path)
+                if file_hash not in self.pending:
+                    cached = self.cache.get(self.cache_key(file_hash))
+                    if cached is not None:
+                        self.results[index] = cached
+                        manifest.record(path, size, mtime, file_hash, len(cached))
+                        reused += 1
+                        continue
+                self.pending.setdefault(file_hash, []).append((index, path, size, mtime))
+            except Exception as e:
+                self.notify(None, f"No se pudo leer el archivo {path} debido a un error: {e}")
+
+        if pruned:
+            self.notify(self.progress_start, f"{pruned} de {total_files} archivos omitidos por estar fuera de la ventana de {processor.window_days} días")
+        if reused:
+            self.notify(self.progress_start, f"{reused} de {total_files} archivos sin cambios reutilizados desde la caché de lecturas")
+
+    def split_large_files(self, keys):
+        """Dividir en tramos los archivos grandes y devolver las claves que se leen completas.
+
+        Los archivos grandes se leen por tramos con todos los trabajadores, para
+        que un solo archivo enorme no determine la duración de la lectura.
+        """
+        processor = self.processor
+        self.total_pending = len(keys)
+        split_workers = processor.split_workers or os.cpu_count() or 1
+        if self.split_header is None or split_workers <= 1 or self.staging is not None:
+            return keys
+
+        min_size = processor.split_min_mb * 1024 * 1024
+        done = set()
+        for key in keys:
+            path = self.pending[key][0][1]
+            try:
+                size = os.path.getsize(path)
+                if size < min_size or is_compressed(path):
+                    continue
+                source = self.read_content(path) if self.scan is not None else path
+                size = len(source) if self.scan is not None else size
+                ranges = split_byte_ranges(source, size, self.split_header, int(processor.split_chunk_mb * 1024 * 1024))
+            except OSError:
+                # El error se informará al leerlo completo
+                continue
+            if len(ranges) > 1:
+                file_hash = self.manifest.bytes_hash(source) if key in self.deferred else key
+                cached = self.cache.get(self.cache_key(file_hash)) if key in self.deferred else None
+                if cached is not None:
+                    # Mismo contenido que una lectura ya guardada
+                    self.store_result(key, file_hash, cached, None)
+                    done.add(key)
+                else:
+                    self.split[key] = (file_hash, ranges)
+            elif self.scan is not None:
+                # Se interpreta completo con el contenido ya leído
+                self.contents[key] = source
+        self.total_pending = len(keys) - len(done)
+        return [key for key in keys if key not in self.split and key not in done]
+
+    def prepare(self, key):
+        """Obtener la fuente a interpretar y su hash; si ya está en caché, también la lectura"""
+        path = self.pending[key][0][1]
+        if self.scan is not None:
+            content = self.contents.pop(key, None)
+            source = io.BytesIO(content if content is not None else self.read_content(path))
+        elif self.stager is not None:
+            source = self.stager.get(path)
+        else:
+            return key, path, None
+        if key not in self.deferred:
+            return key, source, None
+        try:
+            if self.scan is not None or self.staging == 'memory':
+                with source.getbuffer() as view:
+                    file_hash = self.manifest.bytes_hash(view)
+            else:
+                file_hash = self.manifest.content_hash(source)
+            return file_hash, source, self.cache.get(self.cache_key(file_hash))
+        except Exception:
+            if self.stager is not None:
+                self.stager.release(path)
+            raise
+
+    def process_pending(self, key):
+        path = self.pending[key][0][1]
+        try:
+            file_hash, source, cached = self.prepare(key)
+            try:
+                return key, file_hash, cached if cached is not None else self.parse_file(source), None
+            finally:
+                if self.stager is not None:
+                    self.stager.release(path)
+        except Exception as e:
+            return key, key, None, e
+
+    def store_result(self, key, file_hash, df, error):
+        copies = self.pending[key]
+        if error is not None:
+            self.notify(None, f"No se pudo leer el archivo {copies[0][1]} debido a un error: {error}")
+            return
+        if self.manifest is not None:
+            try:
+                if key not in self.deferred or not self.cache.has(self.cache_key(file_hash)):
+                    self.cache.put(self.cache_key(file_hash), df)
+                for _, path, size, mtime in copies:
+                    self.manifest.record(path, size, mtime, file_hash, len(df))
+            except Exception as e:
+                self.notify(None, f"No se pudo guardar en caché la lectura de {copies[0][1]}: {e}")
+        for index, _, _, _ in copies:
+            self.results[index] = df
+
+    def report(self, done, key):
+        if self.progress_callback and (self.max_workers == 1 or done % 5 == 0):
+            progress = self.progress_start + (done / max(self.total_pending, 1)) * (self.progress_end - self.progress_start)
+            path = self.pending[key][0][1]
+            self.progress_callback(progress, f"Procesando archivo {done} de {self.total_pending}: {os.path.basename(path)}")
+
+    def parse_pending(self, keys):
+        """Leer los archivos divididos y luego los pendientes completos (una vez por contenido)"""
+        processor = self.processor
+        if self.staging is not None and keys:
+            paths = [self.pending[key][0][1] for key in keys]
+            sizes = {path: size for key in keys for _, path, size, _ in self.pending[key]}
+            self.stager = ReadAheadStager(
+                paths, mode=self.staging, max_workers=processor.prefetch_workers,
+                max_bytes=int(processor.prefetch_max_mb * 1024 * 1024), sizes=sizes,
+                simulated_latency=processor.prefetch_latency
+            )
+
+        parse_started = time.perf_counter()
+        done = self.parse_split_files() if self.split else 0
+        with self.stager or contextlib.nullcontext():
+            use_processes = (self.max_workers > 1 and self.total_pending > 1
+                             and self.mode == 'process' and self.scan is None)
+            if use_processes:
+                self.parse_in_processes(keys, done)
+            elif self.max_workers > 1 and len(keys) > 1:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    futures = [executor.submit(self.process_pending, key) for key in keys]
+                    for done, future in enumerate(concurrent.futures.as_completed(futures), start=done + 1):
+                        result = future.result()
+                        self.store_result(*result)
+                        self.report(done, result[0])
+            else:
+                for done, key in enumerate(keys, start=done + 1):
+                    self.report(done, key)
+                    self.store_result(*self.process_pending(key))
+
+        if self.stager is not None:
+            self.notify(self.progress_end, self.stager.summary(time.perf_counter() - parse_started))
+
+    def parse_split_files(self):
+        """Leer los tramos de los archivos divididos y unirlos en el orden del archivo"""
+        split_workers = self.processor.split_workers or os.cpu_count() or 1
+        in_processes = self.mode == 'process' and self.scan is None
+        if in_processes:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=split_workers)
+        else:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=split_workers)
+        done = 0
+        with executor:
+            futures = {
+                key: [executor.submit(_parse_file_chunk, self.parse_file, [part]) if in_processes
+                      else executor.submit(self.parse_file, part) for part in ranges]
+                for key, (_, ranges) in self.split.items()
+            }
+            for key, parts in futures.items():
+                frames, error = [], None
+                for future in parts:
+                    try:
+                        if in_processes:
+                            df, part_error = future.result()[0]
+                            df = restore_frame(df) if df is not None else None
+                        else:
+                            df, part_error = future.result(), None
+                    except Exception as e:
+                        df, part_error = None, e
+                    if part_error is not None:
+                        error = error or part_error
+                    else:
+                        frames.append(df)
+                done += 1
+                file_hash = self.split[key][0]
+                self.store_result(key, file_hash, pd.concat(frames) if error is None else None, error)
+                self.report(done, key)
+        return done
+
+    def parse_in_processes(self, keys, done):
+        """Leer los archivos pendientes en procesos, por grupos de `ingest_chunksize`.
+
+        Los procesos evitan el GIL en la lectura con engine='python' y
+        str.contains. Se mantiene una ventana acotada de grupos en curso (y de
+        copias preparadas).
+        """
+        chunksize = max(1, int(self.processor.ingest_chunksize))
+        chunks = [keys[i:i + chunksize] for i in range(0, len(keys), chunksize)]
+        in_flight = {}
+
+        def collect(futures):
+            nonlocal done
+            for future in futures:
+                items = in_flight.pop(future)
+                try:
+                    chunk_results = future.result()
+                except Exception as e:
+                    chunk_results = [(None, str(e))] * len(items)
+                for (key, file_hash, _), (df, error) in zip(items, chunk_results):
+                    if self.stager is not None:
+                        self.stager.release(self.pending[key][0][1])
+                    done += 1
+                    self.store_result(key, file_hash, restore_frame(df) if df is not None else None, error)
+                    self.report(done, key)
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            for chunk in chunks:
+                items = []
+                for key in chunk:
+                    try:
+                        file_hash, source, cached = self.prepare(key)
+                    except Exception as e:
+                        done += 1
+                        self.store_result(key, key, None, e)
+                        continue
+                    if cached is not None:
+                        self.stager.release(self.pending[key][0][1])
+                        done += 1
+                        self.store_result(key, file_hash, cached, None)
+                        continue
+                    items.append((key, file_hash, source))
+                if items:
+                    future = executor.submit(_parse_file_chunk, self.parse_file, [source for _, _, source in items])
+                    in_flight[future] = items
+                if len(in_flight) >= 2 * self.max_workers:
+                    finished, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                    collect(finished)
+            while in_flight:
+                finished, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                collect(finished)
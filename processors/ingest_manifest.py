@@ -0,0 +1,119 @@
+# processors/ingest_manifest.py
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime, date
+
+class IngestManifest:
+    """Manifiesto persistente de los archivos fuente ya leídos por un procesador.
+
+    Se guarda dentro de la carpeta de salida (subcarpeta ``.ingest``) y registra,
+    por cada archivo fuente, su tamaño, fecha de modificación, hash de contenido,
+    línea/tipo de análisis y cantidad de filas obtenidas. Las filas filtradas de
+    cada archivo se guardan en la caché de lecturas (``ParsedCache``) indexadas
+    por hash, de modo que un archivo sin cambios (o una copia idéntica con otro
+    nombre) no se vuelve a leer.
+    """
+
+    MANIFEST_DIR = '.ingest'
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, output_folder_path, key, line=None, analysis_type=None):
+        self.key = key
+        self.line = line
+        self.analysis_type = analysis_type
+        self.folder = os.path.join(output_folder_path, self.MANIFEST_DIR)
+        self.manifest_path = os.path.join(self.folder, f'manifest_{key}.json')
+        self.entries = {}
+        self.seen_paths = set()
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Cargar el manifiesto desde disco (vacío si no existe o está dañado)"""
+        self.entries = {}
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f).get('files', {})
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def save(self):
+        """Guardar el manifiesto con los archivos vistos en esta ejecución"""
+        with self._lock:
+            # Conservar solo los archivos vistos en esta ejecución
+            if self.seen_paths:
+                self.entries = {path: entry for path, entry in self.entries.items() if path in self.seen_paths}
+
+            os.makedirs(self.folder, exist_ok=True)
+            content = {
+                'key': self.key,
+                'updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'files': self.entries
+            }
+
+            # Escritura atómica para no dejar un manifiesto a medias
+            tmp_path = self.manifest_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(content, f, indent=1)
+            os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def file_signature(path):
+        """Obtener (tamaño, mtime en ns) de un archivo"""
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+    @classmethod
+    def content_hash(cls, path):
+        """Calcular el hash del contenido de un archivo leyendo por bloques"""
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(cls.HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def bytes_hash(data):
+        """Calcular el hash de un contenido ya leído (igual a `content_hash`)"""
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def lookup(self, path, size, mtime):
+        """Devolver el hash registrado si el archivo no cambió desde la última lectura"""
+        with self._lock:
+            self.seen_paths.add(path)
+            entry = self.entries.get(path)
+        if entry and entry['size'] == size and entry['mtime'] == mtime:
+            return entry['hash']
+        return None
+
+    def record(self, path, size, mtime, file_hash, rows, last_date=None):
+        """Registrar un archivo leído en el manifiesto.
+
+        Los archivos descartados por la ventana de fechas se registran sin hash
+        y con la fecha de sus últimos datos (`last_date`), para no volver a
+        examinarlos mientras no cambien.
+        """
+        with self._lock:
+            self.seen_paths.add(path)
+            self.entries[path] = {
+                'size': size,
+                'mtime': mtime,
+                'hash': file_hash,
+                'line': self.line,
+                'type': self.analysis_type,
+                'rows': int(rows)
+            }
+            if last_date is not None:
+                self.entries[path]['last_date'] = last_date.isoformat()
+
+    def last_date(self, path, size, mtime):
+        """Devolver la fecha de los últimos datos registrada si el archivo no cambió"""
+        with self._lock:
+            entry = self.entries.get(path)
+        if entry and entry.get('last_date') and entry['size'] == size and entry['mtime'] == mtime:
+            return date.fromisoformat(entry['last_date'])
+        return None
+
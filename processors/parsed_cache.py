@@ -0,0 +1,210 @@
+# processors/parsed_cache.py
+import os
+import json
+import threading
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow es opcional: sin él se usa pickle
+    pa = None
+    pq = None
+
+class ParsedCache:
+    """Caché en disco del resultado filtrado de cada archivo fuente.
+
+    Cada entrada se identifica por el hash del archivo fuente, la variante de
+    lectura y la versión del lector del procesador, y se guarda en formato
+    columnar (Parquet, si pyarrow está disponible) para cargarla sin volver a
+    interpretar texto. El tamaño total de la caché está acotado: al superarlo
+    se eliminan las entradas usadas hace más tiempo (LRU). El tamaño ocupado se
+    lleva en memoria y la carpeta solo se recorre al abrirla y al superar el
+    límite.
+    """
+
+    CACHE_DIR = 'cache'
+    DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+    # Parte del límite total de las cachés en disco (`parsed_cache_max_mb`)
+    # que corresponde a esta caché
+    BUDGET_SHARE = 0.5
+    # Al superar el límite se eliminan entradas hasta esta fracción de él, para
+    # no volver a recorrer la carpeta en cada escritura
+    EVICT_TARGET = 0.9
+    COLUMNS_METADATA_KEY = b'analizador_columns'
+
+    def __init__(self, base_folder, max_bytes=None):
+        self.folder = os.path.join(base_folder, self.CACHE_DIR)
+        self.max_bytes = max_bytes if max_bytes is not None else self.DEFAULT_MAX_BYTES
+        self._lock = threading.Lock()
+        # Ruta -> tamaño de las entradas y su total (se cargan en la primera escritura)
+        self._sizes = None
+        self._total_bytes = 0
+        os.makedirs(self.folder, exist_ok=True)
+
+    @staticmethod
+    def entry_key(namespace, file_hash, version):
+        """Construir la clave de una entrada"""
+        return f"{namespace}_v{version}_{file_hash}"
+
+    def _paths(self, key):
+        base = os.path.join(self.folder, key)
+        return base + '.parquet', base + '.pkl'
+
+    def _existing_path(self, key):
+        for path in self._paths(key):
+            if os.path.exists(path):
+                return path
+        return None
+
+    def has(self, key):
+        """Indicar si hay una entrada para la clave"""
+        return self._existing_path(key) is not None
+
+    def get(self, key):
+        """Cargar una entrada (None si no existe o no se puede leer)"""
+        path = self._existing_path(key)
+        if path is None:
+            return None
+        try:
+            if path.endswith('.parquet'):
+                df = self._read_parquet(path)
+            else:
+                df = pd.read_pickle(path)
+        except Exception:
+            # Entrada dañada: se descarta y se vuelve a leer el archivo fuente
+            self._remove(path)
+            return None
+
+        # Marcar la entrada como usada recientemente
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return df
+
+    def put(self, key, df):
+        """Guardar una entrada y aplicar el límite de tamaño"""
+        parquet_path, pickle_path = self._paths(key)
+        stored_path = None
+        if pq is not None:
+            try:
+                self._write_parquet(df, parquet_path)
+                stored_path = parquet_path
+            except Exception:
+                # Tipos no representables en Parquet (p. ej. columnas mixtas)
+                stored_path = None
+        if stored_path is None:
+            tmp_path = self._tmp_path(pickle_path)
+            df.to_pickle(tmp_path)
+            os.replace(tmp_path, pickle_path)
+            stored_path = pickle_path
+
+        # Eliminar la versión en el otro formato, si existía
+        for path in (parquet_path, pickle_path):
+            if path != stored_path:
+                self._remove(path)
+
+        self._track((parquet_path, pickle_path))
+        if self._total_bytes > self.max_bytes:
+            self.evict(keep=stored_path)
+
+    def evict(self, keep=None):
+        """Eliminar las entradas menos usadas hasta respetar el tamaño máximo.
+
+        Se recorre la carpeta (con las escrituras de otros procesos y las
+        fechas de uso actuales) y, si se supera el límite, se eliminan entradas
+        hasta quedar en `EVICT_TARGET` del máximo.
+        """
+        with self._lock:
+            entries = self._scan()
+            if self._total_bytes <= self.max_bytes:
+                return
+
+            target = self.max_bytes * self.EVICT_TARGET
+            for _, size, path in sorted(entries):
+                if self._total_bytes <= target:
+                    break
+                if path == keep:
+                    continue
+                if self._remove(path):
+                    self._total_bytes -= self._sizes.pop(path, 0)
+
+    def _scan(self):
+        """Recorrer la carpeta y recalcular los tamaños; devuelve (mtime, tamaño, ruta) por entrada"""
+        entries = []
+        for entry in os.scandir(self.folder):
+            if not entry.is_file() or entry.name.endswith('.tmp'):
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        self._sizes = {path: size for _, size, path in entries}
+        self._total_bytes = sum(self._sizes.values())
+        return entries
+
+    def _track(self, paths):
+        """Actualizar en memoria el tamaño de las entradas escritas o eliminadas en `paths`"""
+        # Las entradas eliminadas fuera de `evict` quedan contadas hasta el
+        # próximo recorrido (el total solo puede sobrestimarse)
+        with self._lock:
+            if self._sizes is None:
+                self._scan()
+                return
+            for path in paths:
+                self._total_bytes -= self._sizes.pop(path, 0)
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    continue
+                self._sizes[path] = size
+                self._total_bytes += size
+
+    def __getstate__(self):
+        # Permite enviar la caché a procesos de trabajo (sin el lock)
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_sizes'], state['_total_bytes'] = None, 0
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _tmp_path(path):
+        # Nombre temporal único por proceso e hilo: varios escritores pueden
+        # guardar la misma entrada a la vez
+        return f"{path}.{os.getpid()}_{threading.get_ident()}.tmp"
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    @classmethod
+    def _write_parquet(cls, df, path):
+        # Parquet exige nombres de columna de texto: se guardan los originales
+        # (p. ej. enteros de archivos sin encabezado) en los metadatos
+        columns = [column.item() if hasattr(column, 'item') else column for column in df.columns]
+        renamed = df.copy(deep=False)
+        renamed.columns = [str(column) for column in columns]
+        table = pa.Table.from_pandas(renamed, preserve_index=True)
+        metadata = dict(table.schema.metadata or {})
+        metadata[cls.COLUMNS_METADATA_KEY] = json.dumps(columns).encode('utf-8')
+        table = table.replace_schema_metadata(metadata)
+
+        tmp_path = cls._tmp_path(path)
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def _read_parquet(cls, path):
+        table = pq.read_table(path)
+        df = table.to_pandas()
+        metadata = table.schema.metadata or {}
+        if cls.COLUMNS_METADATA_KEY in metadata:
+            df.columns = json.loads(metadata[cls.COLUMNS_METADATA_KEY].decode('utf-8'))
+        return df
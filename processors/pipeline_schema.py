@@ -0,0 +1,78 @@
+# processors/pipeline_schema.py
+import numpy as np
+import pandas as pd
+
+# Columnas de texto con pocas etiquetas distintas: viajan como categóricas (un
+# código entero por fila y cada etiqueta guardada una vez) desde el
+# preprocesamiento hasta save_dataframe, y solo los reportes las devuelven a texto
+CATEGORICAL_COLUMNS = ('Equipo', 'Estacion', 'Subsistema', 'Estado', 'FO', 'FL', 'Linea')
+
+def is_categorical(values):
+    return isinstance(getattr(values, 'dtype', None), pd.CategoricalDtype)
+
+def categorical(values):
+    """Serie categórica con las categorías en orden lexicográfico.
+
+    Con las categorías ordenadas, ordenar o comparar por códigos equivale a
+    hacerlo por las etiquetas de texto (los nulos tienen código -1).
+    """
+    values = values if isinstance(values, pd.Series) else pd.Series(values)
+    if is_categorical(values):
+        if not values.cat.categories.is_monotonic_increasing:
+            values = values.cat.reorder_categories(values.cat.categories.sort_values())
+        return values
+    return values.astype('category')
+
+def label_codes(values):
+    """Códigos por fila (intp, -1: nulo) y etiquetas distintas, como `pd.factorize`, sin recorrer el texto si la columna ya es categórica"""
+    if is_categorical(values):
+        return values.cat.codes.to_numpy().astype(np.intp), values.cat.categories
+    return pd.factorize(values)
+
+def coded_labels(codes, labels):
+    """Categórica desde códigos por fila (posición en `labels`; -1 es nulo).
+
+    Las etiquetas repetidas se unen y las categorías quedan en orden lexicográfico.
+    """
+    positions, categories = pd.factorize(pd.Series(labels, dtype=object), sort=True)
+    codes = np.append(positions, -1)[np.asarray(codes)]
+    return pd.Categorical.from_codes(codes, categories)
+
+def map_labels(values, function):
+    """Aplicar `function` (de una Serie de etiquetas a otra) una vez por etiqueta distinta.
+
+    Equivale a aplicar la operación de texto a toda la columna (los nulos
+    quedan nulos). Si `function` devuelve un DataFrame se obtiene un DataFrame
+    con una columna categórica por cada una de sus columnas.
+    """
+    values = categorical(values).cat.remove_unused_categories()
+    codes = values.cat.codes.to_numpy()
+    labels = function(pd.Series(values.cat.categories, dtype=object))
+    if isinstance(labels, pd.DataFrame):
+        return pd.DataFrame({column: coded_labels(codes, labels[column]) for column in labels.columns},
+                            index=values.index)
+    return pd.Series(coded_labels(codes, labels), index=values.index)
+
+def flag_labels(applies, flagged, positive, negative, missing="NA"):
+    """Marca categórica de anomalía: `positive`/`negative` según `flagged` donde `applies`, `missing` en el resto"""
+    codes = np.where(np.asarray(applies, dtype=bool), np.where(np.asarray(flagged, dtype=bool), 0, 1), 2)
+    return coded_labels(codes, [positive, negative, missing])
+
+def repeated_label(label, size):
+    """Columna categórica con una misma etiqueta (p. ej. la línea) en todas las filas"""
+    return pd.Categorical.from_codes(np.zeros(size, dtype=np.int8), [label])
+
+def encode_columns(df, columns=CATEGORICAL_COLUMNS):
+    """Convertir a categóricas las columnas del esquema presentes en `df`"""
+    for column in columns:
+        if column in df.columns and not is_categorical(df[column]):
+            df[column] = categorical(df[column])
+    return df
+
+def decode_columns(df, columns=CATEGORICAL_COLUMNS):
+    """Copia de `df` con las columnas categóricas del esquema devueltas a texto (para los reportes)"""
+    df = df.copy()
+    for column in columns:
+        if column in df.columns and is_categorical(df[column]):
+            df[column] = df[column].astype(object)
+    return df
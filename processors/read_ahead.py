@@ -0,0 +1,209 @@
+# processors/read_ahead.py
+import io
+import os
+import time
+import shutil
+import tempfile
+import threading
+import collections
+
+# Tamaño de bloque de las lecturas anticipadas
+STAGE_CHUNK_SIZE = 1024 * 1024
+
+# Sistemas de archivos de red (Linux, /proc/mounts)
+NETWORK_FILESYSTEMS = ('cifs', 'smb3', 'smbfs', 'nfs', 'nfs4', 'fuse.sshfs', '9p')
+
+def is_network_path(path):
+    """Indicar si una ruta está en un recurso de red (ruta UNC, unidad de red o montaje remoto)"""
+    path = os.path.abspath(path)
+    if path.startswith(('\\\\', '//')):
+        return True
+    if os.name == 'nt':
+        try:
+            import ctypes
+            drive = os.path.splitdrive(path)[0] + '\\'
+            return ctypes.windll.kernel32.GetDriveTypeW(drive) == 4  # DRIVE_REMOTE
+        except Exception:
+            return False
+    try:
+        with open('/proc/mounts', 'r') as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) > 2]
+    except OSError:
+        return False
+    # El punto de montaje más largo que contiene la ruta
+    best = ('', '')
+    for mount_point, fs_type in mounts:
+        prefix = mount_point.rstrip('/') + '/'
+        if (path + '/').startswith(prefix) and len(mount_point) > len(best[0]):
+            best = (mount_point, fs_type)
+    return best[1] in NETWORK_FILESYSTEMS
+
+class ReadAheadStager:
+    """Lectura anticipada de archivos fuente hacia memoria o almacenamiento local.
+
+    Mientras se interpretan unos archivos, un grupo de hilos lee por adelantado
+    los siguientes (en el orden indicado) desde su ubicación original, que
+    puede ser un recurso de red lento. En modo 'memory' el contenido queda en
+    memoria y `get` entrega un buffer; en modo 'local' se copia a una carpeta
+    temporal local y `get` entrega la ruta de la copia (útil para lectores que
+    necesitan una ruta o para procesos de trabajo). Las lecturas simultáneas
+    están limitadas a `max_workers` y el contenido preparado y aún no liberado
+    a `max_bytes`. `simulated_latency` agrega una espera por bloque leído para
+    probar el comportamiento contra una carpeta local.
+
+    Se usa como administrador de contexto; cada archivo obtenido con `get`
+    debe liberarse con `release` una vez interpretado.
+    """
+
+    def __init__(self, paths, mode='memory', max_workers=4, max_bytes=256 * 1024 * 1024,
+                 sizes=None, simulated_latency=0.0):
+        self.mode = mode
+        self.max_workers = max(1, max_workers)
+        self.max_bytes = max_bytes
+        self.sizes = dict(sizes or {})
+        self.simulated_latency = simulated_latency
+        self.queue = collections.deque(dict.fromkeys(paths))
+        self.ready = {}     # ruta -> contenido, ruta local o excepción
+        self.reserved = {}  # ruta -> bytes reservados del presupuesto
+        self.staged_bytes = 0
+        self.staging_dir = None
+
+        # Estadísticas: E/S (tiempo de lectura acumulado) y espera de quien interpreta
+        self.files_read = 0
+        self.io_bytes = 0
+        self.io_seconds = 0.0
+        self.wait_seconds = 0.0
+
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = []
+        self._counter = 0
+
+    def __enter__(self):
+        if self.mode == 'local':
+            self.staging_dir = tempfile.mkdtemp(prefix='analizador_stage_')
+        for _ in range(min(self.max_workers, len(self.queue))):
+            thread = threading.Thread(target=self._worker, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def __exit__(self, *exc):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self.ready.clear()
+        if self.staging_dir:
+            shutil.rmtree(self.staging_dir, ignore_errors=True)
+        return False
+
+    def get(self, path):
+        """Obtener un archivo preparado: buffer en memoria (modo 'memory') o ruta local (modo 'local').
+
+        Si la lectura anticipada aún no lo alcanzó, se lee en el hilo que lo pide.
+        """
+        start = time.perf_counter()
+        with self._cond:
+            own = path not in self.reserved
+            if own:
+                if path in self.queue:
+                    self.queue.remove(path)
+                self._reserve(path)
+        if own:
+            self._stage(path)
+
+        with self._cond:
+            while path not in self.ready:
+                self._cond.wait()
+            staged = self.ready[path]
+            self.wait_seconds += time.perf_counter() - start
+
+        if isinstance(staged, Exception):
+            self.release(path)
+            raise staged
+        if self.mode == 'memory':
+            return io.BytesIO(staged)
+        return staged
+
+    def release(self, path):
+        """Liberar un archivo ya interpretado para dejar lugar a los siguientes"""
+        with self._cond:
+            staged = self.ready.pop(path, None)
+            self.staged_bytes -= self.reserved.pop(path, 0)
+            self._cond.notify_all()
+        if self.mode == 'local' and isinstance(staged, str):
+            try:
+                os.remove(staged)
+            except OSError:
+                pass
+
+    def summary(self, parse_seconds=None):
+        """Texto con el rendimiento de E/S y, si se indica, el de interpretación"""
+        mb = self.io_bytes / (1024 * 1024)
+        text = (f"E/S: {self.files_read} archivos, {mb:.1f} MB en {self.io_seconds:.1f} s de lectura "
+                f"({mb / max(self.io_seconds, 1e-6):.1f} MB/s); espera por E/S {self.wait_seconds:.1f} s")
+        if parse_seconds:
+            text += f"; interpretación: {mb / max(parse_seconds - self.wait_seconds, 1e-6):.1f} MB/s"
+        return text
+
+    def _reserve(self, path):
+        size = self.sizes.get(path)
+        self.reserved[path] = size or 0
+        self.staged_bytes += size or 0
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed or not self.queue:
+                        return
+                    size = self.sizes.get(self.queue[0]) or 0
+                    # Un archivo mayor que el presupuesto se lee igual si no hay otros preparados
+                    if not self.staged_bytes or self.staged_bytes + size <= self.max_bytes:
+                        break
+                    self._cond.wait()
+                path = self.queue.popleft()
+                self._reserve(path)
+            self._stage(path)
+
+    def _stage(self, path):
+        start = time.perf_counter()
+        size = 0
+        try:
+            if self.mode == 'memory':
+                buffer = io.BytesIO()
+                size = self._copy(path, buffer)
+                staged = buffer.getvalue()
+            else:
+                with self._cond:
+                    self._counter += 1
+                    target = os.path.join(self.staging_dir, f"{self._counter}_{os.path.basename(path)}")
+                with open(target, 'wb') as f:
+                    size = self._copy(path, f)
+                staged = target
+        except Exception as e:
+            staged = e
+        elapsed = time.perf_counter() - start
+
+        with self._cond:
+            if not isinstance(staged, Exception):
+                self.files_read += 1
+                self.io_bytes += size
+                self.io_seconds += elapsed
+            # Ajustar la reserva al tamaño real leído
+            self.staged_bytes += size - self.reserved.get(path, 0)
+            self.reserved[path] = size
+            self.ready[path] = staged
+            self._cond.notify_all()
+
+    def _copy(self, path, target):
+        size = 0
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(STAGE_CHUNK_SIZE), b''):
+                if self.simulated_latency:
+                    time.sleep(self.simulated_latency)
+                target.write(chunk)
+                size += len(chunk)
+        return size
@@ -0,0 +1,96 @@
+# processors/shared_scan.py
+import threading
+
+class SharedScan:
+    """Lectura única de archivos fuente compartida por procesadores simultáneos.
+
+    Cuando los procesadores CDV y ADV de una misma línea corren a la vez sobre
+    los mismos archivos, el primero que pide un archivo lo lee de disco y su
+    contenido queda retenido hasta que los demás consumidores lo tomen. Cada
+    procesador aplica luego su propio prefiltro y parser, de modo que cada
+    archivo se lee una sola vez. Cada consumidor registra con `register` los
+    archivos que va a pedir (ya descartados los que están fuera de su ventana
+    o en su caché): solo se retiene un archivo para los consumidores que lo
+    registraron o que aún no registraron los suyos. La memoria retenida está
+    acotada por `max_bytes`; si se supera, el archivo simplemente se vuelve a
+    leer. Cada consumidor debe llamar a `release` al terminar (también si
+    termina antes de leer), para no retener archivos que ya no pedirá.
+    """
+
+    DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+    def __init__(self, consumers, max_bytes=None):
+        self.active = set(consumers)
+        self.wanted = {}  # consumidor -> rutas registradas
+        self.max_bytes = max_bytes if max_bytes is not None else self.DEFAULT_MAX_BYTES
+        self.retained_bytes = 0
+        self.entries = {}  # ruta -> {'data', 'pending', 'ready'}
+        self._lock = threading.Lock()
+
+    def read_bytes(self, path, consumer):
+        """Obtener el contenido de un archivo para un consumidor"""
+        with self._lock:
+            entry = self.entries.get(path)
+            owner = entry is None
+            if owner:
+                # Este consumidor lee el archivo; los demás esperan su lectura
+                entry = {'data': None, 'pending': self._waiting(path, consumer), 'ready': threading.Event()}
+                self.entries[path] = entry
+
+        if owner:
+            data = None
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            finally:
+                with self._lock:
+                    retain = (data is not None and entry['pending']
+                              and self.retained_bytes + len(data) <= self.max_bytes)
+                    if retain:
+                        entry['data'] = data
+                        self.retained_bytes += len(data)
+                    else:
+                        self.entries.pop(path, None)
+                    entry['ready'].set()
+            return data
+
+        entry['ready'].wait()
+        with self._lock:
+            data = entry['data']
+            entry['pending'].discard(consumer)
+            if not entry['pending']:
+                self._drop(path)
+        if data is None:
+            # El archivo no quedó retenido: leerlo directamente
+            with open(path, 'rb') as f:
+                data = f.read()
+        return data
+
+    def register(self, consumer, paths):
+        """Registrar los archivos que pedirá un consumidor; deja de retener para él los demás"""
+        with self._lock:
+            self.wanted[consumer] = set(paths)
+            for path, entry in list(self.entries.items()):
+                if path not in self.wanted[consumer]:
+                    entry['pending'].discard(consumer)
+                    if not entry['pending'] and entry['ready'].is_set():
+                        self._drop(path)
+
+    def release(self, consumer):
+        """Indicar que un consumidor ya no pedirá más archivos"""
+        with self._lock:
+            self.active.discard(consumer)
+            for path, entry in list(self.entries.items()):
+                entry['pending'].discard(consumer)
+                if not entry['pending'] and entry['ready'].is_set():
+                    self._drop(path)
+
+    def _waiting(self, path, consumer):
+        """Otros consumidores activos que pedirán `path` (o que aún no registraron sus archivos)"""
+        return {other for other in self.active - {consumer}
+                if other not in self.wanted or path in self.wanted[other]}
+
+    def _drop(self, path):
+        entry = self.entries.pop(path, None)
+        if entry is not None and entry['data'] is not None:
+            self.retained_bytes -= len(entry['data'])
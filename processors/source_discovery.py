@@ -0,0 +1,230 @@
+# processors/source_discovery.py
+import os
+import re
+import json
+import time
+import hashlib
+import zipfile
+import threading
+import concurrent.futures
+from datetime import datetime, date
+
+# Fechas en nombres de archivo o carpeta: AAAAMMDD, AAAA-MM-DD, AAAA_MM_DD o AAAA.MM.DD
+DATE_PATTERN = re.compile(r'(?<!\d)(20\d{2})[-_.]?(\d{2})[-_.]?(\d{2})(?!\d)')
+
+def infer_date(*names):
+    """Inferir la fecha de un archivo a partir de su nombre (o de los nombres de sus carpetas).
+
+    Se devuelve la fecha válida más reciente de todos los nombres (p. ej. el
+    final de un rango como ``20240101_20240131``), para no descartar un
+    archivo por una fecha anterior a sus últimos datos, o None si ninguno
+    contiene una.
+    """
+    dates = []
+    for name in names:
+        for match in DATE_PATTERN.finditer(name):
+            try:
+                dates.append(date(int(match.group(1)), int(match.group(2)), int(match.group(3))))
+            except ValueError:
+                continue
+    return max(dates) if dates else None
+
+# Fechas dentro de las líneas de datos: DD/MM/AAAA o DD-MM-AAAA (día primero) y AAAA-MM-DD
+LINE_DATE_PATTERNS = (
+    (re.compile(rb'(?<!\d)(\d{2})[/-](\d{2})[/-](20\d{2})(?!\d)'), (3, 2, 1)),
+    (re.compile(rb'(?<!\d)(20\d{2})-(\d{2})-(\d{2})(?!\d)'), (1, 2, 3)),
+)
+
+# Bytes finales que se leen para encontrar la fecha de la última línea
+PROBE_TAIL_SIZE = 64 * 1024
+
+# Archivos cuyo final no es texto (se omite la lectura de la última línea)
+BINARY_EXTENSIONS = ('.xls', '.xlsx', '.xlsm', '.gz', '.xz', '.bz2')
+
+def probe_last_date(path):
+    """Obtener la fecha de los últimos datos de un archivo sin interpretarlo completo.
+
+    Para un ZIP es la fecha más reciente de sus miembros (se lee solo el
+    directorio central); para un archivo de texto, la de la última línea que
+    contenga una fecha. Devuelve None si no se puede determinar.
+    """
+    lower = path.lower()
+    if lower.endswith(BINARY_EXTENSIONS):
+        return None
+    if lower.endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            dates = [date(*info.date_time[:3]) for info in archive.infolist()]
+        return max(dates) if dates else None
+
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - PROBE_TAIL_SIZE))
+        data = f.read()
+    for line in reversed(data.splitlines()):
+        for pattern, (year, month, day) in LINE_DATE_PATTERNS:
+            match = pattern.search(line)
+            if match is None:
+                continue
+            try:
+                return date(int(match.group(year)), int(match.group(month)), int(match.group(day)))
+            except ValueError:
+                continue
+    return None
+
+class SourceFile:
+    """Archivo fuente encontrado en la búsqueda.
+
+    Guarda la ruta, el tamaño, la fecha de modificación (ns) y la fecha inferida
+    del nombre del archivo o de sus carpetas (None si no se pudo inferir).
+    """
+
+    __slots__ = ('path', 'size', 'mtime', 'date')
+
+    def __init__(self, path, size, mtime, date=None):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.date = date
+
+    @property
+    def name(self):
+        return os.path.basename(self.path)
+
+    def __fspath__(self):
+        return self.path
+
+    def __repr__(self):
+        return f"SourceFile({self.path!r}, size={self.size}, date={self.date})"
+
+class SourceDiscovery:
+    """Búsqueda de archivos fuente con `os.scandir` y caché de listados.
+
+    Las carpetas de primer nivel se recorren en paralelo (hilos: el costo es de
+    E/S). El listado de cada carpeta se guarda junto con su fecha de
+    modificación, que cambia al crear, borrar o renombrar archivos dentro de
+    ella; en la siguiente búsqueda una carpeta con la misma fecha se toma de la
+    caché sin volver a listarla. Las carpetas modificadas en los últimos
+    `hot_days` días se listan siempre, ya que sus archivos pueden seguir
+    creciendo sin que cambie la fecha de la carpeta. Los resultados mantienen el
+    orden de `os.walk`.
+    """
+
+    DEFAULT_MAX_WORKERS = 8
+    DEFAULT_HOT_DAYS = 2
+
+    def __init__(self, cache_path=None, max_workers=None, hot_days=None):
+        self.cache_path = cache_path
+        self.max_workers = max(1, max_workers or self.DEFAULT_MAX_WORKERS)
+        self.hot_days = hot_days if hot_days is not None else self.DEFAULT_HOT_DAYS
+        self.listings = {}
+        self.visited = {}
+        self.listed = 0
+        self.reused = 0
+        self._lock = threading.Lock()
+        self.load()
+
+    @classmethod
+    def for_root(cls, cache_folder, root, **kwargs):
+        """Crear una búsqueda con su caché de listados en `cache_folder`, una por carpeta raíz"""
+        root_key = hashlib.blake2b(os.path.abspath(root).encode('utf-8'), digest_size=8).hexdigest()
+        return cls(os.path.join(cache_folder, f'listing_{root_key}.json'), **kwargs)
+
+    def load(self):
+        """Cargar la caché de listados (vacía si no existe o está dañada)"""
+        self.listings = {}
+        if self.cache_path and os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, 'r', encoding='utf-8') as f:
+                    self.listings = json.load(f).get('dirs', {})
+            except (OSError, ValueError):
+                self.listings = {}
+
+    def save(self):
+        """Guardar los listados de las carpetas visitadas en esta búsqueda"""
+        if not self.cache_path:
+            return
+        with self._lock:
+            content = {
+                'updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'dirs': self.visited
+            }
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            # Escritura atómica (con nombre temporal propio de cada hilo)
+            tmp_path = f"{self.cache_path}.{os.getpid()}_{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(content, f)
+            os.replace(tmp_path, self.cache_path)
+
+    def discover(self, root, depth=None):
+        """Buscar los archivos bajo `root`.
+
+        Con `depth=None` se devuelven los archivos de cualquier nivel (como
+        `os.walk`); con `depth=n`, solo los que están exactamente `n` carpetas
+        por debajo de `root`.
+        """
+        dirs, files = self._list(root)
+        results = []
+        if depth is None or depth == 0:
+            results.extend(self._records(root, files, ()))
+        if depth == 0:
+            return results
+
+        next_depth = None if depth is None else depth - 1
+        subdirs = [os.path.join(root, name) for name in dirs]
+        walk = lambda path: self._walk(path, next_depth, (os.path.basename(path),))
+        if self.max_workers > 1 and len(subdirs) > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for found in executor.map(walk, subdirs):
+                    results.extend(found)
+        else:
+            for path in subdirs:
+                results.extend(walk(path))
+        return results
+
+    def _walk(self, folder, depth, parents):
+        try:
+            dirs, files = self._list(folder)
+        except OSError:
+            # Carpeta inaccesible o eliminada durante la búsqueda
+            return []
+        results = []
+        if depth is None or depth == 0:
+            results.extend(self._records(folder, files, parents))
+        if depth != 0:
+            next_depth = None if depth is None else depth - 1
+            for name in dirs:
+                results.extend(self._walk(os.path.join(folder, name), next_depth, (name,) + parents))
+        return results
+
+    def _records(self, folder, files, parents):
+        return [
+            SourceFile(os.path.join(folder, name), size, mtime, infer_date(name, *parents))
+            for name, size, mtime in files
+        ]
+
+    def _list(self, folder):
+        """Listar una carpeta (subcarpetas y archivos con tamaño y mtime), desde la caché si no cambió"""
+        folder_mtime = os.stat(folder).st_mtime_ns
+        cached = self.listings.get(folder)
+        hot = time.time() - folder_mtime / 1e9 < self.hot_days * 86400
+        if cached is not None and cached['mtime'] == folder_mtime and not hot:
+            with self._lock:
+                self.visited[folder] = cached
+                self.reused += 1
+            return cached['dirs'], cached['files']
+
+        dirs, files = [], []
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        dirs.append(entry.name)
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        files.append((entry.name, stat.st_size, stat.st_mtime_ns))
+                except OSError:
+                    continue
+        with self._lock:
+            self.visited[folder] = {'mtime': folder_mtime, 'dirs': dirs, 'files': files}
+            self.listed += 1
+        return dirs, files
@@ -0,0 +1,380 @@
+# processors/source_formats.py
+import io
+import os
+import re
+import bz2
+import mmap
+import gzip
+import lzma
+import zipfile
+import functools
+import contextlib
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pyarrow es opcional: sin él se usa el motor C de pandas
+    pa = None
+    pa_csv = None
+
+# Valores que pandas interpreta como nulos por defecto; se replican en pyarrow
+# para que ambos motores entreguen los mismos datos
+NA_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a',
+    'nan', 'null'
+]
+
+class SourceFormat:
+    """Descripción declarativa de un formato de archivo fuente.
+
+    Indica el separador, las filas iniciales a omitir, la codificación, las
+    columnas (por posición) que realmente se usan y su tipo. Las columnas del
+    DataFrame resultante conservan su número de posición original.
+    """
+
+    def __init__(self, name, sep, usecols, skiprows=0, encoding='latin-1', dtypes=None):
+        self.name = name
+        self.sep = sep
+        self.usecols = list(usecols)
+        self.skiprows = skiprows
+        self.encoding = encoding
+        # Por defecto todas las columnas se leen como texto
+        self.dtypes = {column: str for column in self.usecols}
+        if dtypes:
+            self.dtypes.update(dtypes)
+
+    def __repr__(self):
+        return f"SourceFormat({self.name!r})"
+
+# Logs VID/vent de L4 y L4A: fecha|equipo:atributo|estado|...
+L4_LOG = SourceFormat('L4_LOG', sep='|', usecols=[0, 1, 2])
+
+# Exportaciones TXT de L5: 7 líneas de encabezado, luego fecha;hora;estación;subsistema;equipo;estado;...
+L5_TXT = SourceFormat('L5_TXT', sep=';', usecols=[0, 1, 2, 3, 4, 5], skiprows=7)
+
+# CSV de S2K de L1: equipo,?,fecha hora,...,estado
+L1_S2K = SourceFormat('L1_S2K', sep=',', usecols=[0, 2, 9])
+
+# Tamaño de bloque para recorrer los archivos en el prefiltro de líneas
+PREFILTER_CHUNK_SIZE = 16 * 1024 * 1024
+
+# Archivos comprimidos admitidos: se reconocen por su firma y se descomprimen
+# al vuelo (sin archivos temporales). Un ZIP se lee miembro por miembro
+COMPRESSION_SIGNATURES = (
+    (b'\x1f\x8b', gzip.open),
+    (b'\xfd7zXZ\x00', lzma.open),
+    (b'BZh', bz2.open),
+)
+ZIP_SIGNATURE = b'PK\x03\x04'
+COMPRESSED_EXTENSIONS = ('.gz', '.xz', '.bz2', '.zip')
+
+# Tamaño aproximado de los tramos en que se dividen los archivos grandes
+# para leerlos en paralelo (cada tramo termina en un fin de línea)
+SPLIT_CHUNK_SIZE = 64 * 1024 * 1024
+
+# Archivos TXT de Línea 5, planos o comprimidos (p. ej. `.txt.gz`)
+TXT_EXTENSIONS = ('.txt',) + tuple('.txt' + extension for extension in COMPRESSED_EXTENSIONS)
+
+def read_source(source, source_format, line_filter=None):
+    """Leer un archivo (ruta o buffer binario) según su descriptor de formato.
+
+    Si se indica `line_filter` (expresión regular de bytes precompilada), solo
+    las líneas que la contienen llegan al parser; el filtro exacto por columna
+    debe aplicarse igualmente sobre el resultado.
+
+    Se intenta primero con pyarrow.csv, luego con el motor C de pandas y, si el
+    archivo está mal formado para ambos (p. ej. filas con distinto número de
+    campos), con el motor 'python' leyendo el archivo completo como hasta ahora.
+    
+    Los archivos comprimidos con gzip, xz o bz2 se descomprimen al vuelo; los
+    miembros de un ZIP se leen por separado (cada uno con su encabezado) y se
+    unen como si fueran un solo archivo.
+    """
+    if isinstance(source, ByteRange):
+        source = source.open()
+    
+    if _peek(source).startswith(ZIP_SIGNATURE):
+        with zipfile.ZipFile(source) as archive:
+            frames = [
+                read_source(io.BytesIO(archive.read(info)), source_format, line_filter)
+                for info in archive.infolist() if not info.is_dir()
+            ]
+        if not frames:
+            return pd.DataFrame(columns=source_format.usecols)
+        return pd.concat(frames, ignore_index=True)
+    
+    if line_filter is None and _compression_opener(_peek(source)) is not None:
+        # Los lectores necesitan volver al inicio: se descomprime en memoria
+        with _open_binary(source) as f:
+            source = io.BytesIO(f.read())
+    
+    if line_filter is not None:
+        lines = prefilter_lines(source, line_filter, source_format.skiprows)
+        if not lines:
+            return pd.DataFrame(columns=source_format.usecols)
+        source = io.BytesIO(b''.join(lines))
+        source_format = SourceFormat(
+            source_format.name, source_format.sep, source_format.usecols,
+            skiprows=0, encoding=source_format.encoding, dtypes=source_format.dtypes
+        )
+    return _parse_lines(source, source_format)
+
+def _parse_lines(source, source_format):
+    errors = []
+    for reader in (_read_pyarrow, _read_pandas_c, _read_pandas_python):
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        try:
+            df = reader(source, source_format)
+        except Exception as e:
+            errors.append(e)
+            continue
+        if df is not None:
+            return df
+    raise errors[-1]
+
+class ByteRange:
+    """Tramo de un archivo delimitado, entre dos límites de línea.
+
+    Solo guarda el origen (ruta o contenido ya leído) y los límites, por lo que
+    puede enviarse a un proceso de trabajo. Al abrirlo entrega un buffer con las
+    líneas de encabezado del archivo (los primeros `header_end` bytes) seguidas
+    del tramo, de modo que se interpreta con el mismo `skiprows` que el archivo
+    completo. El primer tramo ya incluye el encabezado.
+    """
+
+    def __init__(self, source, start, end, header_end=0):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.header_end = header_end
+
+    def open(self):
+        """Leer el tramo (con el encabezado) en un buffer"""
+        if isinstance(self.source, (bytes, bytearray, memoryview)):
+            header = self.source[:self.header_end] if self.start > 0 else b''
+            return io.BytesIO(bytes(header) + bytes(self.source[self.start:self.end]))
+        with open(self.source, 'rb') as f:
+            header = f.read(self.header_end) if self.start > 0 else b''
+            f.seek(self.start)
+            return io.BytesIO(header + f.read(self.end - self.start))
+
+    def __repr__(self):
+        return f"ByteRange({self.start}, {self.end}, header_end={self.header_end})"
+
+def split_byte_ranges(source, size, skiprows=0, chunk_size=SPLIT_CHUNK_SIZE):
+    """Dividir un archivo (ruta o contenido) en tramos de unos `chunk_size` bytes.
+
+    Cada corte se desplaza hasta el siguiente fin de línea, y las primeras
+    `skiprows` líneas (encabezado) se repiten al abrir cada tramo. Devuelve la
+    lista de `ByteRange` en orden; un archivo pequeño queda en un solo tramo.
+    """
+    with _open_binary_raw(source) as f:
+        header_end = 0
+        for _ in range(skiprows):
+            line = f.readline()
+            if not line:
+                break
+            header_end += len(line)
+        
+        bounds = [0]
+        position = max(header_end, chunk_size)
+        while position < size:
+            f.seek(position)
+            # Avanzar hasta el final de la línea en curso
+            line = f.readline()
+            if not line.endswith(b'\n'):
+                break
+            position += len(line)
+            if position >= size:
+                break
+            bounds.append(position)
+            position += chunk_size
+    bounds.append(size)
+    return [ByteRange(source, start, end, header_end) for start, end in zip(bounds, bounds[1:])]
+
+def is_compressed(source):
+    """Indicar si un archivo (ruta o buffer) está comprimido (gzip, xz, bz2 o ZIP)"""
+    head = _peek(source)
+    return head.startswith(ZIP_SIGNATURE) or _compression_opener(head) is not None
+
+class StrippedByteStream:
+    """Flujo binario que elimina ciertos bytes (p. ej. NUL) al leer por bloques"""
+
+    def __init__(self, raw, remove=b'\x00'):
+        self.raw = raw
+        self.remove = remove
+
+    def read(self, size=-1):
+        return self.raw.read(size).replace(self.remove, b'')
+
+def scan_mapped(source, source_format, line_filter):
+    """Leer las líneas que contienen el patrón recorriendo el archivo mapeado en memoria.
+
+    El archivo se mapea con `mmap` y las coincidencias del patrón se buscan
+    directamente sobre sus bytes, sin copiarlo por bloques; solo las líneas
+    encontradas llegan al parser, que decodifica únicamente las columnas de
+    `usecols`. El resultado es el mismo que el de `read_source` con
+    `line_filter`, a la que se recurre si la fuente no es un archivo plano
+    (buffer, tramo o archivo comprimido).
+    """
+    if not isinstance(source, (str, os.PathLike)) or os.path.getsize(source) == 0 or is_compressed(source):
+        return read_source(source, source_format, line_filter)
+    
+    with open(source, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        lines = []
+        start = _line_offset(data, source_format.skiprows)
+        if start is not None:
+            _collect_matching_lines(data, line_filter, lines, start=start)
+    if not lines:
+        return pd.DataFrame(columns=source_format.usecols)
+    if not lines[-1].endswith(b'\n'):
+        lines[-1] += b'\n'
+    
+    source_format = SourceFormat(
+        source_format.name, source_format.sep, source_format.usecols,
+        skiprows=0, encoding=source_format.encoding, dtypes=source_format.dtypes
+    )
+    return _parse_lines(io.BytesIO(b''.join(lines)), source_format)
+
+def prefilter_lines(source, line_filter, skiprows=0):
+    """Recorrer los bytes de un archivo y devolver solo las líneas que contienen el patrón.
+
+    Las primeras `skiprows` líneas (encabezado) se omiten antes de filtrar. El
+    archivo se lee por bloques, sin decodificar ni construir un DataFrame.
+    """
+    lines = []
+    pending = b''
+    with _open_binary(source) as f:
+        for chunk in iter(lambda: f.read(PREFILTER_CHUNK_SIZE), b''):
+            data = pending + chunk
+            # La última línea del bloque puede estar incompleta
+            cut = data.rfind(b'\n') + 1
+            data, pending = data[:cut], data[cut:]
+            if skiprows:
+                data, skiprows = _skip_lines(data, skiprows)
+            _collect_matching_lines(data, line_filter, lines)
+        if pending and not skiprows:
+            if not pending.endswith(b'\n'):
+                pending += b'\n'
+            _collect_matching_lines(pending, line_filter, lines)
+    return lines
+
+@contextlib.contextmanager
+def _open_binary(source):
+    """Abrir una ruta o buffer como flujo binario, descomprimiendo gzip, xz o bz2 al vuelo"""
+    with contextlib.ExitStack() as stack:
+        if hasattr(source, 'read'):
+            # Un buffer recibido desde fuera no se cierra aquí
+            stream = source
+        else:
+            stream = stack.enter_context(open(source, 'rb'))
+        opener = _compression_opener(_peek(stream))
+        if opener is not None:
+            stream = stack.enter_context(opener(stream, 'rb'))
+        yield stream
+
+def _open_binary_raw(source):
+    """Abrir una ruta o contenido como flujo binario con retroceso, sin descomprimir"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    return open(source, 'rb')
+
+def _peek(source, size=6):
+    """Primeros bytes de una ruta o buffer, sin mover la posición del buffer"""
+    if not hasattr(source, 'read'):
+        with open(source, 'rb') as f:
+            return f.read(size)
+    if not hasattr(source, 'seek'):
+        # Flujo sin retroceso (p. ej. StrippedByteStream): se lee tal cual
+        return b''
+    position = source.tell()
+    head = source.read(size)
+    source.seek(position)
+    return head
+
+def _compression_opener(head):
+    for signature, opener in COMPRESSION_SIGNATURES:
+        if head.startswith(signature):
+            return opener
+    return None
+
+def _line_offset(data, skiprows):
+    # Posición donde empieza la línea `skiprows` (None si el archivo es más corto)
+    position = 0
+    for _ in range(skiprows):
+        end = data.find(b'\n', position)
+        if end == -1:
+            return None
+        position = end + 1
+    return position
+
+def _skip_lines(data, skiprows):
+    position = 0
+    while skiprows and position < len(data):
+        end = data.find(b'\n', position)
+        if end == -1:
+            break
+        position = end + 1
+        skiprows -= 1
+    return data[position:], skiprows
+
+def _collect_matching_lines(data, line_filter, lines, start=0):
+    # Una sola búsqueda en C que entrega directamente las líneas completas con coincidencias
+    lines.extend(_line_pattern(line_filter).findall(data, start))
+
+@functools.lru_cache(maxsize=None)
+def _line_pattern(line_filter):
+    """Expresión que abarca la línea completa (con su fin de línea) que contiene el patrón"""
+    return re.compile(rb'(?m)^.*(?:' + line_filter.pattern + rb').*\n?', line_filter.flags)
+
+def _read_pyarrow(source, source_format):
+    if pa_csv is None:
+        return None
+    column_names = [f'f{column}' for column in source_format.usecols]
+    column_types = {
+        f'f{column}': pa.string()
+        for column, dtype in source_format.dtypes.items() if dtype is str
+    }
+    table = pa_csv.read_csv(
+        source,
+        read_options=pa_csv.ReadOptions(
+            skip_rows=source_format.skiprows,
+            autogenerate_column_names=True,
+            encoding=source_format.encoding
+        ),
+        parse_options=pa_csv.ParseOptions(delimiter=source_format.sep),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=column_names,
+            column_types=column_types,
+            null_values=NA_VALUES,
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=True
+        )
+    )
+    df = table.to_pandas()
+    df.columns = source_format.usecols
+    # pyarrow entrega None para los nulos de texto; pandas usa NaN
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].where(df[column].notna(), np.nan)
+    return df
+
+def _read_pandas_c(source, source_format):
+    return pd.read_csv(
+        source, sep=source_format.sep, header=None, skiprows=source_format.skiprows,
+        encoding=source_format.encoding, usecols=source_format.usecols,
+        dtype=source_format.dtypes, engine='c'
+    )
+
+def _read_pandas_python(source, source_format):
+    if hasattr(source, 'read'):
+        # El motor 'python' necesita texto
+        source = io.StringIO(source.read().decode(source_format.encoding))
+    df = pd.read_csv(
+        source, sep=source_format.sep, header=None, skiprows=source_format.skiprows,
+        encoding=source_format.encoding, engine='python'
+    )
+    return df[source_format.usecols]
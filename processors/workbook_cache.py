@@ -0,0 +1,70 @@
+# processors/workbook_cache.py
+import pandas as pd
+from processors.parsed_cache import ParsedCache
+from processors.ingest_manifest import IngestManifest
+
+# Versión de la conversión de libros Sacem (incrementar si cambian las columnas conservadas)
+SACEM_WORKBOOK_VERSION = 1
+
+class WorkbookCache(ParsedCache):
+    """Caché de libros Excel ya convertidos a formato columnar.
+
+    Leer un Excel es la etapa más lenta de la ingesta; cada libro se convierte
+    una sola vez conservando solo las columnas que usan los procesadores, y las
+    ejecuciones siguientes (de cualquier procesador con la misma carpeta de
+    salida) lo cargan desde la caché. Se comparte entre CDV y ADV.
+    """
+
+    CACHE_DIR = 'workbooks'
+    BUDGET_SHARE = 0.4
+
+def read_workbook(source, **kwargs):
+    """Leer un libro Excel probando los motores disponibles"""
+    try:
+        return pd.read_excel(source, **kwargs)
+    except Exception:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        try:
+            return pd.read_excel(source, engine='openpyxl', **kwargs)
+        except Exception:
+            if hasattr(source, 'seek'):
+                source.seek(0)
+            return pd.read_excel(source, engine='xlrd', **kwargs)
+
+def read_workbook_header(source):
+    """Leer solo los nombres de columna de la primera hoja de un libro Excel"""
+    return list(read_workbook(source, nrows=0).columns)
+
+def is_sacem_column(column):
+    """Indicar si una columna de un libro Sacem la usa algún procesador de L2"""
+    if not isinstance(column, str):
+        return False
+    upper = column.upper()
+    return (
+        column in ('ciclo', 'FECHA', 'HORA') or
+        column.startswith('CDV') or
+        column.startswith('AGS') or 'AGUJA' in upper or 'ADV' in upper or
+        # Se usan para distinguir archivos de movimientos y de discordancias
+        'DISCOR' in upper or 'FALLO' in upper
+    )
+
+def read_sacem_workbook(file_path, workbook_cache=None):
+    """Leer un libro Sacem conservando solo las columnas usadas, con caché por hash de contenido"""
+    key = None
+    if workbook_cache is not None:
+        file_hash = IngestManifest.content_hash(file_path)
+        key = workbook_cache.entry_key('Sacem', file_hash, SACEM_WORKBOOK_VERSION)
+        df = workbook_cache.get(key)
+        if df is not None:
+            return df
+
+    df = read_workbook(file_path)
+    df = df[[column for column in df.columns if is_sacem_column(column)]]
+
+    if workbook_cache is not None:
+        try:
+            workbook_cache.put(key, df)
+        except Exception as e:
+            print(f"No se pudo guardar en caché el libro {file_path}: {e}")
+    return df
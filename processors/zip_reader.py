@@ -0,0 +1,108 @@
+# processors/zip_reader.py
+import os
+import zipfile
+import threading
+import collections
+import concurrent.futures
+from processors.file_ingest import compact_frame, restore_frame
+
+# Archivo ZIP abierto por cada hilo o proceso de trabajo (se reutiliza
+# mientras se lean miembros del mismo archivo)
+_open_archives = threading.local()
+
+def _open_archive(zip_path):
+    archive = getattr(_open_archives, 'archive', None)
+    if archive is None or archive.filename != zip_path:
+        if archive is not None:
+            archive.close()
+        archive = zipfile.ZipFile(zip_path, 'r')
+        _open_archives.archive = archive
+    return archive
+
+def _read_member(zip_path, member_name, parse_member, compact=False):
+    """Descomprimir un miembro y entregarlo como flujo directamente al parser"""
+    archive = _open_archive(zip_path)
+    with archive.open(member_name) as stream:
+        result = parse_member(stream)
+    if compact and result is not None:
+        result = compact_frame(result)
+    return result
+
+class ZipMemberReader:
+    """Lector paralelo de los miembros de archivos ZIP.
+
+    Reparte los miembros (CSV, XLS) de uno o varios ZIP entre un grupo de hilos
+    o procesos; cada trabajador abre el ZIP por su cuenta y pasa el contenido
+    descomprimido directamente al parser. La cantidad de miembros en curso por
+    ZIP (`max_in_flight`) está acotada para limitar la memoria, y los errores se
+    informan por miembro. Puede usarse desde varios hilos a la vez.
+    """
+
+    def __init__(self, max_workers=None, mode='thread', max_in_flight=None):
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+        self.mode = mode
+        self.max_in_flight = max_in_flight or 2 * self.max_workers
+        self._executor = None
+
+    def __enter__(self):
+        if self.max_workers > 1:
+            if self.mode == 'process':
+                self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        return self
+
+    def __exit__(self, *exc):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        return False
+
+    def read(self, zip_path, member_filter, parse_member, on_error=None, with_names=False):
+        """Leer los miembros de un ZIP que cumplen `member_filter`.
+
+        `parse_member(stream)` recibe el flujo descomprimido del miembro; en modo
+        'process' debe poder serializarse (función de módulo o staticmethod).
+        Devuelve los resultados en el orden de los miembros dentro del ZIP;
+        los miembros con error se informan con `on_error(nombre, error)` y se
+        omiten. Con `with_names=True` devuelve pares (nombre, resultado).
+        """
+        with zipfile.ZipFile(zip_path, 'r') as archive:
+            members = [name for name in archive.namelist() if member_filter(name)]
+
+            if self._executor is None:
+                results = []
+                for name in members:
+                    try:
+                        with archive.open(name) as stream:
+                            result = parse_member(stream)
+                        results.append((name, result) if with_names else result)
+                    except Exception as e:
+                        if on_error:
+                            on_error(name, e)
+                return results
+
+        compact = self.mode == 'process'
+        in_flight = collections.deque()
+        results = []
+        
+        def collect_oldest():
+            name, future = in_flight.popleft()
+            try:
+                result = future.result()
+            except Exception as e:
+                if on_error:
+                    on_error(name, e)
+                return
+            if compact and result is not None:
+                result = restore_frame(result)
+            results.append((name, result) if with_names else result)
+        
+        for name in members:
+            # Ventana acotada: se recogen resultados en orden antes de enviar más
+            if len(in_flight) >= self.max_in_flight:
+                collect_oldest()
+            in_flight.append((name, self._executor.submit(_read_member, zip_path, name, parse_member, compact)))
+        while in_flight:
+            collect_oldest()
+        return results